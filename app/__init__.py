@@ -1,7 +1,7 @@
 # File: app/__init__.py
 
 import os
-from flask import Flask, session, g, render_template, request, redirect, url_for, flash
+from flask import Flask, session, g, render_template, request, redirect, url_for, flash, current_app
 from flask_pymongo import PyMongo
 from flask_login import LoginManager, current_user, login_user
 from flask_wtf.csrf import CSRFProtect
@@ -13,6 +13,8 @@ import pymongo.errors # Import pymongo errors
 
 from .config import Config # Import Config class
 from .utils import format_inr, format_datetime_ist
+from . import cache, rollups, suggest, passwords, throttle
+from .users import ADMIN_USER, load_customer
 
 # Initialize extensions (globally accessible)
 mongo = PyMongo()
@@ -25,51 +27,14 @@ bcrypt = Bcrypt()
 def load_user(user_id):
     # Check admin first (session-based, not in DB)
     if user_id == "admin": # Check specifically for the admin ID
-        class AdminUser:
-            is_authenticated = True
-            is_active = True
-            is_anonymous = False
-            id = "admin" # Consistent ID
-            def get_id(self): return self.id
-            def is_admin(self): return True
-        # Only return AdminUser if the session confirms admin status
-        if session.get('is_admin'):
-            return AdminUser()
-        else:
-            return None # Prevent loading admin if session flag is missing
+        # Only return the admin if the session confirms admin status
+        return ADMIN_USER if session.get('is_admin') else None
 
-    # Check regular customer users from DB
+    # Regular customers: per-worker cache, falling back to one projected lookup
     try:
-        from .models import find_user_by_id
-        user_data = find_user_by_id(user_id) # Use the model function
-        if user_data and user_data.get('is_approved', False):
-            class User:
-                def __init__(self, data):
-                    self._data = data # Store raw data
-                    self.id = str(data['_id'])
-                    self.is_authenticated = True
-                    self.is_active = True
-                    self.is_anonymous = False
-                def get_id(self): return self.id
-                def __getattr__(self, name):
-                    if name in ['username', 'email', 'address', 'phone', 'is_approved']:
-                         return self._data.get(name)
-                    if name == 'is_admin': return False
-                    raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
-            return User(user_data)
-        else:
-            return None # User not found or not approved
+        return load_customer(user_id)
     except Exception as e:
-        # --- >>> CORRECTED LOGGING SYNTAX <<< ---
-        logger = getattr(Flask, 'logger', None) # Get logger if available
-        log_message = f"Error in load_user for ID {user_id}: {e}"
-        if logger:
-            logger.error(log_message, exc_info=True) # Add traceback info
-        else:
-            print(log_message) # Fallback to print
-            import traceback
-            traceback.print_exc() # Print traceback if logger not available
-        # --- >>> END CORRECTED LOGGING SYNTAX <<< ---
+        current_app.logger.error(f"Error in load_user for ID {user_id}: {e}", exc_info=True)
         return None
 
 # --- App Factory Function ---
@@ -124,6 +89,13 @@ def create_app(config_class=Config):
     login_manager.init_app(app)
     csrf.init_app(app)
     bcrypt.init_app(app)
+    cache.init_app(app)
+    passwords.init_app(app)
+    throttle.init_app(app)
+    from . import reservations, jobs, sessions
+    session_store = sessions.init_app(app)
+    reservations.init_app(app)
+    jobs.init_app(app)
 
     # --- Configure Flask-Login settings ---
     login_manager.login_view = 'auth.login'
@@ -143,17 +115,22 @@ def create_app(config_class=Config):
     login_manager.unauthorized_handler(handle_unauthorized)
 
     # --- Register Blueprints ---
-    from .routes import main_bp, auth_bp, admin_bp, customer_bp
+    from .routes import main_bp, auth_bp, admin_bp, customer_bp, api_bp
     app.register_blueprint(main_bp)
     app.register_blueprint(auth_bp, url_prefix='/auth')
     app.register_blueprint(admin_bp, url_prefix='/admin')
     app.register_blueprint(customer_bp, url_prefix='/customer')
+    app.register_blueprint(api_bp, url_prefix='/api')
+
+    # --- CLI Commands ---
+    from . import commands
+    commands.init_app(app)
 
     # --- Context Processors ---
     @app.context_processor
     def inject_global_vars():
-        cart = session.get('cart', {})
-        cart_item_count = sum(item['quantity'] for item in cart.values())
+        from .cart import session_cart_count
+        cart_item_count = session_cart_count()
         def check_is_admin():
              return session.get('is_admin', False) and \
                     current_user.is_authenticated and \
@@ -193,10 +170,43 @@ def create_app(config_class=Config):
             print(f"Successfully verified write access to '{target_db_name}' (index created/verified).")
             print("Checking/creating remaining indexes...")
             db_handle.users.create_index('username', unique=True, background=True)
-            db_handle.toys.create_index('name', background=True)
+            # Admin pending/approved user lists, oldest registration first.
+            db_handle.users.create_index([('is_approved', 1), ('created_at', 1), ('_id', 1)], background=True)
+            # Keyset catalog pages: one index per sort, with stock/price as trailing keys
+            # so the in-stock and price filters are applied on index keys.
+            db_handle.toys.create_index([('name', 1), ('_id', 1), ('stock', 1), ('price', 1)], background=True)
+            db_handle.toys.create_index([('price', 1), ('_id', 1), ('stock', 1)], background=True)
+            db_handle.toys.create_index([('created_at', -1), ('_id', -1), ('stock', 1), ('price', 1)], background=True)
+            # Bulk imports key each row so a re-run skips what is already in the catalog.
+            db_handle.toys.create_index(
+                'import_key', unique=True, partialFilterExpression={'import_key': {'$exists': True}}, background=True
+            )
+            db_handle.toys.create_index(
+                [('name', 'text'), ('description', 'text')],
+                weights={'name': 10, 'description': 2}, name='toy_text_search', background=True
+            )
             db_handle.orders.create_index('user_id', background=True)
-            db_handle.orders.create_index('created_at', background=True)
+            # Admin order console: newest-first keyset pages, optionally filtered by status.
+            db_handle.orders.create_index([('status', 1), ('created_at', -1), ('_id', -1)], background=True)
+            db_handle.orders.create_index([('created_at', -1), ('_id', -1)], background=True)
+            db_handle.orders.create_index('status_batch', sparse=True, background=True)
+            rollups.ensure_indexes(db_handle)
+            reservations.ensure_indexes(db_handle)
+            from . import checkout
+            checkout.ensure_indexes(db_handle)
+            jobs.ensure_indexes(db_handle)
+            throttle.ensure_indexes(db_handle)
+            if session_store:
+                session_store.ensure_indexes(db_handle)
+            from .models import COUNTER_REBUILDERS
+            existing_counters = {doc['_id'] for doc in db_handle.counters.find({}, {'_id': 1})}
+            for name, rebuild in COUNTER_REBUILDERS.items():
+                if name not in existing_counters:
+                    rebuild()
+                    print(f"Rebuilt '{name}' counters.")
             print(f"All indexes checked/created.")
+            suggest.init_app(app)
+            print(f"Toy name suggest index built ({len(suggest.toy_name_index)} names).")
         except pymongo.errors.OperationFailure as e:
             print(f"\n!!! --- FATAL: MongoDB Operation Failure --- !!!")
             print(f"Error Details: {e.details}"); auth_user = 'specified in URI'; auth_src = app.config.get('MONGO_AUTH_SOURCE', 'default')
@@ -0,0 +1,171 @@
+# File: app/bulk_import.py
+"""Bulk catalog import from a CSV of toys plus a ZIP of their images.
+
+CSV columns: name, description, price, stock, image (a file name inside the
+ZIP) and an optional sku. Rows are checked with the same rules as ToyForm,
+images are extracted by a small thread pool, and toys are written with one
+insert_many per batch. Every toy stores an import_key (its sku, or its name
+when there is no sku column) under a unique index, so re-running an import
+after a failure skips the rows that already made it in.
+"""
+
+import csv
+import os
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+from werkzeug.datastructures import MultiDict
+
+from .forms import ToyForm
+from .models import add_toys, find_imported_keys
+from .utils import TOY_IMAGE_EXTENSIONS, toy_image_destination
+
+REQUIRED_COLUMNS = ['name', 'description', 'price', 'stock', 'image']
+FORM_FIELDS = ['name', 'description', 'price', 'stock']
+
+
+class ImportReport:
+    """Counts and per-row errors for one import run."""
+
+    def __init__(self):
+        self.imported = 0
+        self.skipped = 0 # Already in the catalog from an earlier run
+        self.errors = [] # (CSV line number, import key, message)
+
+    def add_error(self, line, key, message):
+        self.errors.append((line, key, message))
+
+    def write_csv(self, fileobj):
+        writer = csv.writer(fileobj)
+        writer.writerow(['line', 'import_key', 'error'])
+        writer.writerows(self.errors)
+
+    def summary(self):
+        return f"{self.imported} imported, {self.skipped} already imported, {len(self.errors)} failed"
+
+
+def _row_errors(row):
+    """Validates one CSV row with ToyForm's rules; returns a list of messages."""
+    form = ToyForm(formdata=MultiDict({field: row.get(field, '') for field in FORM_FIELDS}), meta={'csrf': False})
+    form.validate()
+    messages = [f"{field}: {'; '.join(form.errors[field])}" for field in FORM_FIELDS if field in form.errors]
+    image = row.get('image', '')
+    if not image:
+        messages.append("image: This field is required.")
+    elif image.rsplit('.', 1)[-1].lower() not in TOY_IMAGE_EXTENSIONS:
+        messages.append("image: Only image files (jpg, png, gif) are allowed!")
+    return messages
+
+
+class _ImageExtractor:
+    """Copies images out of the ZIP into UPLOAD_FOLDER; each worker thread opens its own ZipFile handle."""
+
+    def __init__(self, zip_path, upload_folder):
+        self.zip_path = zip_path
+        self.upload_folder = upload_folder
+        self._local = threading.local()
+        self._handles = []
+
+    def _zip(self):
+        if not hasattr(self._local, 'zip'):
+            self._local.zip = zipfile.ZipFile(self.zip_path)
+            self._handles.append(self._local.zip)
+        return self._local.zip
+
+    def close(self):
+        for handle in self._handles:
+            handle.close()
+
+    def extract(self, job):
+        line, member = job
+        try:
+            save_path, relative_path = toy_image_destination(os.path.basename(member), self.upload_folder, prefix=f"{line}_")
+            with self._zip().open(member) as source, open(save_path, 'wb') as target:
+                while chunk := source.read(1024 * 1024):
+                    target.write(chunk)
+            return relative_path, None
+        except KeyError:
+            return None, f"image: '{member}' is not in the ZIP file."
+        except Exception as e:
+            return None, f"image: could not extract '{member}' ({e})."
+
+
+def _delete_images(relative_paths):
+    for relative_path in relative_paths:
+        try:
+            os.remove(os.path.join(current_app.static_folder, relative_path))
+        except OSError:
+            pass
+
+
+def _import_batch(batch, extractor, pool, report):
+    """batch: list of (line, key, row) that passed validation."""
+    existing = find_imported_keys(key for _, key, _ in batch)
+    pending = [(line, key, row) for line, key, row in batch if key not in existing]
+    report.skipped += len(batch) - len(pending)
+    if not pending:
+        return
+    extracted = pool.map(extractor.extract, [(line, row['image']) for line, _, row in pending])
+    ready, toys = [], []
+    for (line, key, row), (image_path, error) in zip(pending, extracted):
+        if error:
+            report.add_error(line, key, error)
+            continue
+        ready.append((line, key, image_path))
+        toys.append({
+            'name': row['name'], 'description': row['description'], 'price': float(row['price']),
+            'image_path': image_path, 'stock': int(row['stock']), 'import_key': key,
+        })
+    if not toys:
+        return
+    inserted, errors = add_toys(toys)
+    report.imported += len(inserted)
+    for index, message in errors.items():
+        line, key, _ = ready[index]
+        report.add_error(line, key, message)
+    _delete_images(ready[index][2] for index in errors) # Don't leave orphaned images behind
+
+
+def import_toys(csv_file, zip_path, batch_size=None, workers=None):
+    """Imports toys from a text-mode CSV file object and a ZIP path; returns an ImportReport."""
+    batch_size = batch_size or current_app.config.get('IMPORT_BATCH_SIZE', 500)
+    workers = workers or current_app.config.get('IMPORT_IMAGE_WORKERS', 4)
+    report = ImportReport()
+    reader = csv.DictReader(csv_file)
+    missing = [column for column in REQUIRED_COLUMNS if column not in (reader.fieldnames or [])]
+    if missing:
+        report.add_error(1, '', f"Missing CSV columns: {', '.join(missing)}")
+        return report
+    try:
+        zipfile.ZipFile(zip_path).close()
+    except (OSError, zipfile.BadZipFile) as e:
+        report.add_error(0, '', f"Cannot open image ZIP: {e}")
+        return report
+
+    extractor = _ImageExtractor(zip_path, current_app.config['UPLOAD_FOLDER'])
+    seen_keys = set()
+    batch = []
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='toy-import') as pool:
+        for raw in reader:
+            line = reader.line_num # Physical line, so quoted multi-line descriptions don't skew it
+            row = {k: (v or '').strip() for k, v in raw.items() if k}
+            key = row.get('sku') or row.get('name', '')
+            messages = _row_errors(row)
+            if not messages and key in seen_keys:
+                messages = ["Duplicate row: this sku/name already appears earlier in the file."]
+            if messages:
+                report.add_error(line, key, ' | '.join(messages))
+                continue
+            seen_keys.add(key)
+            batch.append((line, key, row))
+            if len(batch) >= batch_size:
+                _import_batch(batch, extractor, pool, report)
+                batch = []
+        if batch:
+            _import_batch(batch, extractor, pool, report)
+    extractor.close()
+    report.errors.sort(key=lambda error: error[0]) # Batches finish out of line order
+    current_app.logger.info(f"Toy import finished: {report.summary()}")
+    return report
@@ -0,0 +1,319 @@
+# File: app/cache.py
+"""Per-worker caches for storefront catalog data.
+
+Each worker process keeps its own bounded LRU caches. Workers stay consistent
+through a catalog version counter stored in Mongo (`meta` collection,
+_id 'catalog'): every catalog write bumps it, and each worker re-reads it at
+most once per CATALOG_VERSION_CHECK_SECONDS. When the version moves, entries
+cached under the old version are dropped. Stock movements that leave a toy in
+stock do not bump it, so catalog entries also expire at the end of the current
+CATALOG_CACHE_SECONDS window (wall-clock aligned, the same in every worker);
+unit counts on cached pages are never older than that. The users cache follows
+its own counter (_id 'users', checked every USER_VERSION_CHECK_SECONDS). The
+admin stats cache is simply time-based (ADMIN_STATS_CACHE_SECONDS).
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, request, session, make_response
+from flask_login import current_user
+from pymongo import ReturnDocument
+from werkzeug.http import is_resource_modified
+
+_MISSING = object()
+
+
+class LRUCache:
+    """Thread-safe dict with a maximum size; least recently used entries are evicted first."""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _is_live(self, value):
+        return True
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._entries.get(key, _MISSING)
+            if value is not _MISSING and not self._is_live(value):
+                del self._entries[key] # Expired: dropped, and counted as the miss it is
+                value = _MISSING
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key):
+        with self._lock:
+            return self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'evictions': self.evictions,
+        }
+
+
+class TTLCache(LRUCache):
+    """LRUCache whose entries also expire `ttl` seconds after they were stored."""
+
+    def __init__(self, ttl=5.0, max_entries=64):
+        super().__init__(max_entries)
+        self.ttl = ttl
+        self.enabled = True
+
+    def _is_live(self, entry):
+        return time.monotonic() < entry[0]
+
+    def get(self, key, default=None):
+        entry = super().get(key, _MISSING)
+        return default if entry is _MISSING else entry[1]
+
+    def set(self, key, value):
+        super().set(key, (time.monotonic() + self.ttl, value))
+
+    def get_or_load(self, key, loader):
+        """Returns the cached value for key, calling loader() and caching its result on a miss."""
+        if not self.enabled:
+            return loader()
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = loader()
+            self.set(key, value)
+        return value
+
+
+class CatalogVersion:
+    """Tracks a shared version counter stored in Mongo (the catalog's unless meta_id says otherwise)."""
+
+    META_ID = 'catalog'
+
+    def __init__(self, check_interval=1.0, meta_id=None):
+        self.check_interval = check_interval
+        self.meta_id = meta_id or self.META_ID
+        self.version = None
+        self.names_version = None # Bumped only when toy names change (see app/suggest.py)
+        self.updated_at = None
+        self._checked_at = 0.0
+        self._listeners = []
+        self.checks = 0
+        self.bumps = 0
+
+    def subscribe(self, listener):
+        """Registers a callable invoked with the new version whenever it changes."""
+        self._listeners.append(listener)
+
+    def _set(self, doc):
+        version = doc.get('version', 0)
+        changed = version != self.version
+        self.version = version
+        self.names_version = doc.get('names', 0)
+        self.updated_at = doc.get('updated_at')
+        self._checked_at = time.monotonic()
+        if changed:
+            for listener in self._listeners:
+                listener(version)
+
+    def current(self):
+        """Returns the catalog version, re-reading it from Mongo when the local copy is stale."""
+        if self.version is None or time.monotonic() - self._checked_at >= self.check_interval:
+            from .models import get_db
+            doc = get_db().meta.find_one({'_id': self.meta_id})
+            self.checks += 1
+            self._set(doc or {})
+        return self.version
+
+    def bump(self, names=False):
+        """Increments the shared version after a catalog write and applies it locally at once.
+
+        Pass names=True when toy names were added, renamed or removed. Returns the meta document.
+        """
+        from .models import get_db
+        increments = {'version': 1, 'names': 1} if names else {'version': 1}
+        doc = get_db().meta.find_one_and_update(
+            {'_id': self.meta_id},
+            {'$inc': increments, '$currentDate': {'updated_at': True}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        self.bumps += 1
+        self._set(doc)
+        return doc
+
+
+class CatalogCache(LRUCache):
+    """LRU cache whose entries are only valid for the catalog version they were loaded under.
+
+    With a `ttl`, entries also expire when the current ttl-second window ends.
+    """
+
+    def __init__(self, version, max_entries=1024, ttl=None):
+        super().__init__(max_entries)
+        self.enabled = True
+        self.ttl = ttl
+        self.invalidations = 0
+        self._version = version
+        self._entries_version = None
+        version.subscribe(self._on_version_change)
+
+    def _on_version_change(self, version):
+        with self._lock:
+            if version == self._entries_version:
+                return
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._entries_version = version
+
+    def window(self):
+        """The number of the current ttl window (0 without a ttl); changes when entries expire."""
+        return int(time.time() // self.ttl) if self.ttl else 0
+
+    def _is_live(self, entry):
+        return entry[0] is None or time.time() < entry[0]
+
+    def get(self, key, default=None):
+        entry = super().get(key, _MISSING)
+        return default if entry is _MISSING else entry[1]
+
+    def store(self, key, value, version):
+        """Caches a value loaded under `version`; skipped if a write bumped the version meanwhile."""
+        if self._entries_version == version:
+            self.set(key, ((self.window() + 1) * self.ttl if self.ttl else None, value))
+
+    def get_or_load(self, key, loader):
+        """Returns the cached value for key, calling loader() on a miss."""
+        if not self.enabled:
+            return loader()
+        version = self._version.current()
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        value = loader()
+        self.store(key, value, version)
+        return value
+
+    def stats(self):
+        stats = super().stats()
+        stats['invalidations'] = self.invalidations
+        stats['version'] = self._entries_version
+        return stats
+
+
+catalog_version = CatalogVersion()
+catalog_cache = CatalogCache(catalog_version)
+search_cache = CatalogCache(catalog_version, max_entries=256) # Ranked results for hot search queries
+page_cache = CatalogCache(catalog_version, max_entries=256) # Rendered anonymous storefront pages
+page_stats = {'not_modified': 0, 'rendered': 0, 'bypassed': 0}
+stats_cache = TTLCache(ttl=5.0, max_entries=16) # Admin dashboard counters; writes in this worker clear it
+user_cache = TTLCache(ttl=30.0, max_entries=4096) # Logged-in customers for load_user (see app/users.py)
+user_version = CatalogVersion(meta_id='users') # Bumped by user writes; every worker then drops user_cache
+user_version.subscribe(lambda version: user_cache.clear())
+
+
+# --- Anonymous Storefront Pages ---
+def _is_anonymous_browse():
+    # Logged-in pages carry the cart count and username, and flashes are per-visitor.
+    return request.method in ('GET', 'HEAD') and not current_user.is_authenticated and not session.get('_flashes')
+
+def storefront_page(view):
+    """Adds catalog-derived ETag/Last-Modified validators and a rendered-page cache to a view.
+
+    Only anonymous visitors are served from the page cache or answered with 304;
+    everyone else gets a normal render.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not _is_anonymous_browse():
+            page_stats['bypassed'] += 1
+            return view(*args, **kwargs)
+
+        version = catalog_version.current()
+        salt = current_app.config.get('PAGE_ETAG_SALT', '')
+        # The window changes when cached pages expire, so a 304 never outlives them either.
+        etag = hashlib.sha1(f"{salt}:{version}:{page_cache.window()}:{request.full_path}".encode('utf-8')).hexdigest()
+        last_modified = catalog_version.updated_at
+
+        if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+            page_stats['not_modified'] += 1
+            response = current_app.response_class(status=304)
+        else:
+            body = page_cache.get(request.full_path) if page_cache.enabled else None
+            if body is None:
+                response = make_response(view(*args, **kwargs))
+                # Redirects, flashes and anything that touched the session are per-visitor.
+                if response.status_code != 200 or session.modified:
+                    return response
+                page_stats['rendered'] += 1
+                if page_cache.enabled:
+                    page_cache.store(request.full_path, response.get_data(), version)
+            else:
+                response = current_app.response_class(body, mimetype='text/html')
+
+        response.set_etag(etag)
+        if last_modified:
+            response.last_modified = last_modified
+        response.cache_control.no_cache = True # Browsers may keep it but must revalidate
+        response.vary.add('Cookie')
+        return response
+    return wrapper
+
+
+def init_app(app):
+    """Applies cache settings from config and registers cache metrics."""
+    from .metrics import register_metrics
+    catalog_version.check_interval = app.config.get('CATALOG_VERSION_CHECK_SECONDS', 1.0)
+    catalog_cache.max_entries = app.config.get('CATALOG_CACHE_MAX_ENTRIES', 1024)
+    catalog_cache.enabled = app.config.get('CATALOG_CACHE_ENABLED', True)
+    for cache in (catalog_cache, search_cache, page_cache):
+        cache.ttl = app.config.get('CATALOG_CACHE_SECONDS', 30.0) or None
+    search_cache.max_entries = app.config.get('SEARCH_CACHE_MAX_ENTRIES', 256)
+    search_cache.enabled = app.config.get('CATALOG_CACHE_ENABLED', True)
+    page_cache.max_entries = app.config.get('PAGE_CACHE_MAX_ENTRIES', 256)
+    page_cache.enabled = app.config.get('PAGE_CACHE_ENABLED', True)
+    stats_cache.ttl = app.config.get('ADMIN_STATS_CACHE_SECONDS', 5.0)
+    stats_cache.enabled = stats_cache.ttl > 0
+    user_cache.ttl = app.config.get('USER_CACHE_SECONDS', 30.0)
+    user_cache.max_entries = app.config.get('USER_CACHE_MAX_ENTRIES', 4096)
+    user_cache.enabled = user_cache.ttl > 0
+    user_version.check_interval = app.config.get('USER_VERSION_CHECK_SECONDS', 1.0)
+    register_metrics('catalog_cache', lambda: dict(
+        catalog_cache.stats(), version_checks=catalog_version.checks, version_bumps=catalog_version.bumps
+    ))
+    register_metrics('search_cache', search_cache.stats)
+    register_metrics('page_cache', lambda: dict(page_cache.stats(), **page_stats))
+    register_metrics('stats_cache', stats_cache.stats)
+    register_metrics('user_cache', lambda: dict(
+        user_cache.stats(), version_checks=user_version.checks, version_bumps=user_version.bumps
+    ))
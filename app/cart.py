@@ -0,0 +1,105 @@
+# File: app/cart.py
+"""Session cart helpers.
+
+The cart lives in the session as {toy_id: {name, price, image_path, quantity}},
+with its unit count kept next to it as `cart_count` (save_cart keeps the two
+in step) so the navbar badge needs no work on each render.
+Names, prices and images are copied in when a toy is added, so they go stale;
+refresh_cart() re-reads every line's live values with a single $in query and
+reports lines whose price changed or whose stock no longer covers the quantity.
+"""
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from flask import session
+
+from .models import get_db
+
+CART_PROJECTION = {'name': 1, 'price': 1, 'stock': 1, 'image_path': 1}
+
+
+def cart_item_count(cart):
+    """Units in the cart; read from the session only, so it is free on every page."""
+    return sum(item.get('quantity', 0) for item in (cart or {}).values())
+
+
+def save_cart(cart):
+    """Stores the cart in the session along with its maintained unit count; an empty cart is dropped."""
+    if cart:
+        session['cart'] = cart
+        session['cart_count'] = cart_item_count(cart)
+    else:
+        session.pop('cart', None)
+        session.pop('cart_count', None)
+    session.modified = True
+
+
+def session_cart_count():
+    """The navbar count; sessions saved before cart_count existed are summed once."""
+    count = session.get('cart_count')
+    return count if count is not None else cart_item_count(session.get('cart'))
+
+
+def load_cart_toys(cart):
+    """Live name/price/stock/image for every toy in the cart, keyed by id string, in one query."""
+    ids = []
+    for toy_id in cart:
+        try:
+            ids.append(ObjectId(toy_id))
+        except (InvalidId, TypeError):
+            continue
+    if not ids:
+        return {}
+    return {str(toy['_id']): toy for toy in get_db().toys.find({'_id': {'$in': ids}}, CART_PROJECTION)}
+
+
+def refresh_cart(cart, held=None):
+    """Brings every cart line up to date with the catalog.
+
+    Updates `cart` in place: live names, prices and images are copied in and
+    lines for toys that no longer exist are dropped. Returns a summary with the
+    display lines (each flagged with previous_price / out_of_stock / short), the
+    total, the names of removed toys, and `modified` (whether the session cart
+    changed and needs saving). `held` maps toy ids to units the customer holds
+    (see reservations.py); those are out of `stock` but still theirs.
+    """
+    toys = load_cart_toys(cart)
+    held = held or {}
+    lines, removed = [], []
+    modified = False
+    for toy_id, item in list(cart.items()):
+        toy = toys.get(toy_id)
+        if toy is None:
+            removed.append(item.get('name', 'An item'))
+            del cart[toy_id]
+            modified = True
+            continue
+        price = float(toy.get('price', 0))
+        stock = toy.get('stock', 0) + held.get(toy_id, 0)
+        quantity = item.get('quantity', 0)
+        previous_price = item.get('price')
+        live = {'name': toy.get('name', item.get('name')), 'price': price, 'image_path': toy.get('image_path')}
+        if any(item.get(key) != value for key, value in live.items()) or 'image_url' in item:
+            item.update(live)
+            item.pop('image_url', None) # Older carts stored a never-populated image_url
+            modified = True
+        lines.append({
+            'id': toy_id,
+            'name': live['name'],
+            'price': price,
+            'quantity': quantity,
+            'image_path': live['image_path'],
+            'subtotal': price * quantity,
+            'stock': stock,
+            'previous_price': previous_price if previous_price is not None and previous_price != price else None,
+            'out_of_stock': stock <= 0,
+            'short': 0 < stock < quantity,
+        })
+    return {
+        'items': lines,
+        'total': sum(line['subtotal'] for line in lines),
+        'removed': removed,
+        'price_changes': sum(1 for line in lines if line['previous_price'] is not None),
+        'stock_problems': sum(1 for line in lines if line['out_of_stock'] or line['short']),
+        'modified': modified,
+    }
@@ -0,0 +1,334 @@
+# File: app/checkout.py
+"""Checkout engine: validate a cart, take the stock and store the order as one unit.
+
+A checkout costs a fixed number of round trips however many lines the cart has:
+one $in query to validate every line, one ordered bulk_write of conditional
+$inc's to take the stock, and the order insert. On a replica set / mongos the
+stock writes and the insert share a multi-document transaction. On a standalone
+server (no transactions) the same writes run with compensation instead:
+
+  1. a pending_checkouts document records what is about to be taken;
+  2. each stock decrement also tags the toy with the checkout id;
+  3. if any line could not be taken, or the order insert fails, every toy still
+     carrying the tag gets its quantity back.
+
+If a worker dies half way, `flask recover-checkouts` finishes the job for
+pending checkouts older than CHECKOUT_RECOVERY_SECONDS: it keeps the stock
+taken if the order exists and hands it back otherwise.
+
+A checkout form carries a one-off key (new_checkout_key). place_order records
+it in checkout_requests under a unique _id before touching stock, so a
+double-submitted or proxy-retried POST finds the first attempt and gets its
+order back instead of placing a second one. The key is marked done together
+with the order insert (in the same transaction when there is one), and the
+counter, cache and job updates that follow never raise, so once an order is
+stored a retry can only get that order back. Keys expire after
+CHECKOUT_KEY_TTL_SECONDS.
+
+Units the customer already holds (see reservations.py) were taken out of
+stock when they went into the cart. Checkout claims those holds in the same
+write phase and only takes the rest of each line from stock.
+"""
+
+import secrets
+import time
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from flask import current_app
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError, OperationFailure
+
+from .cart import load_cart_toys
+from .jobs import enqueue
+from .models import IST, get_db, build_order_document, record_order_created, stock_changed
+from .reservations import reservations_enabled, active_holds, claim_holds, unclaim_holds, hold_stats
+
+_transactions_supported = None # Learned on first use: None = unknown
+
+
+class CheckoutError(Exception):
+    """A cart that cannot be checked out as it stands; the message is safe to show the customer."""
+
+
+def validate_cart(cart, held=None):
+    """Checks every cart line against live stock and price with one query; returns the order items.
+
+    `held` maps toy id strings to units the customer already holds, which count as available.
+    """
+    toys = load_cart_toys(cart)
+    held = held or {}
+    items = []
+    for toy_id, line in cart.items():
+        toy = toys.get(toy_id)
+        available = toy.get('stock', 0) + held.get(toy_id, 0) if toy else 0
+        if available < line['quantity']:
+            raise CheckoutError(f"Sorry, stock for '{line['name']}' changed. Only {available} available.")
+        if float(toy.get('price', 0)) != line['price']:
+            raise CheckoutError(f"The price of '{line['name']}' has changed. Please review your cart.")
+        items.append({'toy_id': toy['_id'], 'name': toy.get('name', line['name']), 'quantity': line['quantity'], 'price': line['price']})
+    return items
+
+
+def _shortage_error(cart, claimed=None):
+    # The bulk write only tells us that some line failed; one more query says which.
+    try:
+        validate_cart(cart, claimed)
+    except CheckoutError as e:
+        return e
+    return CheckoutError('Some items in your cart just sold out. Please review your cart.')
+
+
+def _takes(items, claimed):
+    """Per line: units coming from the customer's claimed holds and units still to take from stock."""
+    takes = []
+    for item in items:
+        from_hold = min(claimed.get(str(item['toy_id']), 0), item['quantity'])
+        takes.append({'toy_id': item['toy_id'], 'quantity': item['quantity'] - from_hold, 'from_hold': from_hold})
+    return takes
+
+
+def _decrements(takes, checkout_id=None):
+    requests = []
+    for take in takes:
+        update = {'$inc': {'stock': -take['quantity']}}
+        if take['from_hold']:
+            update['$inc']['reserved'] = -take['from_hold']
+        if checkout_id is not None:
+            update['$addToSet'] = {'checkout_holds': checkout_id}
+        requests.append(UpdateOne({'_id': take['toy_id'], 'stock': {'$gte': take['quantity']}}, update))
+    return requests
+
+
+def _claim(db, user_id, items, order_id, session=None):
+    if not reservations_enabled():
+        return {}
+    return claim_holds(db, user_id, [item['toy_id'] for item in items], order_id, session=session)
+
+
+def _mark_key_done(db, checkout_key, session=None):
+    if checkout_key:
+        db.checkout_requests.update_one({'_id': checkout_key}, {'$set': {'state': 'done'}}, session=session)
+
+
+def _place_with_transaction(db, user_id, cart, items, order, checkout_key=None):
+    claims = {}
+
+    def run(session):
+        claims['claimed'] = claimed = _claim(db, user_id, items, order['_id'], session)
+        result = db.toys.bulk_write(_decrements(_takes(items, claimed)), ordered=True, session=session)
+        if result.matched_count != len(items):
+            raise CheckoutError('stock') # Aborts the transaction; the real message is built afterwards
+        db.orders.insert_one(order, session=session)
+        _mark_key_done(db, checkout_key, session)
+
+    with db.client.start_session() as session:
+        try:
+            session.with_transaction(run)
+        except CheckoutError:
+            raise _shortage_error(cart, claims.get('claimed'))
+    return claims['claimed']
+
+
+def _restore_holds(db, checkout_id, takes):
+    """Gives back the stock of every toy still tagged with this checkout."""
+    db.toys.bulk_write([
+        UpdateOne({'_id': take['toy_id'], 'checkout_holds': checkout_id},
+                  {'$inc': {'stock': take['quantity'], 'reserved': take.get('from_hold', 0)},
+                   '$pull': {'checkout_holds': checkout_id}})
+        for take in takes
+    ], ordered=False)
+
+
+def _abandon(db, checkout_id, takes):
+    """Undoes a compensation-mode checkout: stock back, cart holds active again, pending record gone."""
+    _restore_holds(db, checkout_id, takes)
+    unclaim_holds(db, checkout_id)
+    db.pending_checkouts.delete_one({'_id': checkout_id})
+
+
+def _place_with_compensation(db, user_id, cart, items, order, checkout_key=None):
+    checkout_id = order['_id']
+    # Recorded before anything is taken; recovery re-derives the held units from the claimed holds.
+    db.pending_checkouts.insert_one({
+        '_id': checkout_id,
+        'items': [{'toy_id': item['toy_id'], 'quantity': item['quantity']} for item in items],
+        'created_at': datetime.now(IST),
+    })
+    takes = _takes(items, {})
+    try:
+        claimed = _claim(db, user_id, items, checkout_id)
+        takes = _takes(items, claimed)
+        result = db.toys.bulk_write(_decrements(takes, checkout_id), ordered=True)
+        if result.matched_count != len(items):
+            _abandon(db, checkout_id, takes)
+            raise _shortage_error(cart, claimed)
+        db.orders.insert_one(order)
+    except CheckoutError:
+        raise
+    except Exception:
+        _abandon(db, checkout_id, takes)
+        raise
+    _mark_key_done(db, checkout_key)
+    try:
+        db.toys.update_many({'_id': {'$in': [item['toy_id'] for item in items]}}, {'$pull': {'checkout_holds': checkout_id}})
+        db.pending_checkouts.delete_one({'_id': checkout_id})
+    except Exception as e:
+        # The order stands; recover-checkouts drops the leftover tags and pending record later.
+        current_app.logger.error(f"Error tidying up checkout {checkout_id}: {e}", exc_info=True)
+    return claimed
+
+
+def _return_excess(db, items, claimed):
+    # Holds bigger than the ordered quantity (e.g. the cart was edited in another tab): free the rest.
+    ordered = {str(item['toy_id']): item['quantity'] for item in items}
+    excess = [UpdateOne({'_id': ObjectId(toy_id)}, {'$inc': {'stock': units - ordered[toy_id], 'reserved': ordered[toy_id] - units}})
+              for toy_id, units in claimed.items() if units > ordered.get(toy_id, units)]
+    if excess:
+        db.toys.bulk_write(excess, ordered=False)
+    return bool(excess)
+
+
+def _sold_out(db, takes):
+    # Catalog pages show whether a toy is in stock, so only an order that emptied one needs them refreshed.
+    taken = [take['toy_id'] for take in takes if take['quantity']]
+    return bool(taken) and db.toys.count_documents({'_id': {'$in': taken}, 'stock': {'$lte': 0}}, limit=1) > 0
+
+
+def _is_transactions_unsupported(error):
+    # 20 = IllegalOperation ("Transaction numbers are only allowed on a replica set member or mongos")
+    return error.code == 20 or 'Transaction numbers' in str(error)
+
+
+def new_checkout_key():
+    """A fresh idempotency key for one rendering of the checkout form."""
+    return secrets.token_urlsafe(16)
+
+
+def _claim_checkout_key(db, key, user_id):
+    """Registers a checkout attempt under `key`; returns (order id to use, whether it was already placed)."""
+    deadline = time.monotonic() + current_app.config.get('CHECKOUT_KEY_WAIT_SECONDS', 5)
+    while True:
+        order_id = ObjectId()
+        try:
+            db.checkout_requests.insert_one({
+                '_id': key, 'user_id': ObjectId(user_id), 'order_id': order_id,
+                'state': 'pending', 'created_at': datetime.now(IST),
+            })
+            return order_id, False
+        except DuplicateKeyError:
+            existing = db.checkout_requests.find_one({'_id': key})
+        if existing is None:
+            continue # The earlier attempt failed and let go of the key
+        if existing['user_id'] != ObjectId(user_id):
+            raise CheckoutError('This checkout form is no longer valid. Please try again.')
+        if existing['state'] == 'done':
+            return existing['order_id'], True
+        # A duplicate of a submission still in flight: wait for its outcome rather than racing it.
+        if time.monotonic() >= deadline:
+            raise CheckoutError('Your order is still being placed. Please check My Orders in a moment.')
+        time.sleep(0.1)
+
+
+def place_order(user_id, cart, shipping_address, phone, checkout_key=None):
+    """Validates the cart, takes its stock and stores the order atomically.
+
+    Returns (order id, replayed). Raises CheckoutError when the cart cannot be
+    fulfilled; stock is left untouched in that case. With a checkout_key, a
+    repeat of a completed submission returns the original order id with
+    replayed=True and changes nothing.
+    """
+    if not checkout_key:
+        if not cart:
+            raise CheckoutError('Your cart is empty.')
+        return _place_order(user_id, cart, shipping_address, phone, ObjectId()), False
+    db = get_db()
+    order_id, replayed = _claim_checkout_key(db, checkout_key, user_id)
+    if replayed:
+        current_app.logger.info(f"Repeated checkout submission for order {order_id} ignored.")
+        return order_id, True
+    try:
+        if not cart:
+            raise CheckoutError('Your cart is empty.')
+        _place_order(user_id, cart, shipping_address, phone, order_id, checkout_key)
+    except BaseException:
+        # Let go of the key only if no order was stored under it; otherwise a retry would place a second one.
+        if not db.orders.count_documents({'_id': order_id}, limit=1):
+            db.checkout_requests.delete_one({'_id': checkout_key, 'state': 'pending'})
+        raise
+    return order_id, False
+
+
+def _place_order(user_id, cart, shipping_address, phone, order_id, checkout_key=None):
+    global _transactions_supported
+    db = get_db()
+    held = active_holds(user_id) if reservations_enabled() else {}
+    items = validate_cart(cart, held)
+    total_amount = sum(item['price'] * item['quantity'] for item in items)
+    order = build_order_document(user_id, items, total_amount, shipping_address, phone, order_id=order_id)
+
+    use_transaction = current_app.config.get('CHECKOUT_USE_TRANSACTIONS', True) and _transactions_supported is not False
+    if use_transaction:
+        try:
+            claimed = _place_with_transaction(db, user_id, cart, items, order, checkout_key)
+            _transactions_supported = True
+        except OperationFailure as e:
+            if not _is_transactions_unsupported(e):
+                raise
+            current_app.logger.warning("MongoDB transactions unavailable; checkout falls back to compensation.")
+            _transactions_supported = False
+            use_transaction = False
+    if not use_transaction:
+        claimed = _place_with_compensation(db, user_id, cart, items, order, checkout_key)
+
+    _order_stored(db, order, items, claimed)
+    return order['_id']
+
+
+def _order_stored(db, order, items, claimed):
+    """Follow-up work for a stored order. Errors are logged, never raised: the order stands either way."""
+    try:
+        restocked = False
+        if claimed:
+            restocked = _return_excess(db, items, claimed)
+            hold_stats['converted'] += len(claimed)
+        if restocked or _sold_out(db, _takes(items, claimed)):
+            stock_changed()
+    except Exception as e:
+        current_app.logger.error(f"Error settling stock after order {order['_id']}: {e}", exc_info=True)
+    try:
+        record_order_created(order)
+    except Exception as e:
+        current_app.logger.error(f"Error updating counters for order {order['_id']}: {e}", exc_info=True)
+    enqueue('order_placed', {'order_id': str(order['_id'])})
+
+
+def recover_checkouts(older_than_seconds=None):
+    """Settles compensation-mode checkouts abandoned mid-way. Returns (kept, restored) counts."""
+    db = get_db()
+    older_than_seconds = older_than_seconds if older_than_seconds is not None else \
+        current_app.config.get('CHECKOUT_RECOVERY_SECONDS', 300)
+    cutoff = datetime.now(IST) - timedelta(seconds=older_than_seconds)
+    kept = restored = 0
+    for pending in db.pending_checkouts.find({'created_at': {'$lt': cutoff}}):
+        checkout_id = pending['_id']
+        if db.orders.find_one({'_id': checkout_id}, {'_id': 1}):
+            db.toys.update_many({'checkout_holds': checkout_id}, {'$pull': {'checkout_holds': checkout_id}})
+            kept += 1
+        else:
+            claimed = {}
+            for doc in db.stock_holds.find({'order_id': checkout_id}, {'toy_id': 1, 'quantity': 1}):
+                claimed[str(doc['toy_id'])] = claimed.get(str(doc['toy_id']), 0) + doc['quantity']
+            _restore_holds(db, checkout_id, _takes(pending['items'], claimed))
+            unclaim_holds(db, checkout_id)
+            restored += 1
+        db.pending_checkouts.delete_one({'_id': checkout_id})
+    if restored:
+        stock_changed()
+    return kept, restored
+
+
+def ensure_indexes(db):
+    db.checkout_requests.create_index(
+        'created_at', expireAfterSeconds=current_app.config.get('CHECKOUT_KEY_TTL_SECONDS', 86400), background=True
+    )
@@ -0,0 +1,90 @@
+# File: app/commands.py
+"""Maintenance commands, run with `flask <command>`."""
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from .models import rebuild_counters
+from .rollups import rebuild_rollups
+from .bulk_import import import_toys
+from .checkout import recover_checkouts
+from .reservations import release_expired_holds
+from .passwords import time_costs
+
+
+@click.command('rebuild-counters')
+@with_appcontext
+def rebuild_counters_command():
+    """Recompute the admin dashboard counters from the orders, users and toys collections."""
+    for name, doc in rebuild_counters().items():
+        values = {k: v for k, v in doc.items() if k != '_id'}
+        click.echo(f"{name}: {values}")
+
+
+@click.command('rebuild-rollups')
+@with_appcontext
+def rebuild_rollups_command():
+    """Recompute the daily, monthly and per-toy sales rollups from the orders collection."""
+    for name, count in rebuild_rollups().items():
+        click.echo(f"{name}: {count} documents")
+
+
+@click.command('import-toys')
+@click.argument('csv_path', type=click.Path(exists=True, dir_okay=False))
+@click.argument('zip_path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--report', 'report_path', type=click.Path(dir_okay=False), help='Write per-row errors to this CSV file.')
+@click.option('--batch-size', type=int, default=None, help='Rows per insert_many (default IMPORT_BATCH_SIZE).')
+@click.option('--workers', type=int, default=None, help='Image extraction threads (default IMPORT_IMAGE_WORKERS).')
+@with_appcontext
+def import_toys_command(csv_path, zip_path, report_path, batch_size, workers):
+    """Import toys from CSV_PATH with their images from ZIP_PATH. Safe to re-run."""
+    with open(csv_path, newline='', encoding='utf-8-sig') as csv_file:
+        report = import_toys(csv_file, zip_path, batch_size=batch_size, workers=workers)
+    click.echo(report.summary())
+    if report_path:
+        with open(report_path, 'w', newline='', encoding='utf-8') as fileobj:
+            report.write_csv(fileobj)
+        click.echo(f"Error report written to {report_path}")
+    elif report.errors:
+        for line, key, message in report.errors[:20]:
+            click.echo(f"  line {line} ({key}): {message}")
+
+
+@click.command('recover-checkouts')
+@click.option('--older-than', type=int, default=None, help='Seconds (default CHECKOUT_RECOVERY_SECONDS).')
+@with_appcontext
+def recover_checkouts_command(older_than):
+    """Settle checkouts interrupted mid-way when running without transactions."""
+    kept, restored = recover_checkouts(older_than)
+    click.echo(f"{kept} completed checkout(s) cleaned up, {restored} abandoned checkout(s) had their stock restored.")
+
+
+@click.command('release-holds')
+@with_appcontext
+def release_holds_command():
+    """Return the stock of expired cart holds now instead of waiting for the next sweep."""
+    click.echo(f"{release_expired_holds()} expired hold(s) released.")
+
+
+@click.command('password-cost')
+@click.option('--target-ms', type=int, default=250, help='Longest acceptable time for one hash on this machine.')
+@with_appcontext
+def password_cost_command(target_ms):
+    """Time bcrypt costs 10-14 here and suggest a BCRYPT_LOG_ROUNDS."""
+    timings = time_costs(range(10, 15))
+    for rounds, ms in timings.items():
+        click.echo(f"cost {rounds}: {ms:.0f} ms per hash")
+    fitting = [rounds for rounds, ms in timings.items() if ms <= target_ms]
+    suggested = max(fitting) if fitting else min(timings)
+    click.echo(f"Suggested BCRYPT_LOG_ROUNDS={suggested} (currently {current_app.config.get('BCRYPT_LOG_ROUNDS', 12)}); "
+               f"existing hashes are upgraded as customers log in.")
+
+
+def init_app(app):
+    app.cli.add_command(rebuild_counters_command)
+    app.cli.add_command(rebuild_rollups_command)
+    app.cli.add_command(import_toys_command)
+    app.cli.add_command(recover_checkouts_command)
+    app.cli.add_command(release_holds_command)
+    app.cli.add_command(password_cost_command)
@@ -30,6 +30,84 @@ class Config:
     # MAX_CONTENT_LENGTH = 5 * 1024 * 1024
     # --- >>> End Upload Folder Configuration <<< ---
 
+    # --- Sessions ---
+    # 'mongo' keeps sessions (and carts) server-side, 'memory' is per-process (tests), 'cookie' is Flask's default.
+    SESSION_BACKEND = (os.environ.get('SESSION_BACKEND') or 'mongo').lower()
+    SESSION_IDLE_SECONDS = int(os.environ.get('SESSION_IDLE_SECONDS') or 7 * 86400) # Server-side sessions unused this long expire
+    SESSION_TOUCH_SECONDS = int(os.environ.get('SESSION_TOUCH_SECONDS') or 300) # Min interval between expiry refreshes
+
+    # --- Passwords (app/passwords.py) ---
+    BCRYPT_LOG_ROUNDS = int(os.environ.get('BCRYPT_LOG_ROUNDS') or 12) # Existing hashes move to a new cost at next login
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS') or 2) # Hashing processes per server worker; 0 = inline
+    PASSWORD_HASH_QUEUE_DEPTH = int(os.environ.get('PASSWORD_HASH_QUEUE_DEPTH') or 8) # Waiting hashes before logins get a 503
+    PASSWORD_HASH_TIMEOUT_SECONDS = float(os.environ.get('PASSWORD_HASH_TIMEOUT_SECONDS') or 5)
+
+    # --- Login Throttling (app/throttle.py) ---
+    LOGIN_THROTTLE_ENABLED = os.environ.get('LOGIN_THROTTLE_ENABLED', 'True').lower() in ('true', '1', 't')
+    LOGIN_THROTTLE_BACKEND = (os.environ.get('LOGIN_THROTTLE_BACKEND') or 'memory').lower() # 'mongo' shares buckets across workers
+    LOGIN_IP_BURST = int(os.environ.get('LOGIN_IP_BURST') or 20) # Failed attempts allowed back to back per client IP
+    LOGIN_IP_PER_MINUTE = float(os.environ.get('LOGIN_IP_PER_MINUTE') or 10) # ...then this many per minute
+    LOGIN_ACCOUNT_BURST = int(os.environ.get('LOGIN_ACCOUNT_BURST') or 5) # Same, per email / admin username
+    LOGIN_ACCOUNT_PER_MINUTE = float(os.environ.get('LOGIN_ACCOUNT_PER_MINUTE') or 1)
+    THROTTLE_MAX_KEYS = int(os.environ.get('THROTTLE_MAX_KEYS') or 100000) # Memory backend: buckets kept per worker
+
+    # --- Catalog Pagination ---
+    # Storefront listings are keyset-paginated; page size is clamped to the max.
+    CATALOG_PAGE_SIZE = int(os.environ.get('CATALOG_PAGE_SIZE') or 24)
+    CATALOG_MAX_PAGE_SIZE = int(os.environ.get('CATALOG_MAX_PAGE_SIZE') or 100)
+    ADMIN_ORDERS_PAGE_SIZES = (25, 50, 100)
+    ADMIN_ORDERS_PAGE_SIZE = int(os.environ.get('ADMIN_ORDERS_PAGE_SIZE') or 25)
+    ADMIN_ORDERS_MAX_PAGE_SIZE = max(ADMIN_ORDERS_PAGE_SIZES)
+    ADMIN_USERS_PAGE_SIZE = int(os.environ.get('ADMIN_USERS_PAGE_SIZE') or 25)
+    ADMIN_USERS_MAX_PAGE_SIZE = 100
+    USER_CACHE_SECONDS = float(os.environ.get('USER_CACHE_SECONDS') or 30.0) # load_user cache per worker; 0 disables
+    USER_VERSION_CHECK_SECONDS = float(os.environ.get('USER_VERSION_CHECK_SECONDS') or 1.0) # Max staleness across workers
+    USER_CACHE_MAX_ENTRIES = int(os.environ.get('USER_CACHE_MAX_ENTRIES') or 4096)
+    ADMIN_STATS_CACHE_SECONDS = float(os.environ.get('ADMIN_STATS_CACHE_SECONDS') or 5.0) # 0 disables
+    STATS_DAILY_DAYS = int(os.environ.get('STATS_DAILY_DAYS') or 30)
+    STATS_MONTHLY_MONTHS = int(os.environ.get('STATS_MONTHLY_MONTHS') or 12)
+    STATS_TOP_SELLERS = int(os.environ.get('STATS_TOP_SELLERS') or 10)
+    EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE') or 1000)
+    EXPORT_MAX_BATCH_SIZE = int(os.environ.get('EXPORT_MAX_BATCH_SIZE') or 10000)
+    IMPORT_BATCH_SIZE = int(os.environ.get('IMPORT_BATCH_SIZE') or 500)
+    IMPORT_IMAGE_WORKERS = int(os.environ.get('IMPORT_IMAGE_WORKERS') or 4)
+    # Checkout uses a multi-document transaction when the server supports it (replica set / mongos)
+    CHECKOUT_USE_TRANSACTIONS = os.environ.get('CHECKOUT_USE_TRANSACTIONS', 'True').lower() in ('true', '1', 't')
+    CHECKOUT_RECOVERY_SECONDS = int(os.environ.get('CHECKOUT_RECOVERY_SECONDS') or 300)
+    CHECKOUT_KEY_TTL_SECONDS = int(os.environ.get('CHECKOUT_KEY_TTL_SECONDS') or 86400) # Replays within this window are recognised
+    CHECKOUT_KEY_WAIT_SECONDS = float(os.environ.get('CHECKOUT_KEY_WAIT_SECONDS') or 5) # How long a duplicate waits for the original
+    # Adding to the cart holds the stock for CART_HOLD_SECONDS (see app/reservations.py)
+    RESERVATIONS_ENABLED = os.environ.get('RESERVATIONS_ENABLED', 'True').lower() in ('true', '1', 't')
+    CART_HOLD_SECONDS = int(os.environ.get('CART_HOLD_SECONDS') or 900)
+    RESERVATION_SWEEP_SECONDS = float(os.environ.get('RESERVATION_SWEEP_SECONDS') or 30)
+    RESERVATION_RETENTION_SECONDS = int(os.environ.get('RESERVATION_RETENTION_SECONDS') or 86400)
+    # --- Background Jobs (app/jobs.py, run by worker.py) ---
+    JOB_LEASE_SECONDS = int(os.environ.get('JOB_LEASE_SECONDS') or 300) # A job is retried if its worker is silent this long
+    JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS') or 5) # Then it moves to jobs_dead
+    JOB_RETRY_BASE_SECONDS = float(os.environ.get('JOB_RETRY_BASE_SECONDS') or 10)
+    JOB_RETRY_MAX_SECONDS = float(os.environ.get('JOB_RETRY_MAX_SECONDS') or 3600)
+    JOB_POLL_SECONDS = float(os.environ.get('JOB_POLL_SECONDS') or 1.0)
+    LOW_STOCK_THRESHOLD = int(os.environ.get('LOW_STOCK_THRESHOLD') or 5)
+    HOMEPAGE_FEATURED_TOYS = 8 # Number of toy cards shown on the homepage
+
+    # --- Catalog Cache ---
+    # Per-worker LRU of storefront pages/toys, invalidated via a version counter in Mongo.
+    CATALOG_CACHE_ENABLED = (os.environ.get('CATALOG_CACHE_ENABLED') or 'true').lower() == 'true'
+    CATALOG_CACHE_MAX_ENTRIES = int(os.environ.get('CATALOG_CACHE_MAX_ENTRIES') or 1024)
+    CATALOG_VERSION_CHECK_SECONDS = float(os.environ.get('CATALOG_VERSION_CHECK_SECONDS') or 1.0) # Max staleness across workers
+    CATALOG_CACHE_SECONDS = float(os.environ.get('CATALOG_CACHE_SECONDS') or 30.0) # Max age of cached stock counts; 0 = no expiry
+
+    # --- Anonymous Page Cache ---
+    # Rendered storefront pages for logged-out visitors, plus ETag/Last-Modified 304s.
+    PAGE_CACHE_ENABLED = (os.environ.get('PAGE_CACHE_ENABLED') or 'true').lower() == 'true'
+    PAGE_CACHE_MAX_ENTRIES = int(os.environ.get('PAGE_CACHE_MAX_ENTRIES') or 256)
+    PAGE_ETAG_SALT = os.environ.get('PAGE_ETAG_SALT', '') # Change on deploy when templates change
+
+    # --- Search ---
+    SEARCH_PAGE_SIZE = 24
+    SEARCH_MAX_RESULTS = 240 # Ranked hits kept per query; bounds work and pages (10 pages of 24)
+    SEARCH_CACHE_MAX_ENTRIES = 256
+
 
     # Basic sanity checks
     if not SECRET_KEY or SECRET_KEY == 'a_very_strong_random_secret_key_please_change_me':
@@ -0,0 +1,135 @@
+# File: app/export.py
+"""Streaming CSV / NDJSON exports of orders, users and toys for the admin.
+
+Rows are read from a Mongo cursor in batches of `batch_size` and written out
+one batch at a time through a generator response, so an export holds at most
+one batch in memory however large the collection is.
+"""
+
+import csv
+import io
+from datetime import datetime, timedelta
+
+import pytz
+from bson import json_util
+from bson.json_util import RELAXED_JSON_OPTIONS
+from flask import current_app
+
+IST = pytz.timezone('Asia/Kolkata')
+EXPORT_FORMATS = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+
+def _iso(value):
+    if not isinstance(value, datetime):
+        return ''
+    if value.tzinfo is None:
+        value = pytz.utc.localize(value)
+    return value.astimezone(IST).isoformat()
+
+
+def _order_row(order):
+    items = order.get('items') or []
+    return [
+        str(order['_id']), _iso(order.get('created_at')), str(order.get('user_id', '')),
+        order.get('status', ''), order.get('payment_method', ''), order.get('total_amount', 0),
+        len(items), sum(int(item.get('quantity', 0)) for item in items),
+        '; '.join(f"{item.get('name')} x{item.get('quantity')}" for item in items),
+        order.get('shipping_address') or '', order.get('phone') or '',
+    ]
+
+
+def _user_row(user):
+    return [
+        str(user['_id']), user.get('username', ''), user.get('email', ''), bool(user.get('is_approved')),
+        _iso(user.get('created_at')), user.get('address') or '', user.get('phone') or '',
+    ]
+
+
+def _toy_row(toy):
+    return [
+        str(toy['_id']), toy.get('name', ''), toy.get('price', 0), toy.get('stock', 0),
+        _iso(toy.get('created_at')), _iso(toy.get('updated_at')), toy.get('description') or '',
+    ]
+
+
+EXPORTS = {
+    'orders': {
+        'columns': ['order_id', 'created_at', 'user_id', 'status', 'payment_method', 'total_amount',
+                    'line_items', 'units', 'items', 'shipping_address', 'phone'],
+        'row': _order_row,
+        'projection': None,
+        'sort': [('created_at', 1), ('_id', 1)], # Walks the (created_at, _id) index backwards
+    },
+    'users': {
+        'columns': ['user_id', 'username', 'email', 'is_approved', 'created_at', 'address', 'phone'],
+        'row': _user_row,
+        'projection': {'password_hash': 0},
+        'sort': [('_id', 1)],
+    },
+    'toys': {
+        'columns': ['toy_id', 'name', 'price', 'stock', 'created_at', 'updated_at', 'description'],
+        'row': _toy_row,
+        'projection': None,
+        'sort': [('_id', 1)],
+    },
+}
+
+
+def parse_date_range(start=None, end=None):
+    """Turns inclusive 'YYYY-MM-DD' IST dates into a created_at filter. Raises ValueError on bad input."""
+    created = {}
+    if start:
+        created['$gte'] = IST.localize(datetime.strptime(start, '%Y-%m-%d'))
+    if end:
+        created['$lt'] = IST.localize(datetime.strptime(end, '%Y-%m-%d')) + timedelta(days=1)
+    return {'created_at': created} if created else {}
+
+
+def clamp_batch_size(batch_size):
+    default = current_app.config.get('EXPORT_BATCH_SIZE', 1000)
+    maximum = current_app.config.get('EXPORT_MAX_BATCH_SIZE', 10000)
+    try:
+        batch_size = int(batch_size) if batch_size is not None else default
+    except (ValueError, TypeError):
+        batch_size = default
+    return max(1, min(batch_size, maximum))
+
+
+def open_export_cursor(db, collection, query, batch_size):
+    spec = EXPORTS[collection]
+    return db[collection].find(query, spec['projection'], sort=spec['sort'], batch_size=batch_size)
+
+
+def _batched(cursor, batch_size):
+    batch = []
+    try:
+        for doc in cursor:
+            batch.append(doc)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+    finally:
+        cursor.close() # Also runs if the client disconnects mid-download
+
+
+def stream_csv(cursor, collection, batch_size):
+    spec = EXPORTS[collection]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(spec['columns'])
+    yield buffer.getvalue()
+    for batch in _batched(cursor, batch_size):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(spec['row'](doc) for doc in batch)
+        yield buffer.getvalue()
+
+
+def stream_ndjson(cursor, collection, batch_size):
+    for batch in _batched(cursor, batch_size):
+        yield ''.join(json_util.dumps(doc, json_options=RELAXED_JSON_OPTIONS) + '\n' for doc in batch)
+
+
+STREAMERS = {'csv': stream_csv, 'ndjson': stream_ndjson}
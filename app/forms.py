@@ -2,13 +2,11 @@
 
 from flask_wtf import FlaskForm
 # Import FileField and validators
-from flask_wtf.file import FileField, FileAllowed
+from flask_wtf.file import FileField, FileAllowed, FileRequired
 from wtforms import StringField, PasswordField, SubmitField, BooleanField, TextAreaField, IntegerField, DecimalField, HiddenField
 # Make FileField optional for editing using Optional validator
 from wtforms.validators import DataRequired, Length, Email, EqualTo, ValidationError, NumberRange, Optional
 
-from .models import find_user_by_email, find_user_by_username
-
 # --- Other Forms (LoginForm, AdminLoginForm, SignupForm, etc.) ---
 # (These remain unchanged)
 class LoginForm(FlaskForm):
@@ -30,17 +28,13 @@ class SignupForm(FlaskForm):
     address = TextAreaField('Address', validators=[Optional(), Length(max=200)])
     phone = StringField('Phone Number', validators=[Optional(), Length(min=10, max=15)])
     submit = SubmitField('Sign Up')
-
-    def validate_username(self, username):
-        user = find_user_by_username(username.data)
-        if user: raise ValidationError('Username taken.')
-    def validate_email(self, email):
-        user = find_user_by_email(email.data)
-        if user: raise ValidationError('Email already registered.')
+    # Taken usernames/emails are reported by the signup route from the unique indexes (DuplicateUserError).
+    DUPLICATE_ERRORS = {'username': 'Username taken.', 'email': 'Email already registered.'}
 
 class AddressPhoneForm(FlaskForm):
     address = TextAreaField('Shipping Address', validators=[DataRequired(), Length(max=200)])
     phone = StringField('Phone Number', validators=[DataRequired(), Length(min=10, max=15)])
+    checkout_key = HiddenField() # Idempotency key; a resubmitted form returns the original order
     submit = SubmitField('Confirm Order')
 
 class UpdateProfileForm(FlaskForm):
@@ -66,4 +60,13 @@ class ToyForm(FlaskForm):
         Optional()
     ])
     stock = IntegerField('Stock Quantity', validators=[DataRequired(), NumberRange(min=0)])
-    submit = SubmitField('Save Toy')
\ No newline at end of file
+    submit = SubmitField('Save Toy')
+
+class ToyImportForm(FlaskForm):
+    csv_file = FileField('Catalog CSV', validators=[
+        FileRequired(), FileAllowed(['csv'], 'Upload the catalog as a .csv file.')
+    ])
+    images_zip = FileField('Images ZIP', validators=[
+        FileRequired(), FileAllowed(['zip'], 'Upload the images as a .zip file.')
+    ])
+    submit = SubmitField('Import Toys')
@@ -0,0 +1,207 @@
+# File: app/jobs.py
+"""A small background job queue kept in MongoDB.
+
+Routes call enqueue(name, payload) and return straight away; `python worker.py`
+runs the handlers. A job document looks like
+{_id, name, payload, state: 'queued'|'running', attempts, run_at, created_at,
+ lease_until, worker}.
+
+A worker claims the oldest due job with one find_one_and_update, which also
+leases it until JOB_LEASE_SECONDS from now. A job whose worker dies is
+claimed again once its lease runs out, so handlers must be safe to run twice.
+A failed job is retried after an exponential backoff (JOB_RETRY_BASE_SECONDS
+doubled per attempt, capped at JOB_RETRY_MAX_SECONDS). After JOB_MAX_ATTEMPTS
+it moves to the jobs_dead collection with its last error.
+
+Each worker writes its counters and recent latencies to job_workers every few
+seconds. The admin metrics endpoint shows those together with the queue depth.
+"""
+
+import os
+import random
+import socket
+import time
+import traceback
+from collections import deque
+from datetime import datetime, timedelta
+
+import pytz
+from flask import current_app
+from pymongo import ReturnDocument
+
+from .models import IST, get_db
+
+JOB_HANDLERS = {}
+
+
+def _aware(dt):
+    # Mongo hands back naive UTC datetimes.
+    return pytz.utc.localize(dt) if dt.tzinfo is None else dt
+
+
+def job(name):
+    """Registers the decorated function as the handler for jobs called `name`; it receives the payload."""
+    def register(fn):
+        JOB_HANDLERS[name] = fn
+        return fn
+    return register
+
+
+def enqueue(name, payload=None, delay_seconds=0):
+    """Queues a job; returns its id, or None if it could not be stored (the error is logged)."""
+    if name not in JOB_HANDLERS:
+        raise ValueError(f"Unknown job '{name}'")
+    now = datetime.now(IST)
+    try:
+        return get_db().jobs.insert_one({
+            'name': name, 'payload': payload or {}, 'state': 'queued', 'attempts': 0,
+            'run_at': now + timedelta(seconds=delay_seconds), 'created_at': now,
+        }).inserted_id
+    except Exception as e:
+        current_app.logger.error(f"Error queueing job '{name}': {e}", exc_info=True)
+        return None
+
+
+def claim(worker_id):
+    """Leases the oldest due job (or one whose lease ran out) to this worker; None when there is nothing to do."""
+    now = datetime.now(IST)
+    lease = current_app.config.get('JOB_LEASE_SECONDS', 300)
+    return get_db().jobs.find_one_and_update(
+        {'$or': [
+            {'state': 'queued', 'run_at': {'$lte': now}},
+            {'state': 'running', 'lease_until': {'$lte': now}},
+        ]},
+        {'$set': {'state': 'running', 'lease_until': now + timedelta(seconds=lease), 'worker': worker_id,
+                  'started_at': now},
+         '$inc': {'attempts': 1}},
+        sort=[('run_at', 1)],
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+def retry_delay(attempts):
+    """Seconds before attempt `attempts + 1`: exponential with jitter, capped."""
+    base = current_app.config.get('JOB_RETRY_BASE_SECONDS', 10)
+    cap = current_app.config.get('JOB_RETRY_MAX_SECONDS', 3600)
+    return min(cap, base * 2 ** (attempts - 1)) * random.uniform(0.8, 1.2)
+
+
+def _finish(job_doc, worker_id, error=None):
+    """Deletes a done job, reschedules a failed one or moves it to jobs_dead. Returns 'done'/'retry'/'dead'."""
+    db = get_db()
+    mine = {'_id': job_doc['_id'], 'worker': worker_id, 'state': 'running'} # Unless the lease was lost meanwhile
+    if error is None:
+        db.jobs.delete_one(mine)
+        return 'done'
+    if job_doc['attempts'] >= current_app.config.get('JOB_MAX_ATTEMPTS', 5):
+        dead = dict(job_doc, state='dead', last_error=error, failed_at=datetime.now(IST))
+        db.jobs_dead.replace_one({'_id': job_doc['_id']}, dead, upsert=True)
+        db.jobs.delete_one(mine)
+        return 'dead'
+    run_at = datetime.now(IST) + timedelta(seconds=retry_delay(job_doc['attempts']))
+    db.jobs.update_one(mine, {'$set': {'state': 'queued', 'run_at': run_at, 'last_error': error},
+                              '$unset': {'lease_until': '', 'worker': ''}})
+    return 'retry'
+
+
+class WorkerStats:
+    """Counters and recent latencies for one worker process, flushed to job_workers."""
+
+    def __init__(self, worker_id, samples=500):
+        self.worker_id = worker_id
+        self.counts = {'done': 0, 'retry': 0, 'dead': 0}
+        self.waits = deque(maxlen=samples) # Seconds from due to claimed
+        self.runs = deque(maxlen=samples) # Seconds spent in the handler
+        self.flushed_at = 0.0
+
+    def record(self, job_doc, outcome, run_seconds):
+        self.counts[outcome] += 1
+        self.waits.append(max((_aware(job_doc['started_at']) - _aware(job_doc['run_at'])).total_seconds(), 0.0))
+        self.runs.append(run_seconds)
+
+    @staticmethod
+    def _p(samples, pct):
+        if not samples:
+            return 0.0
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))]
+
+    def flush(self, force=False):
+        if not force and time.monotonic() - self.flushed_at < 5:
+            return
+        self.flushed_at = time.monotonic()
+        get_db().job_workers.replace_one({'_id': self.worker_id}, {
+            '_id': self.worker_id, 'heartbeat_at': datetime.now(IST), **self.counts,
+            'wait_p50': self._p(self.waits, 50), 'wait_p95': self._p(self.waits, 95),
+            'run_p50': self._p(self.runs, 50), 'run_p95': self._p(self.runs, 95),
+        }, upsert=True)
+
+
+def run_one(worker_id, stats=None):
+    """Claims and runs one job. Returns False when the queue had nothing due."""
+    job_doc = claim(worker_id)
+    if job_doc is None:
+        return False
+    start = time.perf_counter()
+    error = None
+    try:
+        handler = JOB_HANDLERS.get(job_doc['name'])
+        if handler is None:
+            raise LookupError(f"No handler registered for job '{job_doc['name']}'")
+        handler(job_doc['payload'])
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        current_app.logger.error(f"Job {job_doc['_id']} ({job_doc['name']}) failed on attempt "
+                                 f"{job_doc['attempts']}: {error}\n{traceback.format_exc()}")
+    outcome = _finish(job_doc, worker_id, error)
+    if stats:
+        stats.record(job_doc, outcome, time.perf_counter() - start)
+    return True
+
+
+def run_worker(app, poll_seconds=None, once=False):
+    """Runs jobs until interrupted (or, with once=True, until the queue is empty)."""
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    with app.app_context():
+        poll_seconds = poll_seconds or app.config.get('JOB_POLL_SECONDS', 1.0)
+        stats = WorkerStats(worker_id)
+        app.logger.info(f"Job worker {worker_id} started; handlers: {', '.join(sorted(JOB_HANDLERS))}")
+        try:
+            while True:
+                busy = run_one(worker_id, stats)
+                stats.flush()
+                if not busy:
+                    if once:
+                        break
+                    time.sleep(poll_seconds)
+        finally:
+            stats.flush(force=True)
+
+
+def queue_metrics():
+    """Queue depth, how overdue the oldest job is, dead letters, and each live worker's last report."""
+    db = get_db()
+    now = datetime.now(IST)
+    oldest = db.jobs.find_one({'state': 'queued', 'run_at': {'$lte': now}}, {'run_at': 1}, sort=[('run_at', 1)])
+    oldest_age = 0.0
+    if oldest:
+        oldest_age = max((now - _aware(oldest['run_at'])).total_seconds(), 0.0)
+    return {
+        'queued': db.jobs.count_documents({'state': 'queued'}),
+        'running': db.jobs.count_documents({'state': 'running'}),
+        'dead': db.jobs_dead.estimated_document_count(),
+        'oldest_due_seconds': round(oldest_age, 1),
+        'workers': {doc.pop('_id'): doc for doc in db.job_workers.find({}, {'heartbeat_at': 0})},
+    }
+
+
+def ensure_indexes(db):
+    db.jobs.create_index([('state', 1), ('run_at', 1)], background=True)
+    db.jobs.create_index([('state', 1), ('lease_until', 1)], background=True)
+    db.job_workers.create_index('heartbeat_at', expireAfterSeconds=3600, background=True) # Forget stopped workers
+
+
+def init_app(app):
+    from .metrics import register_metrics
+    from . import tasks # noqa: F401 - registers the job handlers
+    register_metrics('jobs', queue_metrics)
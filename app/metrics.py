@@ -0,0 +1,25 @@
+# File: app/metrics.py
+"""Process-local metrics registry.
+
+Subsystems register a provider that returns a dict of numbers; the admin
+metrics endpoint collects every provider into one JSON snapshot. Values are
+per worker process, so a scraper should expect one snapshot per worker.
+"""
+
+import os
+
+_providers = {}
+
+def register_metrics(name, provider):
+    """Registers (or replaces) the metrics provider for a subsystem."""
+    _providers[name] = provider
+
+def collect_metrics():
+    """Returns {'pid': ..., <subsystem>: {...}} for every registered provider."""
+    snapshot = {'pid': os.getpid()}
+    for name, provider in sorted(_providers.items()):
+        try:
+            snapshot[name] = provider()
+        except Exception as e:
+            snapshot[name] = {'error': str(e)}
+    return snapshot
@@ -1,9 +1,16 @@
 # File: app/models.py
 
 from flask import current_app
-from bson import ObjectId
-from app import mongo, bcrypt # Keep mongo import for get_db() helper
+from bson import ObjectId, json_util
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from app import mongo # Keep mongo import for get_db() helper
+from app.cache import catalog_cache, catalog_version, search_cache, stats_cache, user_version
+from app.suggest import toy_name_index, record_name_change
+from app.passwords import hash_password
+from app import rollups
 from datetime import datetime
+import base64
 import pytz
 import traceback # Import traceback for better exception printing
 
@@ -16,10 +23,115 @@ def get_db():
     if not hasattr(mongo, 'cx') or mongo.cx is None: raise RuntimeError("mongo.cx not available.")
     return mongo.cx[db_name]
 
+# --- Projection Shapes ---
+# List pages ask for one of these named shapes instead of whole documents:
+#   'card'   - what a storefront/customer card renders
+#   'row'    - what an admin table row renders
+#   'detail' - the full document (minus secrets)
+# Model functions also accept an explicit projection dict.
+TOY_PROJECTIONS = {
+    'card': {
+        'name': 1, 'price': 1, 'image_path': 1, 'stock': 1, 'updated_at': 1,
+        # Cards show at most 80 characters; 81 lets templates still detect truncation.
+        'description': {'$substrCP': ['$description', 0, 81]},
+    },
+    'row': {'name': 1, 'price': 1, 'image_path': 1, 'stock': 1, 'reserved': 1, 'updated_at': 1},
+    'detail': None,
+}
+ORDER_PROJECTIONS = {
+    'card': {'created_at': 1, 'total_amount': 1, 'status': 1, 'items.name': 1, 'items.quantity': 1},
+    'row': {'user_id': 1, 'created_at': 1, 'total_amount': 1, 'status': 1, 'payment_method': 1},
+    'detail': None,
+}
+USER_PROJECTIONS = {
+    'card': {'username': 1, 'email': 1},
+    'row': {'username': 1, 'email': 1, 'created_at': 1, 'address': 1, 'phone': 1, 'is_approved': 1},
+    'session': {'username': 1, 'email': 1, 'address': 1, 'phone': 1, 'is_approved': 1}, # current_user
+    'detail': {'password_hash': 0},
+}
+
+def resolve_projection(shapes, projection):
+    """Turns a shape name into its projection dict; dicts and None pass through."""
+    if projection is None or isinstance(projection, dict):
+        return projection
+    if projection not in shapes:
+        raise ValueError(f"Unknown projection shape '{projection}'. Expected one of {sorted(shapes)}.")
+    return shapes[projection]
+
+
+# --- Counters ---
+# Totals shown in the admin UI live in `counters` documents that the model
+# functions adjust as they write, so reading a total is one _id lookup rather
+# than a count over the collection. rebuild_*_counters() recomputes them from
+# scratch (run at startup when missing, or manually after out-of-band edits).
+def _bump_counter(name, increments):
+    try:
+        get_db().counters.update_one({'_id': name}, {'$inc': increments}, upsert=True)
+        stats_cache.clear()
+    except Exception as e:
+        current_app.logger.error(f"Error updating '{name}' counters {increments}: {e}", exc_info=True)
+
+def get_counters(name):
+    """Returns the counters document for `name`, rebuilding it first if it does not exist yet."""
+    doc = get_db().counters.find_one({'_id': name})
+    if doc is None and name in COUNTER_REBUILDERS:
+        doc = COUNTER_REBUILDERS[name]()
+    return doc or {}
+
+def rebuild_order_counters():
+    db = get_db()
+    groups = db.orders.aggregate([{'$group': {'_id': '$status', 'count': {'$sum': 1}}}])
+    by_status = {group['_id']: group['count'] for group in groups if group['_id']}
+    doc = {'total': sum(by_status.values()), 'by_status': by_status}
+    db.counters.replace_one({'_id': 'orders'}, doc, upsert=True)
+    return dict(doc, _id='orders')
+
+def rebuild_user_counters():
+    db = get_db()
+    groups = db.users.aggregate([{'$group': {'_id': '$is_approved', 'count': {'$sum': 1}}}])
+    by_flag = {group['_id']: group['count'] for group in groups}
+    doc = {'approved': by_flag.get(True, 0), 'pending': by_flag.get(False, 0)}
+    db.counters.replace_one({'_id': 'users'}, doc, upsert=True)
+    return dict(doc, _id='users')
+
+def rebuild_toy_counters():
+    db = get_db()
+    doc = {'total': db.toys.count_documents({})}
+    db.counters.replace_one({'_id': 'toys'}, doc, upsert=True)
+    return dict(doc, _id='toys')
+
+COUNTER_REBUILDERS = {
+    'orders': rebuild_order_counters,
+    'users': rebuild_user_counters,
+    'toys': rebuild_toy_counters,
+}
+
+def rebuild_counters():
+    """Recomputes every counters document from the underlying collections."""
+    return {name: rebuild() for name, rebuild in COUNTER_REBUILDERS.items()}
+
+
 # --- User Functions (Corrected Formatting) ---
+class DuplicateUserError(Exception):
+    """The username or email is already registered; `field` names which ('username' or 'email')."""
+
+    def __init__(self, field):
+        super().__init__(f"{field} already registered")
+        self.field = field
+
+def _duplicate_user_field(error):
+    # Newer servers name the violated index's keys; older ones only mention the index in the message.
+    key_pattern = (error.details or {}).get('keyPattern') or {}
+    for field in ('username', 'email'):
+        if field in key_pattern:
+            return field
+    return 'username' if 'username' in str(error) else 'email'
+
 def create_user(username, email, password, address=None, phone=None):
+    """Inserts a pending customer in one round trip; the unique indexes on email and username
+    catch duplicates, raised as DuplicateUserError. Returns the new id, or None on a server error."""
     db = get_db()
-    hashed_password = bcrypt.generate_password_hash(password).decode('utf-8')
+    hashed_password = hash_password(password) # Off the request thread; may raise PasswordHasherBusy
     user_data = {
         'username': username.lower(),
         'email': email.lower(),
@@ -31,7 +143,10 @@ def create_user(username, email, password, address=None, phone=None):
     }
     try:
         result = db.users.insert_one(user_data)
+        _bump_counter('users', {'pending': 1})
         return result.inserted_id
+    except DuplicateKeyError as e:
+        raise DuplicateUserError(_duplicate_user_field(e))
     except Exception as e:
         current_app.logger.error(f"Error creating user: {e}", exc_info=True)
         return None
@@ -44,30 +159,69 @@ def find_user_by_username(username):
     db = get_db()
     return db.users.find_one({'username': username.lower()})
 
-def find_user_by_id(user_id):
+def find_user_by_id(user_id, projection=None):
     """Finds a user by their MongoDB ObjectId string."""
     db = get_db()
     try:
         # Ensure user_id is a valid ObjectId before querying
         obj_id = ObjectId(user_id)
-        return db.users.find_one({'_id': obj_id})
+        return db.users.find_one({'_id': obj_id}, resolve_projection(USER_PROJECTIONS, projection))
     except Exception as e:
         # Log if it's an invalid ID format or other error
         current_app.logger.warning(f"Error finding user by ID '{user_id}': {e}")
         return None
 
-def get_pending_users():
+USER_SORT = [('created_at', 1), ('_id', 1)]
+
+def get_users_page(approved, after=None, before=None, limit=None, projection='row'):
+    """One page of pending (approved=False) or approved users, oldest registration first.
+
+    Keyset-paginated on (created_at, _id) over the (is_approved, created_at, _id) index;
+    the total comes from the user counters.
+    """
     db = get_db()
-    return list(db.users.find({'is_approved': False}).sort('created_at', 1))
+    limit = clamp_page_size(limit, default_key='ADMIN_USERS_PAGE_SIZE', max_key='ADMIN_USERS_MAX_PAGE_SIZE')
+    sort_name = 'users_approved' if approved else 'users_pending'
+    query, mongo_sort, backwards, edge = _apply_keyset_cursor({'is_approved': approved}, sort_name, USER_SORT, after, before)
+    fields = _with_sort_keys(resolve_projection(USER_PROJECTIONS, projection), USER_SORT)
+    page = {'users': [], 'limit': limit, 'total': 0, 'next_cursor': None, 'prev_cursor': None}
+    try:
+        rows = list(db.users.find(query, fields).sort(mongo_sort).limit(limit + 1))
+    except Exception as e:
+        current_app.logger.error(f"Error loading users page (approved={approved}): {e}", exc_info=True)
+        return page
+    page['users'], page['next_cursor'], page['prev_cursor'] = _keyset_page(rows, limit, sort_name, USER_SORT, backwards, edge)
+    page['total'] = get_counters('users').get('approved' if approved else 'pending', 0)
+    return page
+
+def _users_changed():
+    """Bumps the shared users version so every worker drops its cached logged-in users."""
+    try:
+        user_version.bump()
+    except Exception as e:
+        current_app.logger.error(f"Error bumping users version: {e}", exc_info=True)
 
-def get_approved_users():
+def approve_users(user_ids):
+    """Approves many pending users with one update_many; returns how many were approved, or None on error."""
     db = get_db()
-    return list(db.users.find({'is_approved': True}).sort('created_at', 1))
+    try:
+        ids = [ObjectId(user_id) for user_id in user_ids]
+        result = db.users.update_many({'_id': {'$in': ids}, 'is_approved': False}, {'$set': {'is_approved': True}})
+        if result.modified_count > 0:
+            _bump_counter('users', {'pending': -result.modified_count, 'approved': result.modified_count})
+            _users_changed()
+        return result.modified_count
+    except Exception as e:
+        current_app.logger.error(f"Error bulk-approving {len(user_ids)} users: {e}", exc_info=True)
+        return None
 
 def approve_user(user_id):
     db = get_db()
     try:
-        result = db.users.update_one({'_id': ObjectId(user_id)}, {'$set': {'is_approved': True}})
+        result = db.users.update_one({'_id': ObjectId(user_id), 'is_approved': False}, {'$set': {'is_approved': True}})
+        if result.modified_count > 0:
+            _bump_counter('users', {'pending': -1, 'approved': 1})
+            _users_changed()
         return result.modified_count > 0
     except Exception as e:
         current_app.logger.error(f"Error approving user {user_id}: {e}", exc_info=True)
@@ -80,13 +234,39 @@ def update_user_profile(user_id, address, phone):
             {'_id': ObjectId(user_id)},
             {'$set': {'address': address, 'phone': phone, 'updated_at': datetime.now(IST)}}
         )
+        if result.modified_count > 0:
+            _users_changed()
         return result.modified_count > 0
     except Exception as e:
         current_app.logger.error(f"Error updating profile for user {user_id}: {e}", exc_info=True)
         return False
 
+def save_profile_defaults(user_id, address, phone, as_of):
+    """update_user_profile for the background job: a profile changed after `as_of` is left alone,
+    and errors propagate so the job is retried. Returns whether the profile changed."""
+    result = get_db().users.update_one(
+        {'_id': ObjectId(user_id), '$or': [{'updated_at': {'$lt': as_of}}, {'updated_at': {'$exists': False}}]},
+        {'$set': {'address': address, 'phone': phone, 'updated_at': as_of}}
+    )
+    if result.modified_count > 0:
+        _users_changed() # Runs in worker.py: the web workers see the bump and drop their copies
+    return result.modified_count > 0
+
 
 # --- Toy Functions (Corrected Formatting) ---
+def _catalog_changed(names=False):
+    """Bumps the shared catalog version so every worker drops its cached catalog pages.
+
+    names=True also bumps the toy-name counter that keeps suggest indexes in sync.
+    """
+    try:
+        previous_names_version = toy_name_index.names_version
+        meta = catalog_version.bump(names=names)
+        if names:
+            record_name_change(meta, previous_names_version)
+    except Exception as e:
+        current_app.logger.error(f"Error bumping catalog version: {e}", exc_info=True)
+
 def add_toy(name, description, price, image_path, stock):
     db = get_db()
     toy_data = {
@@ -96,17 +276,236 @@ def add_toy(name, description, price, image_path, stock):
     }
     try:
         result = db.toys.insert_one(toy_data)
+        toy_name_index.add(result.inserted_id, name)
+        _catalog_changed(names=True)
+        _bump_counter('toys', {'total': 1})
         return result.inserted_id
     except Exception as e:
          current_app.logger.error(f"Error adding toy '{name}': {e}", exc_info=True)
          return None
 
-def get_all_toys(in_stock_only=False):
+def add_toys(toys):
+    """Inserts prepared toy documents with one unordered insert_many (bulk import).
+
+    Returns (inserted, errors): the inserted documents, and {index in `toys`: message}
+    for rows that failed, e.g. an import_key that was already imported.
+    """
+    db = get_db()
+    now = datetime.now(IST)
+    docs = [dict(toy, created_at=now, updated_at=now) for toy in toys]
+    errors = {}
+    try:
+        db.toys.insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        for error in e.details.get('writeErrors', []):
+            duplicate = error.get('code') == 11000
+            errors[error['index']] = 'Already imported (duplicate import key).' if duplicate else error.get('errmsg', 'Insert failed.')
+    except Exception as e:
+        current_app.logger.error(f"Error bulk-inserting {len(docs)} toys: {e}", exc_info=True)
+        return [], {index: 'Database error while inserting.' for index in range(len(docs))}
+    inserted = [doc for index, doc in enumerate(docs) if index not in errors]
+    if inserted:
+        toy_name_index.add_many((doc['_id'], doc['name']) for doc in inserted)
+        _catalog_changed(names=True)
+        _bump_counter('toys', {'total': len(inserted)})
+    return inserted, errors
+
+def find_imported_keys(import_keys):
+    """Returns which of the given import keys already exist in the catalog."""
     db = get_db()
+    return {toy['import_key'] for toy in db.toys.find({'import_key': {'$in': list(import_keys)}}, {'import_key': 1})}
+
+def get_all_toys(in_stock_only=False, projection='detail'):
+    db = get_db()
+    query = {}
+    if in_stock_only:
+        query['stock'] = {'$gt': 0}
+    fields = resolve_projection(TOY_PROJECTIONS, projection)
+    return list(db.toys.find(query, fields).sort('name', 1))
+
+# --- Catalog Pagination (Keyset) ---
+# Pages are addressed by an opaque cursor holding the (sort key, _id) of the
+# row at the page edge. The next page is "everything strictly after that
+# pair", which Mongo answers by seeking into the index - no skip(), so page
+# 500 costs the same as page 1. Each sort has a matching index created in
+# create_app: (sort key, _id, stock, price), so the in-stock and price
+# filters are checked on index keys before any document is fetched.
+CATALOG_SORTS = {
+    'name': [('name', 1), ('_id', 1)],
+    'price_asc': [('price', 1), ('_id', 1)],
+    'price_desc': [('price', -1), ('_id', -1)],
+    'newest': [('created_at', -1), ('_id', -1)],
+}
+
+def _encode_cursor(sort, values):
+    raw = json_util.dumps({'s': sort, 'v': values}).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+CURSOR_VALUE_TYPES = (str, int, float, datetime, ObjectId, type(None)) # Plain values only: no operators or regexes
+
+def _decode_cursor(cursor, sort, sort_spec):
+    """Returns the sort values in a cursor, or None if it is malformed, tampered with or from another sort."""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json_util.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except Exception as e: # Anything from bad base64 to an invalid {"$oid": ...}
+        current_app.logger.warning(f"Ignoring malformed page cursor '{cursor}': {e}")
+        return None
+    if not isinstance(payload, dict) or payload.get('s') != sort:
+        return None
+    values = payload.get('v')
+    if not isinstance(values, list) or len(values) != len(sort_spec) or \
+            not all(isinstance(value, CURSOR_VALUE_TYPES) and not isinstance(value, bool) for value in values):
+        current_app.logger.warning(f"Ignoring page cursor with unexpected values '{cursor}'")
+        return None
+    return values
+
+def _cursor_values(doc, sort_spec):
+    return [doc.get(field) for field, _ in sort_spec]
+
+def _keyset_filter(sort_spec, values, backwards=False):
+    """Builds the filter selecting rows strictly after (or before) the given sort values."""
+    clauses = []
+    for i, (field, direction) in enumerate(sort_spec):
+        forward = (direction == 1) != backwards
+        clause = {f: v for (f, _), v in zip(sort_spec[:i], values[:i])}
+        clause[field] = {'$gt' if forward else '$lt': values[i]}
+        clauses.append(clause)
+    return {'$or': clauses}
+
+def clamp_page_size(limit, default_key='CATALOG_PAGE_SIZE', max_key='CATALOG_MAX_PAGE_SIZE'):
+    """Coerces a requested page size into the configured [1, max] range."""
+    default = current_app.config.get(default_key, 24)
+    maximum = current_app.config.get(max_key, 100)
+    try:
+        limit = int(limit) if limit is not None else default
+    except (ValueError, TypeError):
+        limit = default
+    return max(1, min(limit, maximum))
+
+def _catalog_filter(in_stock_only=False, min_price=None, max_price=None):
     query = {}
     if in_stock_only:
         query['stock'] = {'$gt': 0}
-    return list(db.toys.find(query).sort('name', 1))
+    price = {}
+    if min_price is not None:
+        price['$gte'] = float(min_price)
+    if max_price is not None:
+        price['$lt'] = float(max_price)
+    if price:
+        query['price'] = price
+    return query
+
+def get_toys_page(in_stock_only=True, after=None, before=None, limit=None, sort='name', projection='card',
+                  min_price=None, max_price=None):
+    """Returns one keyset-paginated page of the catalog.
+
+    `after`/`before` are cursors taken from a previous page's `next_cursor`/`prev_cursor`.
+    `sort` is a CATALOG_SORTS key; prices filter on min_price <= price < max_price.
+    Pages requested with a named projection shape are served from the catalog cache.
+    """
+    limit = clamp_page_size(limit)
+    sort = sort if sort in CATALOG_SORTS else 'name'
+    query = _catalog_filter(in_stock_only, min_price, max_price)
+    load = lambda: _load_toys_page(query, after, before, limit, sort, projection)
+    if not isinstance(projection, str):
+        return load()
+    key = ('toys_page', in_stock_only, min_price, max_price, after, before, limit, sort, projection)
+    return catalog_cache.get_or_load(key, load)
+
+def _apply_keyset_cursor(query, sort_name, sort_spec, after, before):
+    """Narrows query to the rows after/before a cursor.
+
+    Returns (query, mongo_sort, backwards, edge) where edge is the decoded cursor or None.
+    """
+    query = dict(query)
+    after_values = _decode_cursor(after, sort_name, sort_spec)
+    before_values = _decode_cursor(before, sort_name, sort_spec) if after_values is None else None
+    backwards = before_values is not None
+    edge = after_values or before_values
+    if edge is not None and len(edge) == len(sort_spec):
+        query.update(_keyset_filter(sort_spec, edge, backwards))
+    else:
+        backwards = False
+        edge = None
+    mongo_sort = [(field, -direction if backwards else direction) for field, direction in sort_spec]
+    return query, mongo_sort, backwards, edge
+
+def _keyset_page(rows, limit, sort_name, sort_spec, backwards, edge):
+    """Turns limit+1 fetched rows into (rows, next_cursor, prev_cursor) in display order."""
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if backwards:
+        rows.reverse()
+    next_cursor = prev_cursor = None
+    if rows:
+        if has_more or backwards:
+            next_cursor = _encode_cursor(sort_name, _cursor_values(rows[-1], sort_spec))
+        if edge is not None and (has_more or not backwards):
+            prev_cursor = _encode_cursor(sort_name, _cursor_values(rows[0], sort_spec))
+    return rows, next_cursor, prev_cursor
+
+def _with_sort_keys(fields, sort_spec):
+    # Cursor values are read back from each row, so sort keys must be projected.
+    if fields is not None and not any(v == 0 for v in fields.values()):
+        fields = dict(fields, **{field: 1 for field, _ in sort_spec})
+    return fields
+
+def _load_toys_page(query, after, before, limit, sort, projection):
+    db = get_db()
+    sort_spec = CATALOG_SORTS[sort]
+    query, mongo_sort, backwards, edge = _apply_keyset_cursor(query, sort, sort_spec, after, before)
+    fields = _with_sort_keys(resolve_projection(TOY_PROJECTIONS, projection), sort_spec)
+    # Fetch one extra row to learn whether another page exists in this direction.
+    toys = list(db.toys.find(query, fields).sort(mongo_sort).limit(limit + 1))
+    toys, next_cursor, prev_cursor = _keyset_page(toys, limit, sort, sort_spec, backwards, edge)
+    return {'toys': toys, 'limit': limit, 'sort': sort, 'next_cursor': next_cursor, 'prev_cursor': prev_cursor}
+
+# Upper bounds of the price facet buckets (INR); the last bucket is open-ended.
+PRICE_FACET_BOUNDARIES = [0, 250, 500, 1000, 2500, 5000]
+
+def get_toy_facets(in_stock_only=True, min_price=None, max_price=None):
+    """Counts toys per price bucket and per availability in a single $facet aggregation.
+
+    Each facet ignores its own filter, so the counts show what selecting it would return.
+    """
+    key = ('toy_facets', in_stock_only, min_price, max_price)
+    try:
+        return catalog_cache.get_or_load(key, lambda: _load_toy_facets(in_stock_only, min_price, max_price))
+    except Exception as e:
+        current_app.logger.error(f"Error computing toy facets: {e}", exc_info=True)
+        return {'price_ranges': [], 'in_stock': 0, 'out_of_stock': 0}
+
+def _load_toy_facets(in_stock_only, min_price, max_price):
+    db = get_db()
+    last = PRICE_FACET_BOUNDARIES[-1]
+    pipeline = [
+        {'$project': {'_id': 0, 'price': 1, 'stock': 1}},
+        {'$facet': {
+            'price': [
+                {'$match': _catalog_filter(in_stock_only=in_stock_only)},
+                {'$bucket': {
+                    'groupBy': '$price', 'boundaries': PRICE_FACET_BOUNDARIES,
+                    'default': last, 'output': {'count': {'$sum': 1}}
+                }},
+            ],
+            'availability': [
+                {'$match': _catalog_filter(min_price=min_price, max_price=max_price)},
+                {'$group': {'_id': {'$gt': ['$stock', 0]}, 'count': {'$sum': 1}}},
+            ],
+        }},
+    ]
+    result = next(db.toys.aggregate(pipeline), None) or {}
+    facets = {'price_ranges': [], 'in_stock': 0, 'out_of_stock': 0}
+    counts = {bucket['_id']: bucket['count'] for bucket in result.get('price', [])}
+    bounds = PRICE_FACET_BOUNDARIES[1:] + [None]
+    for lower, upper in zip(PRICE_FACET_BOUNDARIES, bounds):
+        facets['price_ranges'].append({'min': lower, 'max': upper, 'count': counts.get(lower, 0)})
+    for group in result.get('availability', []):
+        facets['in_stock' if group['_id'] else 'out_of_stock'] = group['count']
+    return facets
 
 def find_toy_by_id(toy_id):
     db = get_db()
@@ -117,18 +516,96 @@ def find_toy_by_id(toy_id):
         current_app.logger.warning(f"Error finding toy by ID '{toy_id}': {e}")
         return None
 
+# --- Toy Search ---
+SEARCH_QUERY_MAX_LENGTH = 100
+
+def normalize_search_query(q):
+    """Collapses whitespace and case so equivalent queries share a cache entry."""
+    return ' '.join((q or '').lower().split())[:SEARCH_QUERY_MAX_LENGTH]
+
+def search_toys(q, page=1, limit=None):
+    """Ranked full-text search over in-stock toys, using the weighted text index.
+
+    The top SEARCH_MAX_RESULTS hits for a query are fetched once, cached per
+    catalog version, and paged in memory, so deeper pages cost nothing extra.
+    """
+    query = normalize_search_query(q)
+    limit = clamp_page_size(limit, default_key='SEARCH_PAGE_SIZE')
+    try:
+        page = max(1, int(page))
+    except (ValueError, TypeError):
+        page = 1
+    results = []
+    if query:
+        try:
+            results = search_cache.get_or_load(query, lambda: _load_search_results(query))
+        except Exception as e:
+            current_app.logger.error(f"Error searching toys for '{query}': {e}", exc_info=True)
+    pages = max(1, -(-len(results) // limit))
+    page = min(page, pages)
+    start = (page - 1) * limit
+    return {
+        'query': query, 'toys': results[start:start + limit], 'total': len(results),
+        'page': page, 'pages': pages, 'limit': limit,
+    }
+
+def _load_search_results(query):
+    db = get_db()
+    max_results = current_app.config.get('SEARCH_MAX_RESULTS', 240)
+    fields = dict(TOY_PROJECTIONS['card'], score={'$meta': 'textScore'})
+    return list(
+        db.toys.find({'$text': {'$search': query}, 'stock': {'$gt': 0}}, fields)
+        .sort([('score', {'$meta': 'textScore'}), ('_id', 1)])
+        .limit(max_results)
+    )
+
+def get_catalog_toy(toy_id):
+    """Cached find_toy_by_id for storefront pages. Do not use where live stock matters."""
+    return catalog_cache.get_or_load(('toy', str(toy_id)), lambda: find_toy_by_id(toy_id))
+
+class StockBelowReservedError(Exception):
+    """The stock entered for a toy is less than the units customers hold in their carts."""
+
+    def __init__(self, reserved):
+        super().__init__(f"{reserved} units are held in carts")
+        self.reserved = reserved
+
 def update_toy(toy_id, name, description, price, image_path, stock):
+    """Saves the edit form. `stock` is the units on hand, held ones included: the free
+    `stock` stored is that minus the toy's `reserved`, read and written together so a
+    hold placed or returned meanwhile is not lost. Raises StockBelowReservedError."""
     db = get_db()
     try:
-        result = db.toys.update_one(
-            {'_id': ObjectId(toy_id)},
-            {'$set': {
-                'name': name, 'description': description, 'price': float(price),
-                'image_path': image_path, 'stock': int(stock),
-                'updated_at': datetime.now(IST)
-            }}
-        )
-        return result.modified_count > 0
+        obj_id = ObjectId(toy_id)
+        for _ in range(5): # Retries only when holds moved between the read and the write
+            toy = db.toys.find_one({'_id': obj_id}, {'reserved': 1})
+            if toy is None:
+                return False
+            reserved = toy.get('reserved', 0)
+            if int(stock) < reserved:
+                raise StockBelowReservedError(reserved)
+            previous = db.toys.find_one_and_update(
+                {'_id': obj_id, 'reserved': reserved if reserved else {'$in': [0, None]}},
+                {'$set': {
+                    'name': name, 'description': description, 'price': float(price),
+                    'image_path': image_path, 'stock': int(stock) - reserved,
+                    'updated_at': datetime.now(IST)
+                }},
+                projection={'name': 1}, return_document=ReturnDocument.BEFORE
+            )
+            if previous is not None:
+                break
+        else:
+            current_app.logger.warning(f"Toy {toy_id} not updated: its cart holds kept changing.")
+            return False
+        # A rename makes every worker rebuild its suggest index; price/stock/description edits need not.
+        renamed = previous.get('name') != name
+        if renamed:
+            toy_name_index.update(toy_id, name)
+        _catalog_changed(names=renamed)
+        return True
+    except StockBelowReservedError:
+        raise
     except Exception as e:
         current_app.logger.error(f"Error updating toy {toy_id}: {e}", exc_info=True)
         return False
@@ -137,53 +614,129 @@ def delete_toy(toy_id):
     db = get_db()
     try:
         result = db.toys.delete_one({'_id': ObjectId(toy_id)})
+        if result.deleted_count > 0:
+            toy_name_index.remove(toy_id)
+            _catalog_changed(names=True)
+            _bump_counter('toys', {'total': -1})
         return result.deleted_count > 0
     except Exception as e:
         current_app.logger.error(f"Error deleting toy {toy_id}: {e}", exc_info=True)
         return False
 
+def stock_changed():
+    """Call when a toy sold out or came back into stock, so cached catalog pages are refreshed.
+
+    Cart holds and orders that leave a toy in stock do not call it: every bump empties
+    every worker's catalog, search and page caches. The unit counts on cached toy pages
+    lag by at most CATALOG_CACHE_SECONDS. Add-to-cart and checkout check live stock themselves.
+    """
+    _catalog_changed()
+
 def update_stock(toy_id, quantity_change):
     db = get_db()
     try:
-        result = db.toys.update_one(
+        previous = db.toys.find_one_and_update(
             {'_id': ObjectId(toy_id), 'stock': {'$gte': -quantity_change}},
-            {'$inc': {'stock': quantity_change}}
+            {'$inc': {'stock': quantity_change}},
+            projection={'stock': 1}, return_document=ReturnDocument.BEFORE
         )
-        if result.matched_count == 0 and quantity_change < 0:
+        if previous is None and quantity_change < 0:
              current_app.logger.warning(f"Stock update failed for toy {toy_id}, likely insufficient stock for change {quantity_change}")
              return False
-        return result.modified_count > 0
+        if previous is None or not quantity_change:
+            return False
+        if (previous['stock'] > 0) != (previous['stock'] + quantity_change > 0):
+            stock_changed()
+        return True
     except Exception as e:
         current_app.logger.error(f"Error updating stock for toy {toy_id}: {e}", exc_info=True)
         return False
 
 # --- Order Functions (Corrected Formatting) ---
-def create_order(user_id, items, total_amount, shipping_address, phone):
-    db = get_db()
+ORDER_STATUSES = ['Pending', 'Accepted', 'Shipped', 'Delivered', 'Cancelled']
+ORDER_FINAL_STATUSES = ['Delivered', 'Cancelled'] # No further status changes once reached
+
+def order_status_sources(new_status):
+    """Statuses an order may move to `new_status` from: any other status that is not final."""
+    return [s for s in ORDER_STATUSES if s != new_status and s not in ORDER_FINAL_STATUSES]
+
+def build_order_document(user_id, items, total_amount, shipping_address, phone, order_id=None):
     order_data = {
         'user_id': ObjectId(user_id), 'items': items, 'total_amount': total_amount,
         'shipping_address': shipping_address, 'phone': phone, 'status': 'Pending',
         'payment_method': 'Cash on Delivery', 'created_at': datetime.now(IST)
     }
+    if order_id is not None:
+        order_data['_id'] = order_id
+    return order_data
+
+def record_order_created(order_data):
+    """Updates the order counters and sales rollups for a newly stored order."""
+    _bump_counter('orders', {'total': 1, 'by_status.Pending': 1})
+    rollups.apply_order(order_data)
+
+def create_order(user_id, items, total_amount, shipping_address, phone):
+    db = get_db()
+    order_data = build_order_document(user_id, items, total_amount, shipping_address, phone)
     try:
         result = db.orders.insert_one(order_data)
+        record_order_created(order_data)
         return result.inserted_id
     except Exception as e:
         current_app.logger.error(f"Error creating order for user {user_id}: {e}", exc_info=True)
         return None
 
 
-def get_all_orders(sort_by='created_at', ascending=False):
+def get_all_orders(sort_by='created_at', ascending=False, projection='detail'):
     db = get_db()
     direction = -1 if not ascending else 1
-    return list(db.orders.find().sort(sort_by, direction))
+    fields = resolve_projection(ORDER_PROJECTIONS, projection)
+    return list(db.orders.find({}, fields).sort(sort_by, direction))
+
+ORDER_SORT = [('created_at', -1), ('_id', -1)]
+
+def get_orders_page(status=None, after=None, before=None, limit=None, projection='row'):
+    """One page of orders, newest first, with user_email/user_username attached.
 
-def get_orders_by_user(user_id, sort_by='created_at', ascending=False):
+    Keyset-paginated on (created_at, _id) and served by the (status, created_at, _id)
+    index. Filtering, paging and the user $lookup all happen in one aggregation,
+    and the total comes from the order counters, so a page costs a constant
+    number of round trips however many orders exist.
+    """
+    db = get_db()
+    limit = clamp_page_size(limit, default_key='ADMIN_ORDERS_PAGE_SIZE', max_key='ADMIN_ORDERS_MAX_PAGE_SIZE')
+    query = {'status': status} if status else {}
+    query, mongo_sort, backwards, edge = _apply_keyset_cursor(query, 'orders', ORDER_SORT, after, before)
+    fields = _with_sort_keys(resolve_projection(ORDER_PROJECTIONS, projection), ORDER_SORT)
+    pipeline = [{'$match': query}, {'$sort': dict(mongo_sort)}, {'$limit': limit + 1}]
+    if fields:
+        pipeline.append({'$project': fields})
+    pipeline += [
+        {'$lookup': {'from': 'users', 'localField': 'user_id', 'foreignField': '_id', 'as': '_user'}},
+        {'$addFields': {
+            'user_email': {'$ifNull': [{'$arrayElemAt': ['$_user.email', 0]}, 'Unknown']},
+            'user_username': {'$ifNull': [{'$arrayElemAt': ['$_user.username', 0]}, 'Unknown']},
+        }},
+        {'$project': {'_user': 0}},
+    ]
+    page = {'orders': [], 'limit': limit, 'total': 0, 'next_cursor': None, 'prev_cursor': None}
+    try:
+        rows = list(db.orders.aggregate(pipeline))
+    except Exception as e:
+        current_app.logger.error(f"Error loading orders page (status={status}): {e}", exc_info=True)
+        return page
+    page['orders'], page['next_cursor'], page['prev_cursor'] = _keyset_page(rows, limit, 'orders', ORDER_SORT, backwards, edge)
+    counters = get_counters('orders')
+    page['total'] = counters.get('by_status', {}).get(status, 0) if status else counters.get('total', 0)
+    return page
+
+def get_orders_by_user(user_id, sort_by='created_at', ascending=False, projection='detail'):
     db = get_db()
     direction = -1 if not ascending else 1
+    fields = resolve_projection(ORDER_PROJECTIONS, projection)
     try:
         obj_id = ObjectId(user_id)
-        return list(db.orders.find({'user_id': obj_id}).sort(sort_by, direction))
+        return list(db.orders.find({'user_id': obj_id}, fields).sort(sort_by, direction))
     except Exception as e:
         current_app.logger.warning(f"Error getting orders for user ID '{user_id}': {e}")
         return []
@@ -199,33 +752,108 @@ def find_order_by_id(order_id):
 
 def update_order_status(order_id, new_status):
     db = get_db()
-    valid_statuses = ['Pending', 'Accepted', 'Shipped', 'Delivered', 'Cancelled']
-    if new_status not in valid_statuses: return False
+    if new_status not in ORDER_STATUSES: return False
     try:
-        result = db.orders.update_one(
-            {'_id': ObjectId(order_id)},
-            {'$set': {'status': new_status, 'updated_at': datetime.now(IST)}}
+        # Read the previous state in the same round trip so counters and rollups can move with it.
+        previous = db.orders.find_one_and_update(
+            {'_id': ObjectId(order_id), 'status': {'$in': order_status_sources(new_status)}},
+            {'$set': {'status': new_status, 'updated_at': datetime.now(IST)}},
+            projection={'status': 1, 'created_at': 1, 'total_amount': 1, 'items': 1}
         )
-        return result.modified_count > 0
+        if previous and previous.get('status') != new_status:
+            _bump_counter('orders', {f"by_status.{previous.get('status')}": -1, f"by_status.{new_status}": 1})
+            rollups.status_changed(previous, previous.get('status'), new_status)
+        return previous is not None
     except Exception as e:
         current_app.logger.error(f"Error updating status for order {order_id}: {e}", exc_info=True)
         return False
 
+def bulk_update_order_status(new_status, order_ids=None, status_filter=None):
+    """Moves many orders to new_status, honouring the allowed transitions.
+
+    Targets the given order_ids, or else every order (optionally only those whose
+    status is status_filter). One update_many is issued per allowed source status,
+    and its modified_count is exactly how many orders left that status, so the
+    counters move by those numbers. Orders leaving a sale for a status that is not
+    one are tagged with a batch id for the sales rollups to aggregate over; the
+    tag is removed again afterwards.
+    Returns {'matched': n, 'modified': n}, or None on error.
+    """
+    db = get_db()
+    if new_status not in ORDER_STATUSES: return None
+    base = {}
+    if order_ids is not None:
+        try:
+            base['_id'] = {'$in': [ObjectId(order_id) for order_id in order_ids]}
+        except Exception:
+            return None
+    sources = order_status_sources(new_status)
+    if status_filter:
+        sources = [s for s in sources if s == status_filter]
+    if not sources:
+        return {'matched': 0, 'modified': 0}
+    # Non-sale statuses are final, so no later batch can move a tagged order on and re-tag it.
+    batch_id = None if rollups.counts_as_sale(new_status) else ObjectId()
+    now = datetime.now(IST)
+    matched = modified = unsold = 0
+    increments = {}
+    failed = False
+    for source in sources:
+        tagged = batch_id is not None and rollups.counts_as_sale(source)
+        update = {'$set': {'status': new_status, 'updated_at': now}}
+        if tagged:
+            update['$set']['status_batch'] = batch_id
+        try:
+            result = db.orders.update_many(dict(base, status=source), update)
+        except Exception as e:
+            current_app.logger.error(f"Error bulk-updating {source} orders to {new_status}: {e}", exc_info=True)
+            failed = True
+            break
+        matched += result.matched_count
+        modified += result.modified_count
+        if result.modified_count:
+            increments[f"by_status.{source}"] = -result.modified_count
+            increments[f"by_status.{new_status}"] = increments.get(f"by_status.{new_status}", 0) + result.modified_count
+            if tagged:
+                unsold += result.modified_count
+    # Sources already moved are counted even if a later one failed.
+    if increments:
+        _bump_counter('orders', increments)
+    if unsold:
+        rollups.apply_orders({'status_batch': batch_id}, -1)
+        try:
+            db.orders.update_many({'status_batch': batch_id}, {'$unset': {'status_batch': ''}})
+        except Exception as e:
+            current_app.logger.error(f"Error clearing status batch {batch_id}: {e}", exc_info=True)
+    if failed:
+        return None
+    return {'matched': matched, 'modified': modified}
+
 
 # --- Statistics (Corrected Formatting) ---
+ADMIN_STATS_KEYS = ['total_toys', 'total_customers', 'pending_approvals', 'total_orders', 'pending_orders', 'accepted_orders']
+
 def get_admin_stats():
-    db = get_db()
-    default_stats = {k: 0 for k in ['total_toys', 'total_customers', 'pending_approvals', 'total_orders', 'pending_orders', 'accepted_orders']}
+    """Dashboard totals, read from the counters documents in one query and cached briefly."""
     try:
-        stats = {
-            'total_toys': db.toys.count_documents({}),
-            'total_customers': db.users.count_documents({'is_approved': True}),
-            'pending_approvals': db.users.count_documents({'is_approved': False}),
-            'total_orders': db.orders.count_documents({}),
-            'pending_orders': db.orders.count_documents({'status': 'Pending'}),
-            'accepted_orders': db.orders.count_documents({'status': 'Accepted'}),
-        }
-        return stats
+        return stats_cache.get_or_load('admin_stats', _load_admin_stats)
     except Exception as e:
          current_app.logger.error(f"Error getting admin stats: {e}", exc_info=True)
-         return default_stats # Return zeros if stats cannot be retrieved
\ No newline at end of file
+         return {k: 0 for k in ADMIN_STATS_KEYS} # Return zeros if stats cannot be retrieved
+
+def _load_admin_stats():
+    db = get_db()
+    docs = {doc['_id']: doc for doc in db.counters.find({'_id': {'$in': list(COUNTER_REBUILDERS)}})}
+    for name, rebuild in COUNTER_REBUILDERS.items():
+        if name not in docs:
+            docs[name] = rebuild()
+    orders, users = docs['orders'], docs['users']
+    by_status = orders.get('by_status', {})
+    return {
+        'total_toys': docs['toys'].get('total', 0),
+        'total_customers': users.get('approved', 0),
+        'pending_approvals': users.get('pending', 0),
+        'total_orders': orders.get('total', 0),
+        'pending_orders': by_status.get('Pending', 0),
+        'accepted_orders': by_status.get('Accepted', 0),
+    }
@@ -0,0 +1,160 @@
+# File: app/passwords.py
+"""Password hashing off the request thread.
+
+bcrypt is deliberately slow: at cost 12 one hash or check takes a few hundred
+milliseconds of CPU. Run inline, a burst of logins holds the GIL in every
+worker and stalls browsing as well. Hashes and checks therefore run in a
+per-worker process pool of PASSWORD_HASH_WORKERS processes. At most
+PASSWORD_HASH_QUEUE_DEPTH more may wait for a free process. Beyond that, or
+when a result takes longer than PASSWORD_HASH_TIMEOUT_SECONDS,
+PasswordHasherBusy is raised at once, and the login or signup page answers
+503 instead of queueing without bound. PASSWORD_HASH_WORKERS=0 hashes inline
+(tests, the development server).
+
+The cost is BCRYPT_LOG_ROUNDS. A hash records the cost it was made with, so
+changing the setting affects new hashes only. upgrade_password_hash() re-hashes
+a customer's password at the new cost the next time they log in. `flask
+password-cost` times each cost on this machine to help pick one.
+"""
+
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+
+import bcrypt
+from flask import current_app
+
+password_stats = {'hashes': 0, 'checks': 0, 'rejected': 0, 'timeouts': 0, 'rehashed': 0}
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+_in_flight = 0
+
+
+class PasswordHasherBusy(Exception):
+    """Too many hashes queued in this worker; the caller should ask the customer to retry shortly."""
+
+
+def _password_bytes(password):
+    password = password.encode('utf-8') if isinstance(password, str) else password
+    if current_app.config.get('BCRYPT_HANDLE_LONG_PASSWORDS', False):
+        # Same pre-hash as Flask-Bcrypt, so existing hashes keep verifying
+        password = hashlib.sha256(password).hexdigest().encode('utf-8')
+    return password
+
+
+def _get_pool(workers):
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid(): # A forked server worker needs its own processes
+            _pool = ProcessPoolExecutor(max_workers=workers)
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def _release_slot(future):
+    global _in_flight
+    with _pool_lock:
+        _in_flight -= 1
+
+
+def _run(fn, *args):
+    """Runs fn(*args) in the hashing pool (inline without one), rejecting work beyond the queue limit."""
+    global _in_flight
+    config = current_app.config
+    workers = config.get('PASSWORD_HASH_WORKERS', 2)
+    if workers <= 0:
+        return fn(*args)
+    pool = _get_pool(workers)
+    with _pool_lock:
+        if _in_flight >= workers + config.get('PASSWORD_HASH_QUEUE_DEPTH', 8):
+            password_stats['rejected'] += 1
+            raise PasswordHasherBusy()
+        _in_flight += 1
+    try:
+        future = pool.submit(fn, *args) # bcrypt's own functions, so the child only needs bcrypt
+    except BaseException:
+        _release_slot(None)
+        raise
+    future.add_done_callback(_release_slot)
+    try:
+        return future.result(timeout=config.get('PASSWORD_HASH_TIMEOUT_SECONDS', 5))
+    except FutureTimeoutError:
+        password_stats['timeouts'] += 1
+        raise PasswordHasherBusy()
+
+
+def hash_password(password, rounds=None):
+    """A bcrypt hash of `password` (str) at BCRYPT_LOG_ROUNDS. May raise PasswordHasherBusy."""
+    rounds = rounds or current_app.config.get('BCRYPT_LOG_ROUNDS', 12)
+    pw_hash = _run(bcrypt.hashpw, _password_bytes(password), bcrypt.gensalt(rounds=rounds))
+    password_stats['hashes'] += 1
+    return pw_hash.decode('utf-8')
+
+
+def check_password(pw_hash, password):
+    """Whether `password` matches the stored hash. May raise PasswordHasherBusy."""
+    if not pw_hash:
+        return False
+    try:
+        matched = _run(bcrypt.checkpw, _password_bytes(password), pw_hash.encode('utf-8'))
+    except ValueError: # Not a bcrypt hash
+        return False
+    password_stats['checks'] += 1
+    return matched
+
+
+def hash_cost(pw_hash):
+    """The cost a bcrypt hash was made with ('$2b$12$...' -> 12), or None if it is not one."""
+    parts = (pw_hash or '').split('$')
+    return int(parts[2]) if len(parts) > 3 and parts[2].isdigit() else None
+
+
+def needs_rehash(pw_hash):
+    return hash_cost(pw_hash) != current_app.config.get('BCRYPT_LOG_ROUNDS', 12)
+
+
+def upgrade_password_hash(user_id, pw_hash, password):
+    """After a successful login, re-hashes the password if BCRYPT_LOG_ROUNDS changed. Never raises."""
+    if not needs_rehash(pw_hash):
+        return False
+    try:
+        from .models import get_db
+        new_hash = hash_password(password)
+        # Only if the stored hash is still the one just checked (not changed meanwhile)
+        result = get_db().users.update_one({'_id': user_id, 'password_hash': pw_hash},
+                                           {'$set': {'password_hash': new_hash}})
+        password_stats['rehashed'] += result.modified_count
+        return result.modified_count == 1
+    except PasswordHasherBusy:
+        return False # Busy now; the next login tries again
+    except Exception as e:
+        current_app.logger.error(f"Error re-hashing password for user {user_id}: {e}", exc_info=True)
+        return False
+
+
+def time_costs(costs, samples=3):
+    """{cost: median milliseconds for one hash} on this machine, hashed inline."""
+    timings = {}
+    for rounds in costs:
+        runs = []
+        for _ in range(samples):
+            start = time.perf_counter()
+            bcrypt.hashpw(b'cost-probe', bcrypt.gensalt(rounds=rounds))
+            runs.append((time.perf_counter() - start) * 1000)
+        timings[rounds] = sorted(runs)[len(runs) // 2]
+    return timings
+
+
+def pool_metrics():
+    with _pool_lock:
+        in_flight = _in_flight
+    return dict(password_stats, in_flight=in_flight,
+                log_rounds=current_app.config.get('BCRYPT_LOG_ROUNDS', 12))
+
+
+def init_app(app):
+    from .metrics import register_metrics
+    register_metrics('passwords', pool_metrics)
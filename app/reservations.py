@@ -0,0 +1,241 @@
+# File: app/reservations.py
+"""Time-limited stock holds for shopping carts.
+
+Adding a toy to the cart takes the units out of the toy's `stock` at once and
+records them in a stock_holds document that expires CART_HOLD_SECONDS later.
+During a flash sale customers therefore find out at add-to-cart time whether
+they got one, instead of losing the race at checkout after filling in the
+address form. `stock` is the number of units still free for new carts and
+`reserved` on the toy counts the units currently held. The admin edit form
+works in units on hand (stock + reserved); see update_toy. Holds refresh
+cached catalog pages only when a toy sells out or comes back into stock.
+
+A hold is {_id, user_id, toy_id, quantity, created_at, expires_at}. When it
+is finished with it also gets released_at, plus order_id when a checkout
+turned it into an order or sweep_id when it expired and its units went back
+to `stock`. Checkout claims the customer's holds instead of taking that stock
+again. release_expired_holds() hands expired holds back with a handful of
+queries; it runs from a request hook at most every RESERVATION_SWEEP_SECONDS
+per worker and straight away when a hold cannot be placed. A TTL index on
+released_at then deletes finished holds after RESERVATION_RETENTION_SECONDS.
+"""
+
+import threading
+import time
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from flask import current_app
+from pymongo import ReturnDocument, UpdateOne
+
+from .models import IST, get_db, stock_changed
+
+hold_stats = {'placed': 0, 'rejected': 0, 'released': 0, 'expired': 0, 'converted': 0}
+_sweep_lock = threading.Lock()
+_last_sweep = 0.0
+
+
+def reservations_enabled():
+    return current_app.config.get('RESERVATIONS_ENABLED', True)
+
+
+def _active(user_id, now, toy_id=None):
+    query = {'user_id': ObjectId(user_id), 'released_at': {'$exists': False}, 'expires_at': {'$gt': now}}
+    if toy_id is not None:
+        query['toy_id'] = ObjectId(toy_id)
+    return query
+
+
+def _take(db, toy_id, quantity):
+    """Moves free units into `reserved`; returns the toy's stock afterwards, or None when there were not enough."""
+    toy = db.toys.find_one_and_update(
+        {'_id': toy_id, 'stock': {'$gte': quantity}},
+        {'$inc': {'stock': -quantity, 'reserved': quantity}},
+        projection={'stock': 1}, return_document=ReturnDocument.AFTER
+    )
+    return toy['stock'] if toy else None
+
+
+def _give_back(db, toy_id, quantity):
+    """Returns held units to `stock`; True when that brought the toy back into stock."""
+    toy = db.toys.find_one_and_update(
+        {'_id': toy_id}, {'$inc': {'stock': quantity, 'reserved': -quantity}},
+        projection={'stock': 1}, return_document=ReturnDocument.AFTER
+    )
+    return bool(toy) and toy['stock'] > 0 >= toy['stock'] - quantity
+
+
+def active_holds(user_id):
+    """{toy id string: units held} for the customer's unexpired holds, in one query."""
+    held = {}
+    for doc in get_db().stock_holds.find(_active(user_id, datetime.now(IST)), {'toy_id': 1, 'quantity': 1}):
+        key = str(doc['toy_id'])
+        held[key] = held.get(key, 0) + doc['quantity']
+    return held
+
+
+def hold(user_id, toy_id, quantity):
+    """Makes the customer's hold on a toy exactly `quantity` units, taking or returning the difference.
+
+    Returns (True, quantity) on success, or (False, most units the customer
+    could hold right now) when there is not enough free stock.
+    """
+    if quantity <= 0:
+        release(user_id, toy_id)
+        return True, 0
+    db = get_db()
+    toy_oid = ObjectId(toy_id)
+    held = 0
+    restocked = False # Whether the toy sold out or came back into stock, which catalog pages show
+    try:
+        for _ in range(3): # Retries only when the hold changed under us (another tab, the sweeper)
+            now = datetime.now(IST)
+            current = db.stock_holds.find_one(_active(user_id, now, toy_oid), {'quantity': 1})
+            held = current['quantity'] if current else 0
+            extra = quantity - held
+            if extra > 0:
+                left = _take(db, toy_oid, extra)
+                if left is None and release_expired_holds(toy_oid): # Expired holds may be all that is in the way
+                    left = _take(db, toy_oid, extra)
+                if left is None:
+                    hold_stats['rejected'] += 1
+                    toy = db.toys.find_one({'_id': toy_oid}, {'stock': 1})
+                    return False, held + max(toy.get('stock', 0), 0) if toy else held
+                restocked |= left <= 0
+            expires_at = now + timedelta(seconds=current_app.config.get('CART_HOLD_SECONDS', 900))
+            if current:
+                result = db.stock_holds.update_one(
+                    {'_id': current['_id'], 'quantity': held, 'released_at': {'$exists': False}},
+                    {'$set': {'quantity': quantity, 'expires_at': expires_at}}
+                )
+                if result.matched_count == 0:
+                    if extra > 0:
+                        restocked |= _give_back(db, toy_oid, extra)
+                    continue
+            else:
+                db.stock_holds.insert_one({
+                    'user_id': ObjectId(user_id), 'toy_id': toy_oid, 'quantity': quantity,
+                    'created_at': now, 'expires_at': expires_at,
+                })
+            if extra < 0:
+                restocked |= _give_back(db, toy_oid, -extra)
+            hold_stats['placed'] += 1
+            return True, quantity
+        hold_stats['rejected'] += 1
+        return False, held
+    finally:
+        if restocked:
+            stock_changed()
+
+
+def release(user_id, toy_id=None):
+    """Gives back the customer's holds on one toy (or on every toy) straight away."""
+    db = get_db()
+    query = _active(user_id, datetime.now(IST), toy_id)
+    query.pop('expires_at') # Expired but not yet swept holds are handed back here too
+    released, restocked = 0, False
+    for doc in db.stock_holds.find(query, {'_id': 1}):
+        done = db.stock_holds.find_one_and_update(
+            {'_id': doc['_id'], 'released_at': {'$exists': False}},
+            {'$set': {'released_at': datetime.now(IST)}},
+            projection={'toy_id': 1, 'quantity': 1}
+        )
+        if done: # Otherwise the sweeper or a checkout got there first
+            restocked |= _give_back(db, done['toy_id'], done['quantity'])
+            released += 1
+    hold_stats['released'] += released
+    if restocked:
+        stock_changed()
+    return released
+
+
+def renew_holds(user_id):
+    """Pushes the expiry of the customer's active holds out by CART_HOLD_SECONDS (e.g. on reaching checkout)."""
+    now = datetime.now(IST)
+    expires_at = now + timedelta(seconds=current_app.config.get('CART_HOLD_SECONDS', 900))
+    get_db().stock_holds.update_many(_active(user_id, now), {'$set': {'expires_at': expires_at}})
+
+
+def release_expired_holds(toy_id=None):
+    """Returns the units of every expired hold (optionally of one toy) to stock. Returns how many holds."""
+    db = get_db()
+    now = datetime.now(IST)
+    sweep_id = ObjectId()
+    query = {'released_at': {'$exists': False}, 'expires_at': {'$lte': now}}
+    if toy_id is not None:
+        query['toy_id'] = ObjectId(toy_id)
+    # Tag first, then total what was tagged: a hold renewed or claimed meanwhile is simply not tagged.
+    result = db.stock_holds.update_many(query, {'$set': {'released_at': now, 'sweep_id': sweep_id}})
+    if not result.modified_count:
+        return 0
+    returns = list(db.stock_holds.aggregate([
+        {'$match': {'sweep_id': sweep_id}},
+        {'$group': {'_id': '$toy_id', 'quantity': {'$sum': '$quantity'}}},
+    ]))
+    # Catalog pages only need refreshing if one of these toys is sold out and is about to be back.
+    restocked = db.toys.count_documents({'_id': {'$in': [row['_id'] for row in returns]}, 'stock': {'$lte': 0}}, limit=1)
+    db.toys.bulk_write([
+        UpdateOne({'_id': row['_id']}, {'$inc': {'stock': row['quantity'], 'reserved': -row['quantity']}})
+        for row in returns
+    ], ordered=False)
+    hold_stats['expired'] += result.modified_count
+    if restocked:
+        stock_changed()
+    return result.modified_count
+
+
+def maybe_release_expired_holds():
+    """release_expired_holds(), at most once per RESERVATION_SWEEP_SECONDS in this worker."""
+    global _last_sweep
+    interval = current_app.config.get('RESERVATION_SWEEP_SECONDS', 30)
+    if time.monotonic() - _last_sweep < interval or not _sweep_lock.acquire(blocking=False):
+        return
+    try:
+        _last_sweep = time.monotonic()
+        release_expired_holds()
+    except Exception as e:
+        current_app.logger.error(f"Error releasing expired stock holds: {e}", exc_info=True)
+    finally:
+        _sweep_lock.release()
+
+
+# --- Checkout ---
+def claim_holds(db, user_id, toy_ids, order_id, session=None):
+    """Marks the customer's active holds on these toys as used by `order_id`; returns {toy id string: units}."""
+    now = datetime.now(IST)
+    query = _active(user_id, now)
+    query['toy_id'] = {'$in': list(toy_ids)}
+    result = db.stock_holds.update_many(query, {'$set': {'released_at': now, 'order_id': order_id}}, session=session)
+    claimed = {}
+    if result.modified_count:
+        for doc in db.stock_holds.find({'order_id': order_id}, {'toy_id': 1, 'quantity': 1}, session=session):
+            key = str(doc['toy_id'])
+            claimed[key] = claimed.get(key, 0) + doc['quantity']
+    return claimed
+
+
+def unclaim_holds(db, order_id, session=None):
+    """Undoes claim_holds for a checkout that did not complete; the holds are active again until they expire."""
+    db.stock_holds.update_many({'order_id': order_id}, {'$unset': {'released_at': '', 'order_id': ''}}, session=session)
+
+
+def ensure_indexes(db):
+    db.stock_holds.create_index([('user_id', 1), ('toy_id', 1)], background=True)
+    db.stock_holds.create_index([('expires_at', 1), ('toy_id', 1)], background=True)
+    db.stock_holds.create_index('order_id', sparse=True, background=True)
+    db.stock_holds.create_index('sweep_id', sparse=True, background=True)
+    db.stock_holds.create_index(
+        'released_at', expireAfterSeconds=current_app.config.get('RESERVATION_RETENTION_SECONDS', 86400),
+        background=True
+    )
+
+
+def init_app(app):
+    """Registers the expired-hold sweep and reservation metrics."""
+    from .metrics import register_metrics
+    register_metrics('stock_holds', lambda: dict(hold_stats))
+
+    @app.before_request
+    def sweep_expired_holds():
+        if app.config.get('RESERVATIONS_ENABLED', True):
+            maybe_release_expired_holds()
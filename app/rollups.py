@@ -0,0 +1,177 @@
+# File: app/rollups.py
+"""Incrementally maintained sales rollups for the admin statistics page.
+
+Three small collections summarise every non-cancelled order:
+  sales_daily   - _id 'YYYY-MM-DD' (IST): orders, units, revenue
+  sales_monthly - _id 'YYYY-MM'    (IST): orders, units, revenue
+  sales_by_toy  - _id toy ObjectId:       name, orders, units, revenue
+
+create_order adds an order to them and update_order_status (or a bulk status
+change, via apply_orders) takes it out again when it is cancelled, so the
+stats page only ever reads a few dozen rollup documents. rebuild_rollups()
+recomputes everything from `orders` for backfills and repairs.
+"""
+
+from datetime import datetime, timedelta
+
+import pytz
+from flask import current_app
+from pymongo import UpdateOne
+
+IST = pytz.timezone('Asia/Kolkata')
+EXCLUDED_STATUSES = ['Cancelled']
+
+
+def counts_as_sale(status):
+    return status not in EXCLUDED_STATUSES
+
+
+def _ist(dt):
+    # Mongo hands back naive UTC datetimes; freshly created orders carry an aware IST one.
+    if dt.tzinfo is None:
+        dt = pytz.utc.localize(dt)
+    return dt.astimezone(IST)
+
+
+def apply_order(order, sign=1):
+    """Adds (sign=1) or removes (sign=-1) one order's totals from the rollups."""
+    from .models import get_db
+    db = get_db()
+    try:
+        created = _ist(order['created_at'])
+        items = order.get('items') or []
+        units = sum(int(item.get('quantity', 0)) for item in items)
+        totals = {'orders': sign, 'units': sign * units, 'revenue': sign * float(order.get('total_amount', 0))}
+        db.sales_daily.update_one({'_id': created.strftime('%Y-%m-%d')}, {'$inc': totals}, upsert=True)
+        db.sales_monthly.update_one({'_id': created.strftime('%Y-%m')}, {'$inc': totals}, upsert=True)
+        toy_updates = [
+            UpdateOne(
+                {'_id': item['toy_id']},
+                {'$inc': {
+                    'orders': sign,
+                    'units': sign * int(item.get('quantity', 0)),
+                    'revenue': sign * float(item.get('price', 0)) * int(item.get('quantity', 0)),
+                }, '$set': {'name': item.get('name')}},
+                upsert=True,
+            )
+            for item in items if item.get('toy_id')
+        ]
+        if toy_updates:
+            db.sales_by_toy.bulk_write(toy_updates, ordered=False)
+    except Exception as e:
+        current_app.logger.error(f"Error updating sales rollups for order {order.get('_id')}: {e}", exc_info=True)
+
+
+def status_changed(order, old_status, new_status):
+    """Moves an order in or out of the rollups when a status change crosses the cancelled line."""
+    was_sale, is_sale = counts_as_sale(old_status), counts_as_sale(new_status)
+    if was_sale != is_sale:
+        apply_order(order, 1 if is_sale else -1)
+
+
+def _rollup_pipelines(match):
+    """(target collection, aggregation) pairs that total the orders matching `match`."""
+    pipelines = []
+    for target, date_format in (('sales_daily', '%Y-%m-%d'), ('sales_monthly', '%Y-%m')):
+        pipelines.append((target, [
+            {'$match': match},
+            {'$group': {
+                '_id': {'$dateToString': {'format': date_format, 'date': '$created_at', 'timezone': 'Asia/Kolkata'}},
+                'orders': {'$sum': 1},
+                'units': {'$sum': {'$sum': '$items.quantity'}},
+                'revenue': {'$sum': '$total_amount'},
+            }},
+        ]))
+    pipelines.append(('sales_by_toy', [
+        {'$match': match},
+        {'$unwind': '$items'},
+        {'$group': {
+            '_id': '$items.toy_id',
+            'name': {'$last': '$items.name'},
+            'orders': {'$sum': 1},
+            'units': {'$sum': '$items.quantity'},
+            'revenue': {'$sum': {'$multiply': ['$items.price', '$items.quantity']}},
+        }},
+    ]))
+    return pipelines
+
+
+def apply_orders(match, sign=1):
+    """Adds or removes every order matching `match` in a few aggregations, for bulk status changes."""
+    from .models import get_db
+    db = get_db()
+    try:
+        for target, pipeline in _rollup_pipelines(match):
+            updates = []
+            for row in db.orders.aggregate(pipeline):
+                update = {'$inc': {field: sign * row[field] for field in ('orders', 'units', 'revenue')}}
+                if 'name' in row:
+                    update['$set'] = {'name': row['name']}
+                updates.append(UpdateOne({'_id': row['_id']}, update, upsert=True))
+            if updates:
+                db[target].bulk_write(updates, ordered=False)
+    except Exception as e:
+        current_app.logger.error(f"Error updating sales rollups for orders matching {match}: {e}", exc_info=True)
+
+
+def rebuild_rollups():
+    """Recomputes all three rollup collections from the orders collection."""
+    from .models import get_db
+    db = get_db()
+    for target, pipeline in _rollup_pipelines({'status': {'$nin': EXCLUDED_STATUSES}}):
+        db.orders.aggregate(pipeline + [{'$out': target}])
+    return {name: db[name].count_documents({}) for name in ('sales_daily', 'sales_monthly', 'sales_by_toy')}
+
+
+def ensure_indexes(db):
+    db.sales_by_toy.create_index([('units', -1)], background=True)
+
+
+# --- Reads for the stats page ---
+def _series(docs, keys):
+    by_key = {doc['_id']: doc for doc in docs}
+    return [
+        {'period': key, **{field: by_key.get(key, {}).get(field, 0) for field in ('orders', 'units', 'revenue')}}
+        for key in keys
+    ]
+
+
+def get_daily_sales(days=30):
+    """Per-day totals for the last `days` IST days, oldest first, with empty days filled in."""
+    from .models import get_db
+    today = datetime.now(IST).date()
+    keys = [(today - timedelta(days=offset)).strftime('%Y-%m-%d') for offset in range(days - 1, -1, -1)]
+    docs = get_db().sales_daily.find({'_id': {'$gte': keys[0]}})
+    return _series(docs, keys)
+
+
+def get_monthly_sales(months=12):
+    """Per-month totals for the last `months` IST months, oldest first."""
+    from .models import get_db
+    today = datetime.now(IST).date()
+    year, month = today.year, today.month
+    keys = []
+    for _ in range(months):
+        keys.append(f"{year:04d}-{month:02d}")
+        year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+    keys.reverse()
+    docs = get_db().sales_monthly.find({'_id': {'$gte': keys[0]}})
+    return _series(docs, keys)
+
+
+def get_top_sellers(limit=10):
+    from .models import get_db
+    return list(get_db().sales_by_toy.find({'units': {'$gt': 0}}).sort('units', -1).limit(limit))
+
+
+def get_sales_summary():
+    """Everything the stats page shows, or empty series if the rollups cannot be read."""
+    try:
+        return {
+            'daily': get_daily_sales(current_app.config.get('STATS_DAILY_DAYS', 30)),
+            'monthly': get_monthly_sales(current_app.config.get('STATS_MONTHLY_MONTHS', 12)),
+            'top_sellers': get_top_sellers(current_app.config.get('STATS_TOP_SELLERS', 10)),
+        }
+    except Exception as e:
+        current_app.logger.error(f"Error reading sales rollups: {e}", exc_info=True)
+        return {'daily': [], 'monthly': [], 'top_sellers': []}
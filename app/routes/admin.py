@@ -1,22 +1,29 @@
 # File: app/routes/admin.py
 
-from flask import render_template, redirect, url_for, flash, request, session, abort, current_app
+from flask import render_template, redirect, url_for, flash, request, session, abort, current_app, jsonify, Response, stream_with_context
 from flask_login import login_required, current_user
 from functools import wraps
 from bson import ObjectId
 # --- File Handling Imports ---
 import os
-from werkzeug.utils import secure_filename
+import io
+import tempfile
 from datetime import datetime
 # --- End File Handling Imports ---
 
 from . import admin_bp
-from ..forms import ToyForm # Make sure forms are imported
+from ..forms import ToyForm, ToyImportForm # Make sure forms are imported
+from ..bulk_import import import_toys
+from ..utils import toy_image_destination
+from ..metrics import collect_metrics
+from ..rollups import get_sales_summary
+from ..export import EXPORTS, EXPORT_FORMATS, STREAMERS, parse_date_range, clamp_batch_size, open_export_cursor
 # Use get_db helper function
 from ..models import (
     get_admin_stats, get_all_toys, add_toy, find_toy_by_id, update_toy, delete_toy,
-    get_all_orders, find_order_by_id, update_order_status,
-    get_pending_users, get_approved_users, approve_user, find_user_by_id, get_db
+    get_all_orders, get_orders_page, find_order_by_id, update_order_status, bulk_update_order_status,
+    ORDER_STATUSES, ORDER_FINAL_STATUSES,
+    get_users_page, approve_user, approve_users, find_user_by_id, get_db, StockBelowReservedError
 )
 
 # --- Decorator for Admin Routes ---
@@ -44,32 +51,22 @@ def save_toy_image(file_storage):
         return None
 
     try:
-        # Secure the filename and add timestamp to prevent collisions
-        original_filename = secure_filename(file_storage.filename)
-        base, ext = os.path.splitext(original_filename)
-        timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-        # Sanitize base filename further if needed
-        base = base[:50] # Limit length
-        filename = f"{timestamp}_{base}{ext}"
-
         upload_folder = current_app.config.get('UPLOAD_FOLDER')
         if not upload_folder:
              current_app.logger.error("UPLOAD_FOLDER is not configured.")
              flash("Server configuration error: Upload folder not set.", "danger")
              return None
 
-        save_path = os.path.join(upload_folder, filename)
+        save_path, relative_path = toy_image_destination(file_storage.filename, upload_folder)
 
         # Save the file
         file_storage.save(save_path)
         current_app.logger.info(f"Saved new toy image: {save_path}")
 
         # Return the path relative to the static folder for url_for()
-        # Assumes UPLOAD_FOLDER is '.../app/static/uploads/toys'
-        relative_path = os.path.join('uploads', 'toys', filename).replace('\\', '/') # Ensure forward slashes
         return relative_path
     except Exception as e:
-        current_app.logger.error(f"Failed to save toy image '{original_filename}': {e}", exc_info=True)
+        current_app.logger.error(f"Failed to save toy image '{file_storage.filename}': {e}", exc_info=True)
         flash("Error saving uploaded image.", "danger")
         return None
 
@@ -110,7 +107,39 @@ def dashboard():
 @admin_required
 def stats():
     stats = get_admin_stats()
-    return render_template('stats.html', title='Statistics', stats=stats)
+    sales = get_sales_summary() # Reads only the pre-aggregated rollup collections
+    return render_template('stats.html', title='Statistics', stats=stats, sales=sales)
+
+@admin_bp.route('/metrics')
+@admin_required
+def metrics():
+    """JSON snapshot of this worker's cache/queue counters for monitoring."""
+    return jsonify(collect_metrics())
+
+
+# --- Export Routes ---
+@admin_bp.route('/export/<collection>.<fmt>')
+@admin_required
+def export_collection(collection, fmt):
+    """Streams a collection as CSV/NDJSON; ?start=&end= (YYYY-MM-DD, IST) filter on created_at."""
+    if collection not in EXPORTS or fmt not in EXPORT_FORMATS:
+        abort(404)
+    try:
+        query = parse_date_range(request.args.get('start'), request.args.get('end'))
+    except ValueError:
+        flash('Export dates must be in YYYY-MM-DD format.', 'warning')
+        return redirect(request.referrer or url_for('admin.dashboard'))
+    status = request.args.get('status')
+    if collection == 'orders' and status in ORDER_STATUSES:
+        query['status'] = status
+    batch_size = clamp_batch_size(request.args.get('batch_size'))
+    cursor = open_export_cursor(get_db(), collection, query, batch_size)
+    filename = f"{collection}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.{fmt}"
+    return Response(
+        stream_with_context(STREAMERS[fmt](cursor, collection, batch_size)),
+        mimetype=EXPORT_FORMATS[fmt],
+        headers={'Content-Disposition': f'attachment; filename="{filename}"', 'X-Accel-Buffering': 'no'}
+    )
 
 
 # --- Toy Management Routes ---
@@ -118,7 +147,7 @@ def stats():
 @admin_bp.route('/toys')
 @admin_required
 def manage_toys():
-    toys = get_all_toys()
+    toys = get_all_toys(projection='row')
     return render_template('toys.html', title='Manage Toys', toys=toys)
 
 @admin_bp.route('/toys/add', methods=['GET', 'POST'])
@@ -159,6 +188,23 @@ def add_new_toy():
 
     return render_template('add_toy.html', title='Add New Toy', form=form)
 
+@admin_bp.route('/toys/import', methods=['GET', 'POST'])
+@admin_required
+def import_toys_upload():
+    """Bulk import from an uploaded catalog CSV + images ZIP; re-uploading resumes where it stopped."""
+    form = ToyImportForm()
+    report = None
+    if form.validate_on_submit():
+        with tempfile.NamedTemporaryFile(suffix='.zip') as zip_copy: # zipfile needs a seekable file the workers can reopen
+            form.images_zip.data.save(zip_copy)
+            zip_copy.flush()
+            csv_text = io.TextIOWrapper(form.csv_file.data.stream, encoding='utf-8-sig', newline='')
+            report = import_toys(csv_text, zip_copy.name)
+        flash(f"Import finished: {report.summary()}.", 'success' if not report.errors else 'warning')
+    elif request.method == 'POST' and form.errors:
+        flash('Please correct the errors below.', 'warning')
+    return render_template('import_toys.html', title='Import Toys', form=form, report=report)
+
 @admin_bp.route('/toys/edit/<toy_id>', methods=['GET', 'POST'])
 @admin_required
 def edit_toy_details(toy_id):
@@ -191,22 +237,26 @@ def edit_toy_details(toy_id):
         # --- End File Upload Handling ---
 
         # Update database with potentially new image path
-        success = update_toy(
-            toy_id=toy_id,
-            name=form.name.data,
-            description=form.description.data,
-            price=form.price.data,
-            image_path=new_relative_image_path, # Pass potentially updated path
-            stock=form.stock.data
-        )
-        if success:
-            flash('Toy updated successfully!', 'success')
-            return redirect(url_for('admin.manage_toys'))
+        try:
+            success = update_toy(
+                toy_id=toy_id,
+                name=form.name.data,
+                description=form.description.data,
+                price=form.price.data,
+                image_path=new_relative_image_path, # Pass potentially updated path
+                stock=form.stock.data
+            )
+        except StockBelowReservedError as e:
+            form.stock.errors.append(f"{e.reserved} units are in customer carts right now; stock cannot be lower than that.")
         else:
-            flash('Error updating toy in database.', 'danger')
-            # If DB update failed but we saved a new image, should we delete it?
-            # If new_relative_image_path != current_image_path: delete_toy_image(new_relative_image_path) ?
-            # Safer to leave it for manual cleanup in this case.
+            if success:
+                flash('Toy updated successfully!', 'success')
+                return redirect(url_for('admin.manage_toys'))
+            else:
+                flash('Error updating toy in database.', 'danger')
+                # If DB update failed but we saved a new image, should we delete it?
+                # If new_relative_image_path != current_image_path: delete_toy_image(new_relative_image_path) ?
+                # Safer to leave it for manual cleanup in this case.
     elif request.method == 'POST' and form.errors:
         current_app.logger.warning(f"Edit toy form validation errors: {form.errors}")
         flash('Please correct the errors below.', 'warning')
@@ -214,6 +264,11 @@ def edit_toy_details(toy_id):
     # For GET request, pre-fill price field if needed (obj= should handle it)
     if request.method == 'GET' and not form.price.data:
          form.price.data = toy.get('price')
+    # `stock` on the toy is the free units; the form works in units on hand, held ones included.
+    if request.method == 'GET':
+        form.stock.data = toy.get('stock', 0) + toy.get('reserved', 0)
+    if toy.get('reserved'):
+        form.stock.description = f"Units on hand, including {toy['reserved']} currently held in customer carts."
 
     # Pass toy data to template for displaying current image etc.
     return render_template('edit_toy.html', title='Edit Toy', form=form, toy_id=toy_id, toy=toy)
@@ -249,16 +304,17 @@ def delete_toy_item(toy_id):
 @admin_bp.route('/orders')
 @admin_required
 def manage_orders():
-    status_filter = request.args.get('status')
-    orders_data = get_all_orders()
-    orders_with_users = []
-    for order in orders_data:
-        user = find_user_by_id(order.get('user_id'))
-        order['user_email'] = user['email'] if user else 'Unknown'
-        order['user_username'] = user['username'] if user else 'Unknown'
-        if status_filter and order.get('status') != status_filter: continue
-        orders_with_users.append(order)
-    return render_template('orders.html', title='Manage Orders', orders=orders_with_users, current_filter=status_filter)
+    status_filter = request.args.get('status') or None
+    if status_filter not in ORDER_STATUSES: status_filter = None
+    per_page = request.args.get('per_page', type=int)
+    if per_page not in current_app.config['ADMIN_ORDERS_PAGE_SIZES']: per_page = None
+    page = get_orders_page(status=status_filter, after=request.args.get('after'),
+                           before=request.args.get('before'), limit=per_page)
+    filter_args = {k: v for k, v in (('status', status_filter), ('per_page', per_page)) if v}
+    return render_template('orders.html', title='Manage Orders', orders=page['orders'], page=page,
+                           current_filter=status_filter, filter_args=filter_args,
+                           page_sizes=current_app.config['ADMIN_ORDERS_PAGE_SIZES'],
+                           order_statuses=ORDER_STATUSES, final_statuses=ORDER_FINAL_STATUSES)
 
 @admin_bp.route('/orders/view/<order_id>')
 @admin_required
@@ -268,8 +324,8 @@ def view_order(order_id):
     user = find_user_by_id(order.get('user_id'))
     order['user_email'] = user['email'] if user else 'Unknown'
     order['user_username'] = user['username'] if user else 'Unknown'
-    valid_statuses = ['Pending', 'Accepted', 'Shipped', 'Delivered', 'Cancelled']
-    return render_template('order_detail.html', title='Order Details', order=order, valid_statuses=valid_statuses)
+    return render_template('order_detail.html', title='Order Details', order=order,
+                           valid_statuses=ORDER_STATUSES, final_statuses=ORDER_FINAL_STATUSES)
 
 @admin_bp.route('/orders/update_status/<order_id>', methods=['POST'])
 @admin_required
@@ -278,17 +334,48 @@ def update_order_status_route(order_id):
     if not new_status: flash('No status provided.', 'warning'); return redirect(request.referrer or url_for('admin.manage_orders'))
     success = update_order_status(order_id, new_status)
     if success: flash(f'Order status updated to {new_status}.', 'success')
-    else: flash('Failed to update order status.', 'danger')
+    else: flash(f'Failed to update order status. Delivered and Cancelled orders cannot be changed.', 'danger')
     return redirect(url_for('admin.view_order', order_id=order_id))
 
+@admin_bp.route('/orders/bulk_status', methods=['POST'])
+@admin_required
+def bulk_update_order_status_route():
+    """Moves the ticked orders, or every order in the current filter, to one status."""
+    new_status = request.form.get('status')
+    status_filter = request.form.get('filter_status') or None
+    back = redirect(url_for('admin.manage_orders', status=status_filter, per_page=request.form.get('per_page') or None))
+    if new_status not in ORDER_STATUSES:
+        flash('Choose a status to move the orders to.', 'warning'); return back
+    if request.form.get('scope') == 'filter':
+        order_ids = None
+        result = bulk_update_order_status(new_status, status_filter=status_filter)
+    else:
+        order_ids = request.form.getlist('order_ids')
+        if not order_ids:
+            flash('Select at least one order.', 'warning'); return back
+        result = bulk_update_order_status(new_status, order_ids=order_ids)
+    if result is None:
+        flash('Bulk status update failed.', 'danger'); return back
+    message = f"{result['modified']} order(s) moved to {new_status}; {result['matched']} matched an allowed transition"
+    if order_ids is not None and len(order_ids) > result['matched']:
+        message += f", {len(order_ids) - result['matched']} skipped (already {new_status}, Delivered or Cancelled)"
+    flash(message + '.', 'success' if result['modified'] else 'info')
+    return back
+
 
 # --- User Management Routes ---
 # (User routes remain the same)
 @admin_bp.route('/users')
 @admin_required
 def manage_users():
-    pending = get_pending_users(); approved = get_approved_users()
-    return render_template('users.html', title='Manage Users', pending_users=pending, approved_users=approved)
+    # Each list pages independently: p_after/p_before for pending, a_after/a_before for approved.
+    cursors = {k: request.args.get(k) for k in ('p_after', 'p_before', 'a_after', 'a_before') if request.args.get(k)}
+    pending = get_users_page(False, after=cursors.get('p_after'), before=cursors.get('p_before'))
+    approved = get_users_page(True, after=cursors.get('a_after'), before=cursors.get('a_before'))
+    pending_args = {k: v for k, v in cursors.items() if k.startswith('a_')} # Keep the other list where it is
+    approved_args = {k: v for k, v in cursors.items() if k.startswith('p_')}
+    return render_template('users.html', title='Manage Users', pending=pending, approved=approved,
+                           pending_args=pending_args, approved_args=approved_args)
 
 @admin_bp.route('/users/approve/<user_id>', methods=['POST'])
 @admin_required
@@ -296,4 +383,16 @@ def approve_user_route(user_id):
     success = approve_user(user_id)
     if success: flash('User approved successfully!', 'success')
     else: flash('Error approving user.', 'danger')
+    return redirect(url_for('admin.manage_users'))
+
+@admin_bp.route('/users/approve_bulk', methods=['POST'])
+@admin_required
+def approve_users_bulk_route():
+    user_ids = request.form.getlist('user_ids')
+    if not user_ids:
+        flash('Select at least one user to approve.', 'warning')
+        return redirect(url_for('admin.manage_users'))
+    approved = approve_users(user_ids)
+    if approved is None: flash('Error approving users.', 'danger')
+    else: flash(f'{approved} of {len(user_ids)} selected user(s) approved.', 'success' if approved else 'info')
     return redirect(url_for('admin.manage_users'))
\ No newline at end of file
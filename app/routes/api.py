@@ -0,0 +1,27 @@
+# File: app/routes/api.py
+
+from flask import request, jsonify, url_for, current_app
+
+from . import api_bp
+from ..suggest import suggest_toy_names
+
+@api_bp.route('/toys/suggest')
+def suggest_toys():
+    """Type-ahead toy names for the search box, served from the in-memory prefix index."""
+    prefix = request.args.get('q', '')
+    try:
+        limit = max(1, min(int(request.args.get('limit', 8)), 20))
+    except ValueError:
+        limit = 8
+    try:
+        matches = suggest_toy_names(prefix, limit)
+    except Exception as e:
+        current_app.logger.error(f"Error serving suggestions for '{prefix}': {e}", exc_info=True)
+        matches = []
+    return jsonify({
+        'query': prefix,
+        'suggestions': [
+            {'name': name, 'id': toy_id, 'url': url_for('customer.toy_detail', toy_id=toy_id)}
+            for name, toy_id in matches
+        ],
+    })
@@ -1,12 +1,29 @@
+import math
+
 from flask import render_template, redirect, url_for, flash, request, session, current_app
 from flask_login import login_user, logout_user, login_required, current_user # login_user is important here
-from werkzeug.security import check_password_hash
 
 from . import auth_bp
-from .. import mongo, bcrypt # Removed login_manager import as it's not directly used here
+from .. import mongo # Removed login_manager import as it's not directly used here
 from ..forms import LoginForm, SignupForm, AdminLoginForm
 # Import model functions needed
-from ..models import find_user_by_email, create_user, find_user_by_username, find_user_by_id
+from ..models import find_user_by_email, create_user, find_user_by_username, find_user_by_id, DuplicateUserError
+from ..passwords import PasswordHasherBusy, check_password, upgrade_password_hash
+from ..reservations import reservations_enabled, release
+from ..throttle import throttle_login, login_succeeded
+from ..users import ADMIN_USER, remember_customer
+
+
+def _hasher_busy(template, title, form):
+    # The password hashing pool is full: turn the request away now rather than queue it.
+    flash('We are handling a lot of sign-ins right now. Please try again in a few seconds.', 'warning')
+    return render_template(template, title=title, form=form), 503, {'Retry-After': '5'}
+
+
+def _throttled(template, title, form, wait):
+    # Too many recent attempts from this IP or for this account; refused before any lookup or hashing.
+    flash('Too many login attempts. Please wait a little and try again.', 'danger')
+    return render_template(template, title=title, form=form), 429, {'Retry-After': str(math.ceil(wait))}
 
 @auth_bp.route('/login', methods=['GET', 'POST'])
 def login():
@@ -22,41 +39,24 @@ def login():
 
     form = LoginForm()
     if form.validate_on_submit():
+        wait = throttle_login(form.email.data)
+        if wait:
+            return _throttled('login.html', 'Customer Login', form, wait)
         user_data = find_user_by_email(form.email.data)
-        if user_data and bcrypt.check_password_hash(user_data['password_hash'], form.password.data):
+        try:
+            password_ok = bool(user_data) and check_password(user_data.get('password_hash'), form.password.data)
+        except PasswordHasherBusy:
+            return _hasher_busy('login.html', 'Customer Login', form)
+        if password_ok:
+            upgrade_password_hash(user_data['_id'], user_data['password_hash'], form.password.data)
             if user_data.get('is_approved', False):
-                # --- CORRECTED SECTION ---
-                # Find the user data first (already done above)
-                # Then, create the user object expected by login_user.
-                # The easiest way is often to re-fetch using the ID via the loader's logic,
-                # OR create a compatible object directly if find_user_by_id returns the necessary data.
-                # Let's rely on login_user to call the loader implicitly.
-                # We need an object that has `is_active`, `is_authenticated`, `is_anonymous` and `get_id()`
-                # The User class defined in __init__.py's load_user serves this purpose.
-                # login_user will call load_user(user_data['_id']) internally.
-
-                # We need *an object* to pass to login_user. It doesn't have to be
-                # fully loaded yet, as long as get_id() works. Flask-Login
-                # uses the ID to call your @login_manager.user_loader.
-                # Create a temporary minimal user object for login_user to use the ID from.
-                class TempUser:
-                    def __init__(self, user_id):
-                        self.id = user_id
-                    def get_id(self):
-                        return self.id
-                    # These might not be strictly needed just for login_user to call the loader
-                    # but good practice for consistency.
-                    is_active = True
-                    is_authenticated = True
-                    is_anonymous = False
-
-                temp_user_for_login = TempUser(str(user_data['_id']))
-
-                # Pass this temporary object; Flask-Login uses its ID to call the REAL load_user
-                login_was_successful = login_user(temp_user_for_login, remember=form.remember.data)
-
-                # It's good practice to check if login_user succeeded (it calls the loader)
+                # Build the session user from the document we already have and cache it,
+                # so the requests that follow need no users lookup in load_user.
+                user = remember_customer(user_data)
+                login_was_successful = login_user(user, remember=form.remember.data)
+
                 if login_was_successful and current_user.is_authenticated:
+                    login_succeeded(form.email.data)
                     session['is_admin'] = False # Ensure admin flag is false for customer
                     flash('Login successful!', 'success')
                     next_page = request.args.get('next')
@@ -91,13 +91,20 @@ def signup():
 
     form = SignupForm()
     if form.validate_on_submit():
-        user_id = create_user(
-            username=form.username.data,
-            email=form.email.data,
-            password=form.password.data,
-            address=form.address.data,
-            phone=form.phone.data
-        )
+        try:
+            user_id = create_user(
+                username=form.username.data,
+                email=form.email.data,
+                password=form.password.data,
+                address=form.address.data,
+                phone=form.phone.data
+            )
+        except PasswordHasherBusy:
+            return _hasher_busy('signup.html', 'Sign Up', form)
+        except DuplicateUserError as e:
+            # No pre-check queries: the insert itself tells us which unique field was taken.
+            getattr(form, e.field).errors.append(form.DUPLICATE_ERRORS[e.field])
+            return render_template('signup.html', title='Sign Up', form=form)
         if user_id:
             flash('Account created successfully! Please wait for admin approval.', 'success')
             return redirect(url_for('auth.login'))
@@ -113,6 +120,8 @@ def logout():
     # (Logout code remains the same)
     username = current_user.username if hasattr(current_user, 'username') else 'User'
     is_admin_logout = session.get('is_admin', False)
+    if not is_admin_logout and session.get('cart') and reservations_enabled():
+        release(current_user.get_id()) # The cart goes with the session, so its stock holds do too
 
     logout_user()
     session.clear()
@@ -138,22 +147,17 @@ def admin_login():
 
     form = AdminLoginForm()
     if form.validate_on_submit():
+        wait = throttle_login(form.username.data, scope='admin')
+        if wait:
+            return _throttled('admin_login.html', 'Admin Login', form, wait)
         config_admin_user = current_app.config['ADMIN_USERNAME']
         config_admin_pass = current_app.config['ADMIN_PASSWORD']
         submitted_user = form.username.data
         submitted_pass = form.password.data
 
         if submitted_user == config_admin_user and submitted_pass == config_admin_pass:
-            class AdminUser: # Define the dummy admin user object
-                is_authenticated = True
-                is_active = True
-                is_anonymous = False
-                id = "admin"
-                def get_id(self): return self.id
-                def is_admin(self): return True
-
-            admin_obj = AdminUser()
-            login_user(admin_obj) # Log in the dummy admin user
+            login_user(ADMIN_USER) # Log in the admin user object
+            login_succeeded(submitted_user, scope='admin')
 
             session['is_admin'] = True # Set session flag AFTER login
             flash('Admin login successful!', 'success')
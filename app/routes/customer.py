@@ -6,10 +6,16 @@ import datetime
 from . import customer_bp
 # Corrected import to directly access mongo client via get_db
 from ..models import (
-    find_toy_by_id, update_stock, create_order, get_orders_by_user,
-    find_user_by_id, update_user_profile, get_all_toys, get_db # Import get_db
+    find_toy_by_id, get_orders_by_user,
+    find_user_by_id, update_user_profile, get_toys_page, get_catalog_toy, search_toys,
+    get_toy_facets, CATALOG_SORTS, get_db, IST # Import get_db
 )
 from ..forms import AddressPhoneForm, UpdateProfileForm, CartUpdateForm
+from ..cache import storefront_page
+from ..checkout import place_order, new_checkout_key, CheckoutError
+from ..cart import refresh_cart, save_cart
+from ..jobs import enqueue
+from ..reservations import reservations_enabled, hold, release, renew_holds, active_holds
 
 # --- Customer Dashboard ---
 @customer_bp.route('/dashboard')
@@ -51,17 +57,59 @@ def profile():
 
 
 # --- Toy Browsing ---
+SORT_LABELS = {'name': 'Name (A-Z)', 'price_asc': 'Price: Low to High', 'price_desc': 'Price: High to Low', 'newest': 'Newest First'}
+
+def _parse_price(value):
+    try:
+        price = float(value)
+    except (TypeError, ValueError):
+        return None
+    return price if price >= 0 else None
+
+def _catalog_filter_args():
+    """Reads the toy list filters from the query string, dropping invalid values."""
+    sort = request.args.get('sort', 'name')
+    return {
+        'sort': sort if sort in CATALOG_SORTS else 'name',
+        'in_stock': '0' if request.args.get('in_stock') == '0' else '1',
+        'min_price': _parse_price(request.args.get('min_price')),
+        'max_price': _parse_price(request.args.get('max_price')),
+        'limit': request.args.get('limit'),
+    }
+
 @customer_bp.route('/toys')
+@storefront_page
 def list_toys():
-    """Show all available toys to the customer."""
-    toys = get_all_toys(in_stock_only=True)
+    """Show toys to the customer, filtered/sorted, one keyset page at a time."""
+    filters = _catalog_filter_args()
+    in_stock_only = filters['in_stock'] == '1'
+    page = get_toys_page(
+        in_stock_only=in_stock_only,
+        after=request.args.get('after'),
+        before=request.args.get('before'),
+        limit=filters['limit'],
+        sort=filters['sort'],
+        min_price=filters['min_price'],
+        max_price=filters['max_price']
+    )
+    facets = get_toy_facets(in_stock_only, filters['min_price'], filters['max_price'])
+    # Only non-default filters are carried into pagination/facet links
+    filter_args = {k: v for k, v in filters.items() if v is not None and (k, v) not in (('sort', 'name'), ('in_stock', '1'))}
     # Assumes template name is toy_list.html in customer folder
-    return render_template('toy_list.html', title='Our Toys', toys=toys)
+    return render_template('toy_list.html', title='Our Toys', toys=page['toys'], page=page,
+                           facets=facets, filters=filters, filter_args=filter_args, sort_labels=SORT_LABELS)
+
+@customer_bp.route('/search')
+def search():
+    """Full-text toy search, ranked by relevance."""
+    results = search_toys(request.args.get('q', ''), page=request.args.get('page', 1), limit=request.args.get('limit'))
+    return render_template('search_results.html', title='Search', results=results)
 
 @customer_bp.route('/toy/<toy_id>')
+@storefront_page
 def toy_detail(toy_id):
     """Show details of a single toy."""
-    toy = find_toy_by_id(toy_id)
+    toy = get_catalog_toy(toy_id)
     if not toy or toy.get('stock', 0) <= 0:
         flash('Toy not found or unavailable.', 'warning')
         return redirect(url_for('main.index'))
@@ -70,32 +118,40 @@ def toy_detail(toy_id):
 
 
 # --- Cart Management ---
+def _refreshed_cart():
+    """Refreshes the session cart against the catalog (one query) and flashes what changed."""
+    cart = session.get('cart', {})
+    held = active_holds(current_user.get_id()) if reservations_enabled() and cart else None
+    summary = refresh_cart(cart, held)
+    if summary['modified']:
+        save_cart(cart)
+    for name in summary['removed']:
+        flash(f"'{name}' is no longer available and was removed from your cart.", 'warning')
+    if summary['price_changes']:
+        flash('Some prices in your cart have changed since you added them. Please review them below.', 'info')
+    return cart, summary
+
 @customer_bp.route('/cart')
 @login_required
 def view_cart():
-    """Displays the contents of the shopping cart."""
-    cart = session.get('cart', {})
-    cart_items = []
-    total_price = 0.0
-
-    for toy_id, item_data in cart.items():
-        subtotal = item_data['price'] * item_data['quantity']
-        cart_items.append({
-            'id': toy_id,
-            'name': item_data['name'],
-            'price': item_data['price'],
-            'quantity': item_data['quantity'],
-            'image_url': item_data.get('image_url', ''),
-            'subtotal': subtotal
-        })
-        total_price += subtotal
+    """Displays the contents of the shopping cart with live prices and stock."""
+    cart, summary = _refreshed_cart()
+    if summary['stock_problems']:
+        flash('Some items in your cart are short of stock. Please adjust them before checking out.', 'warning')
 
     update_form = CartUpdateForm() # For inline updates
 
     # Assumes template name is cart.html in customer folder
-    return render_template('cart.html', title='Shopping Cart', cart_items=cart_items, total_price=total_price, update_form=update_form)
+    return render_template('cart.html', title='Shopping Cart', cart_items=summary['items'], total_price=summary['total'],
+                           update_form=update_form, can_checkout=not summary['stock_problems'])
 
 
+def _reserve(toy, quantity):
+    """Holds `quantity` units of a toy for the current customer; returns (ok, most units they can have)."""
+    if reservations_enabled():
+        return hold(current_user.get_id(), str(toy['_id']), quantity)
+    return toy.get('stock', 0) >= quantity, toy.get('stock', 0)
+
 @customer_bp.route('/cart/add/<toy_id>', methods=['POST'])
 @login_required
 def add_to_cart(toy_id):
@@ -107,31 +163,32 @@ def add_to_cart(toy_id):
     quantity = int(request.form.get('quantity', 1))
     if quantity <= 0: quantity = 1
 
-    if toy.get('stock', 0) < quantity:
-         flash(f"Not enough stock for {toy['name']}. Only {toy['stock']} available.", 'warning')
-         return redirect(request.referrer or url_for('customer.toy_detail', toy_id=toy_id))
-
     cart = session.get('cart', {})
     cart_item = {
         'name': toy['name'],
         'price': toy['price'],
-        'image_url': toy.get('image_url', url_for('static', filename='images/default_toy.png')),
+        'image_path': toy.get('image_path'),
         'quantity': cart.get(toy_id, {}).get('quantity', 0) + quantity
     }
 
-    if toy.get('stock', 0) < cart_item['quantity']:
-        flash(f"Cannot add {quantity} more. Total requested exceeds stock for {toy['name']}.", 'warning')
-        if toy_id not in cart:
-             cart_item['quantity'] = toy.get('stock', 0)
-             if cart_item['quantity'] <= 0:
-                flash(f"{toy['name']} is now out of stock.", 'warning')
-                return redirect(request.referrer or url_for('main.index'))
-        else:
+    # With reservations the units are taken now, so a sell-out is decided here rather than at checkout.
+    placed, available = _reserve(toy, cart_item['quantity'])
+    if not placed:
+        if toy_id in cart:
+            flash(f"Cannot add {quantity} more. Only {available} of {toy['name']} available.", 'warning')
             return redirect(request.referrer or url_for('customer.view_cart'))
+        if available <= 0:
+            flash(f"{toy['name']} is now out of stock.", 'warning')
+            return redirect(request.referrer or url_for('main.index'))
+        flash(f"Cannot add {quantity}. Only {available} of {toy['name']} available, so we added those.", 'warning')
+        cart_item['quantity'] = quantity = available
+        placed, available = _reserve(toy, cart_item['quantity'])
+        if not placed:
+            flash(f"{toy['name']} just sold out.", 'warning')
+            return redirect(request.referrer or url_for('main.index'))
 
     cart[toy_id] = cart_item
-    session['cart'] = cart
-    session.modified = True
+    save_cart(cart)
 
     flash(f"{toy['name']} (x{quantity}) added to cart.", 'success')
     return redirect(request.referrer or url_for('customer.view_cart'))
@@ -151,15 +208,20 @@ def update_cart_item(toy_id):
         if new_quantity <= 0:
             return redirect(url_for('customer.remove_from_cart', toy_id=toy_id))
 
-        toy = find_toy_by_id(toy_id)
-        if not toy or toy.get('stock', 0) < new_quantity:
-            stock_available = toy.get('stock', 0) if toy else 0
-            flash(f"Cannot update quantity. Only {stock_available} of {cart[toy_id]['name']} in stock.", 'warning')
+        if reservations_enabled():
+            placed, stock_available = hold(current_user.get_id(), toy_id, new_quantity)
+            name = cart[toy_id]['name']
+        else:
+            cart, summary = _refreshed_cart()
+            line = next((line for line in summary['items'] if line['id'] == toy_id), None)
+            placed = line is not None and line['stock'] >= new_quantity
+            stock_available, name = (line['stock'], line['name']) if line else (0, 'this toy')
+        if not placed:
+            flash(f"Cannot update quantity. Only {stock_available} of {name} in stock.", 'warning')
             return redirect(url_for('customer.view_cart'))
 
         cart[toy_id]['quantity'] = new_quantity
-        session['cart'] = cart
-        session.modified = True
+        save_cart(cart)
         flash('Cart updated.', 'success')
     else:
         current_app.logger.warning(f"Cart update validation failed for toy {toy_id}: {form.errors}")
@@ -175,8 +237,9 @@ def remove_from_cart(toy_id):
     if toy_id in cart:
         removed_item_name = cart[toy_id]['name']
         del cart[toy_id]
-        session['cart'] = cart
-        session.modified = True
+        if reservations_enabled():
+            release(current_user.get_id(), toy_id)
+        save_cart(cart)
         flash(f'{removed_item_name} removed from cart.', 'success')
     else:
         flash('Item not found in cart.', 'warning')
@@ -188,7 +251,7 @@ def remove_from_cart(toy_id):
 @login_required
 def checkout():
     cart = session.get('cart', {})
-    if not cart:
+    if not cart and not request.form.get('checkout_key'): # A keyed repeat may find the cart already emptied
         flash('Your cart is empty.', 'warning')
         return redirect(url_for('main.index'))
 
@@ -200,6 +263,8 @@ def checkout():
     form = AddressPhoneForm()
 
     if request.method == 'GET':
+        if reservations_enabled():
+            renew_holds(current_user.get_id()) # Filling in the form should not cost them their items
         form.address.data = user_data.get('address', '')
         form.phone.data = user_data.get('phone', '')
         if not form.address.data or not form.phone.data:
@@ -209,74 +274,43 @@ def checkout():
         shipping_address = form.address.data
         phone = form.phone.data
 
-        if user_data.get('address') != shipping_address or user_data.get('phone') != phone:
-             update_user_profile(current_user.get_id(), shipping_address, phone)
-
-        order_items = []
-        total_amount = 0.0
-        stock_ok = True
-
-        for toy_id_str, item_data in cart.items():
-            toy = find_toy_by_id(toy_id_str)
-            if not toy or toy.get('stock', 0) < item_data['quantity']:
-                stock_ok = False
-                flash(f"Sorry, stock for '{item_data['name']}' changed. Only {toy.get('stock', 0) if toy else 0} available.", 'danger')
-                break
-
-            order_items.append({
-                'toy_id': ObjectId(toy_id_str),
-                'name': item_data['name'],
-                'quantity': item_data['quantity'],
-                'price': item_data['price']
-            })
-            total_amount += item_data['price'] * item_data['quantity']
-
-        if not stock_ok:
+        requested_at = datetime.datetime.now(IST)
+        try:
+            # Validates every line, takes the stock and stores the order as one unit.
+            # A repeat of an already placed submission (same checkout_key) just returns that order.
+            order_id, replayed = place_order(current_user.get_id(), cart, shipping_address, phone,
+                                             checkout_key=form.checkout_key.data)
+        except CheckoutError as e:
+            flash(str(e), 'danger')
             return redirect(url_for('customer.view_cart'))
-
-        order_id = create_order(
-            user_id=current_user.get_id(),
-            items=order_items,
-            total_amount=total_amount,
-            shipping_address=shipping_address,
-            phone=phone
-        )
-
-        if order_id:
-             stock_deduction_failed = False
-             for item in order_items:
-                 if not update_stock(item['toy_id'], -item['quantity']):
-                      stock_deduction_failed = True
-                      current_app.logger.error(f"CRITICAL ERROR: Failed to deduct stock for toy {item['toy_id']} in order {order_id}")
-                      flash(f"Error updating stock for {item['name']}. Please contact support regarding order {order_id}.", 'danger')
-
-             if not stock_deduction_failed:
-                 session.pop('cart', None)
-                 session.modified = True
-                 flash('Order placed successfully! Payment via Cash on Delivery.', 'success')
-                 return redirect(url_for('customer.order_confirmation', order_id=order_id))
-        else:
+        except Exception as e:
+            current_app.logger.error(f"Checkout failed for user {current_user.get_id()}: {e}", exc_info=True)
             flash('There was an error placing your order. Please try again.', 'danger')
+        else:
+            if not replayed and (user_data.get('address') != shipping_address or user_data.get('phone') != phone):
+                # Not needed for the order itself, so the job worker saves it after the response.
+                enqueue('update_profile', {'user_id': current_user.get_id(), 'address': shipping_address,
+                                           'phone': phone, 'requested_at': requested_at})
+            save_cart({})
+            flash('Order placed successfully! Payment via Cash on Delivery.', 'success')
+            return redirect(url_for('customer.order_confirmation', order_id=order_id))
+
+    # Show live prices (changes are flashed); lines that can no longer be fulfilled go back to the cart.
+    cart, summary = _refreshed_cart()
+    if summary['stock_problems'] or not cart:
+        if summary['stock_problems']:
+            flash('Some items in your cart are short of stock. Please adjust them before checking out.', 'warning')
+        return redirect(url_for('customer.view_cart'))
 
-    cart_items_display = []
-    total_price_display = 0.0
-    for toy_id, item_data in cart.items():
-        subtotal = item_data['price'] * item_data['quantity']
-        cart_items_display.append({
-            'id': toy_id,
-            'name': item_data['name'],
-            'price': item_data['price'],
-            'quantity': item_data['quantity'],
-            'subtotal': subtotal
-        })
-        total_price_display += subtotal
+    if not form.checkout_key.data:
+        form.checkout_key.data = new_checkout_key()
 
     # Assumes template name is checkout.html in customer folder
     return render_template('checkout.html',
                            title='Checkout',
                            form=form,
-                           cart_items=cart_items_display,
-                           total_price=total_price_display)
+                           cart_items=summary['items'],
+                           total_price=summary['total'])
 
 
 @customer_bp.route('/order_confirmation/<order_id>')
@@ -292,7 +326,7 @@ def order_confirmation(order_id):
 @login_required
 def order_history():
     """Displays the customer's past orders."""
-    orders = get_orders_by_user(current_user.get_id())
+    orders = get_orders_by_user(current_user.get_id(), projection='card')
     # --- RENDER THE CORRECT CUSTOMER TEMPLATE ---
     # Uses order_history.html located in app/templates/customer/
     # **Ensure this file exists or change to 'orders.html' if that's your file**
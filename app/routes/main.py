@@ -1,13 +1,16 @@
 from flask import render_template, current_app
 from . import main_bp
 from .. import mongo
-from ..models import get_all_toys
+from ..models import get_toys_page
+from ..cache import storefront_page
 
 @main_bp.route('/')
 @main_bp.route('/index')
+@storefront_page
 def index():
-    # Fetch toys that are in stock for the homepage
-    toys = get_all_toys(in_stock_only=True)
+    # Fetch only as many in-stock toys as the homepage shows
+    featured_count = current_app.config.get('HOMEPAGE_FEATURED_TOYS', 8)
+    toys = get_toys_page(in_stock_only=True, limit=featured_count)['toys']
     return render_template('index.html', title='Welcome', toys=toys)
 
 # Add other general routes like about page if needed
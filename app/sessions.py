@@ -0,0 +1,162 @@
+# File: app/sessions.py
+"""Server-side sessions: the cookie carries only a random session id.
+
+The session (cart, login state, flashes) is kept by a pluggable store:
+  mongo  - the `sessions` collection, {_id: sid, data, expires_at}, with a TTL
+           index on expires_at so abandoned sessions delete themselves;
+  memory - a per-process dict, for tests and single-process development;
+  cookie - Flask's default signed-cookie session (SESSION_BACKEND=cookie).
+
+A session is written back only when it changed. An unchanged session has its
+expiry pushed out at most once per SESSION_TOUCH_SECONDS, and the cookie is
+only sent when the id is new. Logging in or out (a change of Flask-Login's
+_user_id) moves the data to a fresh id, so a session id seen before login
+is useless afterwards.
+"""
+
+import copy
+import secrets
+import threading
+from datetime import datetime, timedelta
+
+import pytz
+from flask.sessions import SecureCookieSession, SessionInterface
+
+
+class ServerSession(SecureCookieSession):
+    """SecureCookieSession's change tracking, plus the id it is stored under."""
+
+    def __init__(self, initial=None, sid=None, expires_at=None):
+        super().__init__(initial)
+        self.new = sid is None
+        self.sid = sid or secrets.token_urlsafe(32)
+        self.expires_at = expires_at # When the stored copy expires, as loaded
+        self.loaded_user = (initial or {}).get('_user_id')
+
+
+class MongoSessionStore:
+    """Sessions in a Mongo collection; expired ones are removed by a TTL index."""
+
+    def __init__(self, collection_name='sessions'):
+        self.collection_name = collection_name
+
+    def _collection(self):
+        from .models import get_db
+        return get_db()[self.collection_name]
+
+    def load(self, sid, now):
+        doc = self._collection().find_one({'_id': sid, 'expires_at': {'$gt': now}}, {'data': 1, 'expires_at': 1})
+        if doc is None:
+            return None, None
+        expires_at = doc['expires_at']
+        return doc['data'], expires_at if expires_at.tzinfo else pytz.utc.localize(expires_at)
+
+    def save(self, sid, data, expires_at):
+        self._collection().replace_one({'_id': sid}, {'_id': sid, 'data': data, 'expires_at': expires_at}, upsert=True)
+
+    def touch(self, sid, expires_at):
+        self._collection().update_one({'_id': sid}, {'$set': {'expires_at': expires_at}})
+
+    def delete(self, sid):
+        self._collection().delete_one({'_id': sid})
+
+    def ensure_indexes(self, db):
+        db[self.collection_name].create_index('expires_at', expireAfterSeconds=0, background=True)
+
+
+class MemorySessionStore:
+    """Sessions in a dict in this process; for tests and the development server."""
+
+    def __init__(self):
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def load(self, sid, now):
+        with self._lock:
+            entry = self._sessions.get(sid)
+            if entry is None or entry[1] <= now:
+                self._sessions.pop(sid, None)
+                return None, None
+            return copy.deepcopy(entry[0]), entry[1]
+
+    def save(self, sid, data, expires_at):
+        with self._lock:
+            self._sessions[sid] = (copy.deepcopy(data), expires_at)
+
+    def touch(self, sid, expires_at):
+        with self._lock:
+            if sid in self._sessions:
+                self._sessions[sid] = (self._sessions[sid][0], expires_at)
+
+    def delete(self, sid):
+        with self._lock:
+            self._sessions.pop(sid, None)
+
+    def ensure_indexes(self, db):
+        pass
+
+
+SESSION_STORES = {'mongo': MongoSessionStore, 'memory': MemorySessionStore}
+
+
+class ServerSideSessionInterface(SessionInterface):
+    session_class = ServerSession
+
+    def __init__(self, store):
+        self.store = store
+
+    def _lifetime(self, app):
+        return timedelta(seconds=app.config.get('SESSION_IDLE_SECONDS', 7 * 86400))
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            data, expires_at = self.store.load(sid, datetime.now(pytz.utc))
+            if data is not None:
+                return self.session_class(data, sid=sid, expires_at=expires_at)
+        return self.session_class()
+
+    def _set_cookie(self, app, session, response):
+        response.set_cookie(
+            self.get_cookie_name(app), session.sid,
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app), domain=self.get_cookie_domain(app),
+            path=self.get_cookie_path(app), secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+        )
+
+    def save_session(self, app, session, response):
+        if session.accessed:
+            response.vary.add('Cookie')
+        if not session:
+            if not session.new: # Emptied (e.g. logout): forget it on both sides
+                self.store.delete(session.sid)
+                response.delete_cookie(self.get_cookie_name(app), domain=self.get_cookie_domain(app),
+                                       path=self.get_cookie_path(app))
+            return
+
+        now = datetime.now(pytz.utc)
+        expires_at = now + self._lifetime(app)
+        if not session.new and session.get('_user_id') != session.loaded_user:
+            # Logged in or out: don't carry on under an id that existed before.
+            self.store.delete(session.sid)
+            session.sid, session.new = secrets.token_urlsafe(32), True
+        if session.new or session.modified:
+            self.store.save(session.sid, dict(session), expires_at)
+        elif session.expires_at is None or \
+                (expires_at - session.expires_at).total_seconds() >= app.config.get('SESSION_TOUCH_SECONDS', 300):
+            self.store.touch(session.sid, expires_at)
+        if session.new or (session.permanent and self.should_set_cookie(app, session)):
+            self._set_cookie(app, session, response)
+
+
+def init_app(app):
+    """Installs the store named by SESSION_BACKEND; 'cookie' keeps Flask's default session."""
+    backend = app.config.get('SESSION_BACKEND', 'mongo')
+    if backend == 'cookie':
+        return None
+    if backend not in SESSION_STORES:
+        raise ValueError(f"Unknown SESSION_BACKEND '{backend}' (use one of: cookie, {', '.join(SESSION_STORES)})")
+    store = SESSION_STORES[backend]()
+    app.session_interface = ServerSideSessionInterface(store)
+    return store
@@ -0,0 +1,143 @@
+# File: app/suggest.py
+"""In-memory prefix index of toy names for type-ahead suggestions.
+
+Names live in one sorted list of packed strings ("<folded name>\\0<name>\\0<id>"),
+so a lookup is a bisect plus a short forward scan and the whole index costs
+one small string per toy. The index is built when the worker starts and is
+patched in place by add_toy/update_toy/delete_toy. Renames made by other
+workers show up as a change in the catalog meta document's `names` counter,
+and the index rebuilds itself from Mongo on the next lookup.
+"""
+
+import bisect
+import sys
+import threading
+import time
+
+from .cache import catalog_version
+
+_SEP = '\x00'
+
+
+def _fold(name):
+    return ' '.join((name or '').casefold().split())
+
+
+def _pack(toy_id, name):
+    return f"{_fold(name)}{_SEP}{name}{_SEP}{toy_id}"
+
+
+class PrefixIndex:
+    """Sorted-array prefix index. Writers swap in a new list; readers never lock."""
+
+    def __init__(self):
+        self._entries = []
+        self._lock = threading.Lock()
+        self.names_version = None
+        self.rebuilds = 0
+        self.lookups = 0
+        self.last_build_ms = 0.0
+
+    def rebuild(self, toys, names_version=None):
+        """Replaces the index with the given toy documents (only _id and name are read)."""
+        start = time.perf_counter()
+        entries = sorted(_pack(toy['_id'], toy.get('name', '')) for toy in toys)
+        with self._lock:
+            self._entries = entries
+            self.names_version = names_version
+            self.rebuilds += 1
+        self.last_build_ms = (time.perf_counter() - start) * 1000
+
+    def _without(self, entries, toy_id):
+        suffix = f"{_SEP}{toy_id}"
+        return [entry for entry in entries if not entry.endswith(suffix)]
+
+    def add(self, toy_id, name):
+        with self._lock:
+            entries = list(self._entries)
+            bisect.insort(entries, _pack(toy_id, name))
+            self._entries = entries
+
+    def add_many(self, toys):
+        """Adds several (toy_id, name) pairs with a single merge, for bulk imports."""
+        packed = [_pack(toy_id, name) for toy_id, name in toys]
+        with self._lock:
+            self._entries = sorted(self._entries + packed) # Two sorted runs; timsort merges them in O(n)
+
+    def update(self, toy_id, name):
+        with self._lock:
+            entries = self._without(self._entries, toy_id)
+            bisect.insort(entries, _pack(toy_id, name))
+            self._entries = entries
+
+    def remove(self, toy_id):
+        with self._lock:
+            self._entries = self._without(self._entries, toy_id)
+
+    def suggest(self, prefix, limit=10):
+        """Returns up to `limit` (name, toy_id) pairs whose folded name starts with prefix."""
+        self.lookups += 1
+        folded = _fold(prefix)
+        if not folded:
+            return []
+        entries = self._entries # Snapshot; writers replace the list rather than mutate it
+        results = []
+        i = bisect.bisect_left(entries, folded)
+        while i < len(entries) and len(results) < limit:
+            key, name, toy_id = entries[i].split(_SEP)
+            if not key.startswith(folded):
+                break
+            results.append((name, toy_id))
+            i += 1
+        return results
+
+    def __len__(self):
+        return len(self._entries)
+
+    def memory_bytes(self):
+        """Approximate heap used by the index: the list plus every packed string."""
+        entries = self._entries
+        return sys.getsizeof(entries) + sum(sys.getsizeof(entry) for entry in entries)
+
+    def stats(self):
+        return {
+            'names': len(self._entries),
+            'memory_bytes': self.memory_bytes(),
+            'lookups': self.lookups,
+            'rebuilds': self.rebuilds,
+            'last_build_ms': round(self.last_build_ms, 2),
+            'names_version': self.names_version,
+        }
+
+
+toy_name_index = PrefixIndex()
+
+
+def rebuild_from_db():
+    """Reloads every toy name from Mongo into this worker's index."""
+    from .models import get_all_toys
+    names_version = catalog_version.names_version
+    toy_name_index.rebuild(get_all_toys(projection={'name': 1}), names_version)
+
+
+def suggest_toy_names(prefix, limit=10):
+    """Type-ahead lookup; rebuilds first if another worker changed toy names."""
+    catalog_version.current()
+    if toy_name_index.names_version != catalog_version.names_version:
+        rebuild_from_db()
+    return toy_name_index.suggest(prefix, limit)
+
+
+def record_name_change(meta_doc, previous_names_version):
+    """Marks the index current after a local incremental update, unless other workers also wrote."""
+    if meta_doc and toy_name_index.names_version == previous_names_version \
+            and meta_doc.get('names') == (previous_names_version or 0) + 1:
+        toy_name_index.names_version = meta_doc['names']
+
+
+def init_app(app):
+    """Builds the index for this worker and registers its metrics. Needs an app context."""
+    from .metrics import register_metrics
+    catalog_version.current()
+    rebuild_from_db()
+    register_metrics('suggest_index', toy_name_index.stats)
@@ -0,0 +1,39 @@
+# File: app/tasks.py
+"""Handlers for the background job queue (see jobs.py); run by `python worker.py`.
+
+A job may run more than once (a retry, or a worker that died mid-job), so
+every handler must be safe to repeat.
+"""
+
+from bson import ObjectId
+from flask import current_app
+
+from .jobs import job
+from .models import get_db, save_profile_defaults
+
+
+@job('update_profile')
+def update_profile(payload):
+    """Saves the address and phone a customer checked out with as their profile defaults."""
+    # Never lets an older request (e.g. a retried job) overwrite a newer profile change.
+    save_profile_defaults(payload['user_id'], payload['address'], payload['phone'], payload['requested_at'])
+
+
+@job('order_placed')
+def order_placed(payload):
+    """Follow-up work for a new order: the order log line and low-stock alerts."""
+    db = get_db()
+    order = db.orders.find_one({'_id': ObjectId(payload['order_id'])}, {'user_id': 1, 'items': 1, 'total_amount': 1})
+    if order is None:
+        raise LookupError(f"Order {payload['order_id']} not found")
+    current_app.logger.info(
+        f"Order {order['_id']} placed by user {order['user_id']}: "
+        f"{sum(item['quantity'] for item in order['items'])} item(s), total {order['total_amount']:.2f}"
+    )
+    threshold = current_app.config.get('LOW_STOCK_THRESHOLD', 5)
+    low = db.toys.find(
+        {'_id': {'$in': [item['toy_id'] for item in order['items']]}, 'stock': {'$lte': threshold}},
+        {'name': 1, 'stock': 1}
+    )
+    for toy in low:
+        current_app.logger.warning(f"Low stock: '{toy['name']}' ({toy['_id']}) has {toy['stock']} left.")
@@ -0,0 +1,187 @@
+# File: app/throttle.py
+"""Token-bucket throttling for the login forms.
+
+Every customer or admin login attempt takes one token from two buckets: the
+client IP's and the account's (the submitted email or admin username). An IP
+bucket holds LOGIN_IP_BURST tokens and refills at LOGIN_IP_PER_MINUTE. An
+account bucket holds LOGIN_ACCOUNT_BURST tokens and refills at
+LOGIN_ACCOUNT_PER_MINUTE. If either bucket is empty, the attempt is refused
+with a 429 before the user lookup or bcrypt runs. A successful login gives its
+tokens back, so only failures use up the allowance.
+
+LOGIN_THROTTLE_BACKEND picks where the buckets live:
+  memory - a per-worker dict of at most THROTTLE_MAX_KEYS buckets, where N
+           workers allow N times the configured rate;
+  mongo  - the login_throttle collection, shared by every worker and updated
+           with one atomic find_one_and_update per bucket. A TTL index removes
+           buckets once they would be full again. If Mongo fails, that check
+           falls back to the memory buckets.
+
+The client IP is request.remote_addr. Behind a reverse proxy, wrap the app in
+werkzeug's ProxyFix, or every customer shares the proxy's bucket.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+import pytz
+from flask import current_app, request
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+throttle_stats = {'attempts': 0, 'rejected_ip': 0, 'rejected_account': 0, 'refunded': 0, 'store_errors': 0}
+
+
+class MemoryBuckets:
+    """Token buckets in this process, least recently used dropped beyond max_keys."""
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict() # key -> (tokens, monotonic time of last update)
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, per_second):
+        """Takes a token if there is one. Returns seconds until one is available (0 when taken)."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * per_second)
+            taken = tokens >= 1
+            if taken:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return 0 if taken else (1 - tokens) / per_second
+
+    def give_back(self, key, capacity):
+        with self._lock:
+            if key in self._buckets:
+                tokens, updated = self._buckets[key]
+                self._buckets[key] = (min(capacity, tokens + 1), updated)
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class MongoBuckets:
+    """Token buckets shared by every worker: {_id: key, tokens, updated_at, expires_at}."""
+
+    def __init__(self, collection_name='login_throttle'):
+        self.collection_name = collection_name
+
+    def _collection(self):
+        from .models import get_db
+        return get_db()[self.collection_name]
+
+    def take(self, key, capacity, per_second):
+        now = datetime.now(pytz.utc)
+        elapsed = {'$divide': [{'$subtract': [now, {'$ifNull': ['$updated_at', now]}]}, 1000]}
+        pipeline = [
+            {'$set': {'tokens': {'$min': [capacity, {'$add': [{'$ifNull': ['$tokens', capacity]},
+                                                             {'$multiply': [elapsed, per_second]}]}]}}},
+            {'$set': {'taken': {'$gte': ['$tokens', 1]}}},
+            {'$set': {'tokens': {'$cond': ['$taken', {'$subtract': ['$tokens', 1]}, '$tokens']},
+                      'updated_at': now, 'expires_at': now + timedelta(seconds=capacity / per_second)}},
+        ]
+        for _ in range(2): # Two first attempts on a new key can race on the upsert
+            try:
+                doc = self._collection().find_one_and_update(
+                    {'_id': key}, pipeline, projection={'tokens': 1, 'taken': 1},
+                    upsert=True, return_document=ReturnDocument.AFTER,
+                )
+                break
+            except DuplicateKeyError:
+                continue
+        else:
+            return 0
+        return 0 if doc['taken'] else (1 - doc['tokens']) / per_second
+
+    def give_back(self, key, capacity):
+        self._collection().update_one({'_id': key}, [{'$set': {'tokens': {'$min': [capacity, {'$add': ['$tokens', 1]}]}}}])
+
+    def ensure_indexes(self, db):
+        db[self.collection_name].create_index('expires_at', expireAfterSeconds=0, background=True)
+
+
+memory_buckets = MemoryBuckets()
+mongo_buckets = MongoBuckets()
+
+
+def _limits():
+    config = current_app.config
+    return {
+        'ip': (config.get('LOGIN_IP_BURST', 20), config.get('LOGIN_IP_PER_MINUTE', 10) / 60),
+        'account': (config.get('LOGIN_ACCOUNT_BURST', 5), config.get('LOGIN_ACCOUNT_PER_MINUTE', 1) / 60),
+    }
+
+
+def _keys(account, scope):
+    return {'ip': f"ip:{request.remote_addr}", 'account': f"{scope}:{(account or '').strip().lower()}"}
+
+
+def _buckets():
+    if current_app.config.get('LOGIN_THROTTLE_BACKEND', 'memory') == 'mongo':
+        return mongo_buckets
+    return memory_buckets
+
+
+def _take(key, capacity, per_second):
+    buckets = _buckets()
+    try:
+        return buckets.take(key, capacity, per_second)
+    except Exception as e:
+        if buckets is memory_buckets:
+            raise
+        throttle_stats['store_errors'] += 1
+        current_app.logger.error(f"Login throttle store failed, using this worker's buckets: {e}", exc_info=True)
+        return memory_buckets.take(key, capacity, per_second)
+
+
+def throttle_login(account, scope='customer'):
+    """Spends one login attempt for this client IP and account.
+
+    Returns 0 when the attempt may go ahead, otherwise the seconds until it
+    would be allowed. Cheap: no user lookup, no hashing.
+    """
+    if not current_app.config.get('LOGIN_THROTTLE_ENABLED', True):
+        return 0
+    throttle_stats['attempts'] += 1
+    limits, keys = _limits(), _keys(account, scope)
+    for name in ('ip', 'account'):
+        wait = _take(keys[name], *limits[name])
+        if wait:
+            throttle_stats[f"rejected_{name}"] += 1
+            return wait
+    return 0
+
+
+def login_succeeded(account, scope='customer'):
+    """Returns the tokens a successful login took, so only failed attempts count against the limits."""
+    if not current_app.config.get('LOGIN_THROTTLE_ENABLED', True):
+        return
+    limits, keys = _limits(), _keys(account, scope)
+    try:
+        for name in ('ip', 'account'):
+            _buckets().give_back(keys[name], limits[name][0])
+        throttle_stats['refunded'] += 1
+    except Exception as e:
+        throttle_stats['store_errors'] += 1
+        current_app.logger.error(f"Error refunding login throttle tokens: {e}", exc_info=True)
+
+
+def ensure_indexes(db):
+    if current_app.config.get('LOGIN_THROTTLE_BACKEND', 'memory') == 'mongo':
+        mongo_buckets.ensure_indexes(db)
+
+
+def init_app(app):
+    from .metrics import register_metrics
+    memory_buckets.max_keys = app.config.get('THROTTLE_MAX_KEYS', 100000)
+    register_metrics('login_throttle', lambda: dict(throttle_stats, memory_keys=len(memory_buckets)))
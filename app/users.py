@@ -0,0 +1,85 @@
+# File: app/users.py
+"""The objects Flask-Login keeps as current_user, and the cache behind load_user.
+
+load_user runs on every authenticated request. Approved customers are kept in
+a per-worker TTL/LRU cache (user_cache), so browsing costs no users lookup
+after the first request. User writes (approve_user, approve_users,
+update_user_profile, and save_profile_defaults from the update_profile job in
+worker.py) bump the shared users version (see cache.py); every worker re-reads
+it at most once per USER_VERSION_CHECK_SECONDS and empties its cache when it
+moved. The job itself runs after the checkout response, so until then
+current_user.address/phone show the previous values. Anything that must be
+current (e.g. checkout's prefill) reads the users document instead.
+"""
+
+from flask import current_app
+
+from .cache import user_cache, user_version
+
+
+class User:
+    """A logged-in customer: the few user fields pages read, nothing secret."""
+
+    __slots__ = ('id', 'username', 'email', 'address', 'phone', 'is_approved')
+    is_authenticated = True
+    is_active = True
+    is_anonymous = False
+
+    def __init__(self, data):
+        self.id = str(data['_id'])
+        self.username = data.get('username')
+        self.email = data.get('email')
+        self.address = data.get('address')
+        self.phone = data.get('phone')
+        self.is_approved = data.get('is_approved', False)
+
+    def get_id(self):
+        return self.id
+
+    def is_admin(self):
+        return False
+
+
+class AdminUser:
+    """The configured admin (not stored in the database)."""
+
+    __slots__ = ()
+    is_authenticated = True
+    is_active = True
+    is_anonymous = False
+    id = "admin"
+
+    def get_id(self):
+        return self.id
+
+    def is_admin(self):
+        return True
+
+
+ADMIN_USER = AdminUser()
+
+
+def remember_customer(data):
+    """Builds the User for an approved customer's document and caches it (e.g. right after login)."""
+    user = User(data)
+    if user_cache.enabled:
+        user_cache.set(user.id, user)
+    return user
+
+
+def load_customer(user_id):
+    """The approved customer with this id, from the cache or one projected query; None otherwise."""
+    user = None
+    if user_cache.enabled:
+        try:
+            user_version.current() # Empties the cache if another worker changed a user
+        except Exception as e:
+            current_app.logger.warning(f"Error checking users version: {e}")
+        user = user_cache.get(str(user_id))
+    if user is None:
+        from .models import find_user_by_id
+        data = find_user_by_id(user_id, projection='session')
+        if not data or not data.get('is_approved', False):
+            return None # Not cached, so approval is seen at once
+        user = remember_customer(data)
+    return user
@@ -1,6 +1,8 @@
 from datetime import datetime
+import os
 import pytz
 import locale
+from werkzeug.utils import secure_filename
 
 # Set locale for currency formatting (may need OS-level setup for 'en_IN')
 # Try common fallbacks if 'en_IN' is not available
@@ -43,4 +45,20 @@ def format_datetime_ist(dt):
     else:
         # Convert to IST if it's not already
         dt = dt.astimezone(IST)
-    return dt.strftime('%d %b %Y, %I:%M %p %Z') # Example: 25 Dec 2023, 02:30 PM IST
\ No newline at end of file
+    return dt.strftime('%d %b %Y, %I:%M %p %Z') # Example: 25 Dec 2023, 02:30 PM IST
+
+
+TOY_IMAGE_EXTENSIONS = {'jpg', 'jpeg', 'png', 'gif'} # Keep in sync with ToyForm.image's FileAllowed
+
+def toy_image_destination(original_filename, upload_folder, prefix=''):
+    """Returns (absolute save path, path relative to static/) for a new toy image.
+
+    Filenames are secured and timestamped to prevent collisions; `prefix` lets
+    bulk imports keep names unique when many images are written in one second.
+    """
+    base, ext = os.path.splitext(secure_filename(original_filename))
+    timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+    filename = f"{timestamp}_{prefix}{base[:50]}{ext}" # Limit base length
+    # Relative to the static folder for url_for(); assumes UPLOAD_FOLDER is '.../app/static/uploads/toys'
+    relative_path = os.path.join('uploads', 'toys', filename).replace('\\', '/') # Ensure forward slashes
+    return os.path.join(upload_folder, filename), relative_path
@@ -0,0 +1,111 @@
+# File: benchmarks/bench_checkout.py
+"""Many simultaneous checkouts competing for one toy.
+
+Runs the checkout engine (app.checkout.place_order) and, for comparison, the
+old per-line sequence (find_toy_by_id per line, create_order, update_stock per
+line) from a pool of threads. Each checkout buys one unit of a hot toy plus
+one unit of a plentiful one. Reports throughput, latency, and whether stock and
+orders still agree afterwards (no overselling, no orders without stock taken).
+
+Usage: python -m benchmarks.bench_checkout [--threads N] [--checkouts N] [--stock N] [--no-transactions]
+"""
+
+import argparse
+import threading
+import time
+
+from benchmarks.common import make_app, reset_db, summarize, print_table
+from app.checkout import place_order, CheckoutError
+from app.models import get_db, add_toy, create_user, approve_user, find_toy_by_id, create_order, update_stock
+
+
+def legacy_checkout(user_id, cart, address, phone):
+    """The pre-engine checkout: 2N+1 round trips and no rollback."""
+    items = []
+    for toy_id, line in cart.items():
+        toy = find_toy_by_id(toy_id)
+        if not toy or toy.get('stock', 0) < line['quantity']:
+            raise CheckoutError('stock')
+        items.append({'toy_id': toy['_id'], 'name': line['name'], 'quantity': line['quantity'], 'price': line['price']})
+    order_id = create_order(user_id, items, sum(i['price'] * i['quantity'] for i in items), address, phone)
+    for item in items:
+        update_stock(item['toy_id'], -item['quantity']) # A failure here leaves the order in place
+    return order_id
+
+
+def run(app, checkout, user_id, cart, threads, checkouts):
+    latencies, outcomes = [], {'placed': 0, 'rejected': 0, 'failed': 0}
+    lock = threading.Lock()
+    remaining = iter(range(checkouts))
+
+    def worker():
+        with app.app_context():
+            while True:
+                with lock:
+                    if next(remaining, None) is None:
+                        return
+                start = time.perf_counter()
+                try:
+                    checkout(user_id, cart, 'Bench address, Vijayawada', '9876543210')
+                    outcome = 'placed'
+                except CheckoutError:
+                    outcome = 'rejected'
+                except Exception:
+                    outcome = 'failed'
+                elapsed = (time.perf_counter() - start) * 1000
+                with lock:
+                    latencies.append(elapsed)
+                    outcomes[outcome] += 1
+
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    return time.perf_counter() - start, latencies, outcomes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--checkouts', type=int, default=2000)
+    parser.add_argument('--stock', type=int, default=500, help='Units of the contended toy.')
+    parser.add_argument('--no-transactions', action='store_true', help='Force the compensation path.')
+    args = parser.parse_args()
+
+    app = make_app(CHECKOUT_USE_TRANSACTIONS=not args.no_transactions)
+    rows = []
+    for label, checkout in (('checkout engine', place_order), ('legacy per-line', legacy_checkout)):
+        with app.app_context():
+            db = get_db()
+            reset_db(db)
+            user_id = create_user('bench', 'bench@example.com', 'bench-password')
+            approve_user(user_id)
+            hot = add_toy('Hot Toy', 'Contended', 499, None, args.stock)
+            plenty = add_toy('Plentiful Toy', 'Uncontended', 99, None, args.checkouts * 10)
+            cart = {
+                str(hot): {'name': 'Hot Toy', 'price': 499.0, 'quantity': 1},
+                str(plenty): {'name': 'Plentiful Toy', 'price': 99.0, 'quantity': 1},
+            }
+        seconds, latencies, outcomes = run(app, checkout, user_id, cart, args.threads, args.checkouts)
+        with app.app_context():
+            db = get_db()
+            hot_left = db.toys.find_one({'_id': hot})['stock']
+            orders = db.orders.count_documents({})
+        stats = summarize(latencies)
+        consistent = orders == args.stock - hot_left and hot_left >= 0
+        rows.append((
+            label, f"{args.checkouts / seconds:,.0f}", f"{stats['p50']:.1f}", f"{stats['p99']:.1f}",
+            outcomes['placed'], outcomes['rejected'], outcomes['failed'], orders, hot_left,
+            'yes' if consistent else 'NO',
+        ))
+    print_table(f"{args.checkouts} checkouts from {args.threads} threads, {args.stock} units of the hot toy",
+                ['path', 'checkouts/s', 'p50 ms', 'p99 ms', 'placed', 'rejected', 'failed', 'orders',
+                 'stock left', 'consistent'], rows)
+    with app.app_context():
+        reset_db(get_db())
+
+
+if __name__ == '__main__':
+    main()
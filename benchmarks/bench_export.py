@@ -0,0 +1,59 @@
+# File: benchmarks/bench_export.py
+"""Peak RSS and throughput of the streaming order export vs loading every order into a list.
+
+Peak RSS only ever grows, so the streaming export runs first and the list()
+baseline last; each row reports the process high-water mark after that step.
+
+Usage: python -m benchmarks.bench_export [--orders N] [--batch-size N]
+"""
+
+import argparse
+import resource
+import sys
+import time
+
+from benchmarks.common import make_app, reset_db, print_table
+from benchmarks.bench_projections import seed
+from app.export import open_export_cursor, stream_csv, stream_ndjson
+from app.models import get_db
+
+
+def peak_rss_mib():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024 # bytes on macOS, KiB on Linux
+
+
+def run_stream(db, streamer, batch_size):
+    start = time.perf_counter()
+    written = 0
+    for chunk in streamer(open_export_cursor(db, 'orders', {}, batch_size), 'orders', batch_size):
+        written += len(chunk)
+    return time.perf_counter() - start, written
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--orders', type=int, default=200000)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    args = parser.parse_args()
+
+    app = make_app()
+    with app.app_context():
+        db = get_db()
+        reset_db(db)
+        seed(db, 500, args.orders, 500)
+        rows = [('baseline (after seeding)', '-', '-', f"{peak_rss_mib():.1f}")]
+        for label, streamer in (('stream csv', stream_csv), ('stream ndjson', stream_ndjson)):
+            seconds, written = run_stream(db, streamer, args.batch_size)
+            rows.append((label, f"{args.orders / seconds:,.0f}", f"{written / 2**20:.1f}", f"{peak_rss_mib():.1f}"))
+        start = time.perf_counter()
+        orders = list(db.orders.find({}))
+        seconds = time.perf_counter() - start
+        rows.append(('list(find()) baseline', f"{len(orders) / seconds:,.0f}", '-', f"{peak_rss_mib():.1f}"))
+        print_table(f"Order export, {args.orders:,} orders, batch size {args.batch_size}",
+                    ['step', 'rows/s', 'MiB written', 'peak RSS MiB'], rows)
+        reset_db(db)
+
+
+if __name__ == '__main__':
+    main()
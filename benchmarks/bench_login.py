@@ -0,0 +1,102 @@
+# File: benchmarks/bench_login.py
+"""Login throughput and latency at several concurrency levels, with bcrypt in the pool and inline.
+
+Each thread posts the customer login form through its own test client, as fast
+as it can, for --seconds per level. At the same time one extra thread keeps
+fetching the home page, to show what a login burst does to browsing. With
+PASSWORD_HASH_WORKERS=0 bcrypt runs on the request thread. With the pool it
+runs in separate processes, and logins beyond the queue limit get a 503
+straight away.
+
+Usage: python -m benchmarks.bench_login [--levels 1,4,16,64] [--seconds N] [--rounds N] [--pool-workers N] [--queue-depth N]
+"""
+
+import argparse
+import threading
+import time
+from datetime import datetime
+
+import bcrypt
+from bson import ObjectId
+
+from benchmarks.common import make_app, reset_db, summarize, print_table
+from app.models import IST, get_db
+
+PASSWORD = 'bench-password'
+
+
+def run_level(app, emails, threads, seconds):
+    latencies, statuses, browse = [], {}, []
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    def login_worker(index):
+        client = app.test_client()
+        email = emails[index % len(emails)]
+        while not stop.is_set():
+            start = time.perf_counter()
+            status = client.post('/auth/login', data={'email': email, 'password': PASSWORD}).status_code
+            elapsed = (time.perf_counter() - start) * 1000
+            client.get('/auth/logout')
+            with lock:
+                latencies.append(elapsed)
+                statuses[status] = statuses.get(status, 0) + 1
+
+    def browse_worker():
+        client = app.test_client()
+        while not stop.is_set():
+            start = time.perf_counter()
+            client.get('/')
+            browse.append((time.perf_counter() - start) * 1000)
+
+    pool = [threading.Thread(target=login_worker, args=(i,)) for i in range(threads)]
+    pool.append(threading.Thread(target=browse_worker))
+    for thread in pool:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in pool:
+        thread.join()
+    return latencies, statuses, browse
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--levels', default='1,4,16,64', help='Comma-separated numbers of concurrent logins.')
+    parser.add_argument('--seconds', type=float, default=5.0, help='Duration of each level.')
+    parser.add_argument('--rounds', type=int, default=12, help='BCRYPT_LOG_ROUNDS for the test accounts.')
+    parser.add_argument('--pool-workers', type=int, default=2, help='PASSWORD_HASH_WORKERS for the pooled run.')
+    parser.add_argument('--queue-depth', type=int, default=8, help='PASSWORD_HASH_QUEUE_DEPTH for the pooled run.')
+    args = parser.parse_args()
+    levels = [int(level) for level in args.levels.split(',')]
+
+    app = make_app(BCRYPT_LOG_ROUNDS=args.rounds, PASSWORD_HASH_QUEUE_DEPTH=args.queue_depth, SESSION_BACKEND='memory')
+    emails = [f"login{i}@example.com" for i in range(max(levels))]
+    with app.app_context():
+        db = get_db()
+        reset_db(db)
+        pw_hash = bcrypt.hashpw(PASSWORD.encode('utf-8'), bcrypt.gensalt(rounds=args.rounds)).decode('utf-8')
+        now = datetime.now(IST)
+        db.users.insert_many([{'_id': ObjectId(), 'username': f"login{i}", 'email': email, 'password_hash': pw_hash,
+                               'is_approved': True, 'created_at': now} for i, email in enumerate(emails)])
+
+    rows = []
+    for label, workers in (('inline', 0), (f"pool of {args.pool_workers}", args.pool_workers)):
+        app.config['PASSWORD_HASH_WORKERS'] = workers
+        for threads in levels:
+            latencies, statuses, browse = run_level(app, emails, threads, args.seconds)
+            stats, browse_stats = summarize(latencies), summarize(browse) # Login latency includes the fast 503s
+            rows.append((
+                label, threads, f"{statuses.get(302, 0) / args.seconds:,.1f}", statuses.get(503, 0),
+                f"{stats['p50']:.0f}", f"{stats['p99']:.0f}",
+                f"{browse_stats['p50']:.1f}", f"{browse_stats['p99']:.1f}",
+            ))
+    print_table(f"Customer logins at bcrypt cost {args.rounds}, {args.seconds:g} s per level",
+                ['hashing', 'concurrent', 'logins/s', '503s', 'login p50 ms', 'login p99 ms',
+                 'browse p50 ms', 'browse p99 ms'], rows)
+    with app.app_context():
+        reset_db(get_db())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+# File: benchmarks/bench_login_attack.py
+"""Worker CPU spent on a simulated credential attack, with and without login throttling.
+
+Two attacks post wrong passwords to /auth/login:
+  stuffing - one client IP works through many real accounts;
+  spraying - many client IPs (one attempt each) go after one account.
+Each runs with LOGIN_THROTTLE_ENABLED on and off. bcrypt runs inline
+(PASSWORD_HASH_WORKERS=0), so the CPU time of this process includes every
+hash check. Reports the attempts refused with a 429, the bcrypt checks that
+were run, and the CPU used. It also reports whether the account's real owner
+can still log in from their own IP afterwards.
+
+Usage: python -m benchmarks.bench_login_attack [--attempts N] [--rounds N] [--backend memory|mongo]
+"""
+
+import argparse
+import time
+from datetime import datetime
+
+import bcrypt
+from bson import ObjectId
+
+from benchmarks.common import make_app, reset_db, print_table
+from app.models import IST, get_db
+from app.passwords import password_stats
+from app.throttle import memory_buckets, ensure_indexes
+
+PASSWORD = 'bench-password'
+
+
+def attack(app, kind, emails, attempts):
+    """Runs the attack; returns (status counts, CPU seconds, bcrypt checks, account the owner then logs in to)."""
+    checks_before, cpu_before = password_stats['checks'], time.process_time()
+    statuses = {}
+    for i in range(attempts):
+        if kind == 'stuffing':
+            ip, email = '203.0.113.7', emails[i % len(emails)]
+        else:
+            ip, email = f"198.51.{i // 250 % 256}.{i % 250 + 1}", emails[0]
+        status = app.test_client().post('/auth/login', data={'email': email, 'password': 'wrong-guess'},
+                                        environ_base={'REMOTE_ADDR': ip}).status_code
+        statuses[status] = statuses.get(status, 0) + 1
+    cpu = time.process_time() - cpu_before
+    return statuses, cpu, password_stats['checks'] - checks_before, emails[0] if kind == 'spraying' else emails[-1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--attempts', type=int, default=300)
+    parser.add_argument('--accounts', type=int, default=100, help='Real accounts the stuffing attack cycles through.')
+    parser.add_argument('--rounds', type=int, default=12, help='BCRYPT_LOG_ROUNDS of the stored hashes.')
+    parser.add_argument('--backend', choices=('memory', 'mongo'), default='memory', help='LOGIN_THROTTLE_BACKEND.')
+    args = parser.parse_args()
+
+    app = make_app(PASSWORD_HASH_WORKERS=0, BCRYPT_LOG_ROUNDS=args.rounds, LOGIN_THROTTLE_BACKEND=args.backend,
+                   SESSION_BACKEND='memory')
+    emails = [f"victim{i}@example.com" for i in range(args.accounts)]
+    with app.app_context():
+        db = get_db()
+        reset_db(db)
+        pw_hash = bcrypt.hashpw(PASSWORD.encode('utf-8'), bcrypt.gensalt(rounds=args.rounds)).decode('utf-8')
+        now = datetime.now(IST)
+        db.users.insert_many([{'_id': ObjectId(), 'username': f"victim{i}", 'email': email, 'password_hash': pw_hash,
+                               'is_approved': True, 'created_at': now} for i, email in enumerate(emails)])
+        ensure_indexes(db)
+
+    rows = []
+    for kind in ('stuffing', 'spraying'):
+        for throttled in (True, False):
+            app.config['LOGIN_THROTTLE_ENABLED'] = throttled
+            memory_buckets.clear()
+            with app.app_context():
+                get_db().login_throttle.delete_many({})
+            statuses, cpu, checks, owner = attack(app, kind, emails, args.attempts)
+            owner_status = app.test_client().post('/auth/login', data={'email': owner, 'password': PASSWORD},
+                                                  environ_base={'REMOTE_ADDR': '192.0.2.10'}).status_code
+            rows.append((
+                kind, 'on' if throttled else 'off', args.attempts, statuses.get(429, 0), checks,
+                f"{cpu:.2f}", f"{cpu * 1000 / args.attempts:.1f}", 'yes' if owner_status == 302 else f"no ({owner_status})",
+            ))
+    print_table(f"{args.attempts} failed logins at bcrypt cost {args.rounds}, {args.backend} throttle buckets",
+                ['attack', 'throttle', 'attempts', '429s', 'bcrypt checks', 'CPU s', 'CPU ms/attempt',
+                 'owner can log in'], rows)
+    with app.app_context():
+        reset_db(get_db())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+# File: benchmarks/bench_projections.py
+"""Bytes transferred and BSON decode time per list page, full documents vs projection shapes.
+
+Usage: python -m benchmarks.bench_projections [--toys N] [--orders N] [--users N]
+"""
+
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+import bson
+from bson.codec_options import CodecOptions
+from bson.raw_bson import RawBSONDocument
+
+from benchmarks.common import make_app, reset_db, print_table
+from app.models import get_db, TOY_PROJECTIONS, ORDER_PROJECTIONS, USER_PROJECTIONS, IST
+
+RAW = CodecOptions(document_class=RawBSONDocument)
+WORDS = 'handcrafted wooden kondapalli toy painted natural colours tella poniki elephant village set'.split()
+
+
+def seed(db, n_toys, n_orders, n_users):
+    now = datetime.now(IST)
+    toys = [{
+        'name': f"Toy {i:06d}", 'description': ' '.join(random.choices(WORDS, k=200)),
+        'price': round(random.uniform(100, 5000), 2), 'image_path': f"uploads/toys/{i}.png",
+        'stock': random.randint(0, 50), 'created_at': now, 'updated_at': now,
+    } for i in range(n_toys)]
+    toy_ids = db.toys.insert_many(toys).inserted_ids
+    users = [{
+        'username': f"user{i}", 'email': f"user{i}@example.com",
+        'password_hash': '$2b$12$' + 'x' * 53, # Same length as a real bcrypt hash
+        'address': ' '.join(random.choices(WORDS, k=20)), 'phone': '9876543210',
+        'is_approved': i % 4 != 0, 'created_at': now - timedelta(minutes=i),
+    } for i in range(n_users)]
+    user_ids = db.users.insert_many(users).inserted_ids
+    orders = []
+    for i in range(n_orders):
+        items = [{'toy_id': random.choice(toy_ids), 'name': f"Toy {random.randrange(n_toys):06d}",
+                  'quantity': random.randint(1, 3), 'price': 499.0} for _ in range(random.randint(1, 8))]
+        orders.append({
+            'user_id': random.choice(user_ids), 'items': items, 'total_amount': 1497.0,
+            'shipping_address': ' '.join(random.choices(WORDS, k=20)), 'phone': '9876543210',
+            'status': 'Pending', 'payment_method': 'Cash on Delivery', 'created_at': now - timedelta(seconds=i),
+        })
+    db.orders.insert_many(orders)
+    return user_ids
+
+
+def measure(collection, query, projection, sort, limit=0, repeat=10):
+    """Returns (docs, bytes, query ms, decode ms) for one page, averaged over `repeat` runs."""
+    raw_coll = collection.with_options(codec_options=RAW)
+    total_bytes = docs = 0
+    query_ms = decode_ms = 0.0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        page = list(raw_coll.find(query, projection).sort(sort).limit(limit))
+        query_ms += (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        for doc in page:
+            bson.decode(doc.raw)
+        decode_ms += (time.perf_counter() - start) * 1000
+        total_bytes = sum(len(doc.raw) for doc in page)
+        docs = len(page)
+    return docs, total_bytes, query_ms / repeat, decode_ms / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--toys', type=int, default=5000)
+    parser.add_argument('--orders', type=int, default=20000)
+    parser.add_argument('--users', type=int, default=2000)
+    args = parser.parse_args()
+
+    app = make_app()
+    with app.app_context():
+        db = get_db()
+        reset_db(db)
+        user_ids = seed(db, args.toys, args.orders, args.users)
+        page_size = app.config['CATALOG_PAGE_SIZE']
+        cases = [
+            ('storefront page', db.toys, {'stock': {'$gt': 0}}, TOY_PROJECTIONS, 'card', [('name', 1), ('_id', 1)], page_size),
+            ('admin toys', db.toys, {}, TOY_PROJECTIONS, 'row', [('name', 1)], 0),
+            ('admin orders', db.orders, {}, ORDER_PROJECTIONS, 'row', [('created_at', -1)], 0),
+            ('order history', db.orders, {'user_id': user_ids[1]}, ORDER_PROJECTIONS, 'card', [('created_at', -1)], 0),
+            ('pending users', db.users, {'is_approved': False}, USER_PROJECTIONS, 'row', [('created_at', 1)], 0),
+        ]
+        rows = []
+        for label, coll, query, shapes, shape, sort, limit in cases:
+            before = measure(coll, query, None, sort, limit)
+            after = measure(coll, query, shapes[shape], sort, limit)
+            rows.append((
+                label, shape, before[0],
+                f"{before[1] / 1024:.1f}", f"{after[1] / 1024:.1f}",
+                f"{before[2]:.2f}", f"{after[2]:.2f}",
+                f"{before[3]:.2f}", f"{after[3]:.2f}",
+            ))
+        print_table('Per-page transfer: full document vs projection shape',
+                    ['page', 'shape', 'docs', 'KiB full', 'KiB shape', 'query ms full', 'query ms shape',
+                     'decode ms full', 'decode ms shape'], rows)
+        reset_db(db)
+
+
+if __name__ == '__main__':
+    main()
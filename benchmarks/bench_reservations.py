@@ -0,0 +1,120 @@
+# File: benchmarks/bench_reservations.py
+"""Flash-sale load test: many shoppers after a few units of one toy.
+
+Each shopper adds the hot toy to their cart, spends --think-ms "filling in the
+address form", then checks out. With reservations the add-to-cart step holds
+the unit (app.reservations.hold) and checkout claims it; without them
+add-to-cart only looks at stock, as before. Reports throughput and where
+shoppers were turned away: at add-to-cart (cheap, immediate) or at checkout
+after filling in the form (the outcome reservations exist to avoid), plus
+whether stock and orders still agree afterwards.
+
+Usage: python -m benchmarks.bench_reservations [--threads N] [--shoppers N] [--stock N] [--think-ms N] [--no-transactions]
+"""
+
+import argparse
+import threading
+import time
+from datetime import datetime
+
+from bson import ObjectId
+
+from benchmarks.common import make_app, reset_db, summarize, print_table
+from app.checkout import place_order, CheckoutError
+from app.models import IST, get_db, add_toy
+from app.reservations import hold
+
+
+def shop(user_id, toy, think_ms, reserve):
+    """One shopper; returns 'bought', 'cart' (turned away at add-to-cart) or 'checkout' (turned away at checkout)."""
+    toy_id = str(toy['_id'])
+    if reserve:
+        if not hold(user_id, toy_id, 1)[0]:
+            return 'cart'
+    elif get_db().toys.find_one({'_id': toy['_id']}, {'stock': 1})['stock'] < 1:
+        return 'cart'
+    time.sleep(think_ms / 1000)
+    cart = {toy_id: {'name': toy['name'], 'price': toy['price'], 'quantity': 1}}
+    try:
+        place_order(user_id, cart, 'Bench address, Vijayawada', '9876543210')
+    except CheckoutError:
+        return 'checkout'
+    return 'bought'
+
+
+def run(app, users, toy, threads, think_ms, reserve):
+    latencies, outcomes = [], {'bought': 0, 'cart': 0, 'checkout': 0, 'failed': 0}
+    lock = threading.Lock()
+    remaining = iter(users)
+
+    def worker():
+        with app.app_context():
+            while True:
+                with lock:
+                    user_id = next(remaining, None)
+                if user_id is None:
+                    return
+                start = time.perf_counter()
+                try:
+                    outcome = shop(user_id, toy, think_ms, reserve)
+                except Exception:
+                    outcome = 'failed'
+                elapsed = (time.perf_counter() - start) * 1000
+                with lock:
+                    latencies.append(elapsed)
+                    outcomes[outcome] += 1
+
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    return time.perf_counter() - start, latencies, outcomes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--shoppers', type=int, default=1000)
+    parser.add_argument('--stock', type=int, default=100, help='Units of the hot toy.')
+    parser.add_argument('--think-ms', type=int, default=20, help='Time between add-to-cart and checkout.')
+    parser.add_argument('--no-transactions', action='store_true', help='Force the compensation path.')
+    args = parser.parse_args()
+
+    app = make_app(CHECKOUT_USE_TRANSACTIONS=not args.no_transactions)
+    rows = []
+    for label, reserve in (('reservations', True), ('stock check only', False)):
+        app.config['RESERVATIONS_ENABLED'] = reserve
+        with app.app_context():
+            db = get_db()
+            reset_db(db)
+            now = datetime.now(IST)
+            users = [{'_id': ObjectId(), 'username': f"shopper{i}", 'email': f"shopper{i}@example.com",
+                      'password_hash': '', 'is_approved': True, 'created_at': now} for i in range(args.shoppers)]
+            db.users.insert_many(users) # Raw inserts: hashing 1000 passwords is not what is being measured
+            toy_id = add_toy('Flash Sale Toy', 'Contended', 499, None, args.stock)
+            toy = db.toys.find_one({'_id': toy_id})
+        seconds, latencies, outcomes = run(app, [str(user['_id']) for user in users], toy,
+                                           args.threads, args.think_ms, reserve)
+        with app.app_context():
+            db = get_db()
+            left = db.toys.find_one({'_id': toy_id}, {'stock': 1, 'reserved': 1})
+            orders = db.orders.count_documents({})
+        stats = summarize(latencies)
+        consistent = orders + left['stock'] + left.get('reserved', 0) == args.stock and left['stock'] >= 0
+        rows.append((
+            label, f"{args.shoppers / seconds:,.0f}", f"{stats['p50']:.1f}", f"{stats['p99']:.1f}",
+            outcomes['bought'], outcomes['cart'], outcomes['checkout'], outcomes['failed'],
+            f"{outcomes['checkout'] / max(args.shoppers - outcomes['cart'], 1):.0%}",
+            'yes' if consistent else 'NO',
+        ))
+    print_table(f"{args.shoppers} shoppers from {args.threads} threads, {args.stock} units, {args.think_ms} ms at the form",
+                ['path', 'shoppers/s', 'p50 ms', 'p99 ms', 'bought', 'turned away at cart',
+                 'turned away at checkout', 'errors', 'checkout failure rate', 'consistent'], rows)
+    with app.app_context():
+        reset_db(get_db())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+# File: benchmarks/bench_search.py
+"""Search latency as the catalog grows to 100k toys.
+
+The catalog is grown in steps; at each size the same queries are timed with
+the result cache disabled, so every call goes to the text index. "rare" terms
+match a fixed number of toys at every size and should stay flat; "common"
+terms match a fixed fraction of the catalog and show the cost of scoring
+every hit.
+
+Usage: python -m benchmarks.bench_search [--sizes 10000,25000,50000,100000]
+"""
+
+import argparse
+import random
+from datetime import datetime
+
+from benchmarks.common import make_app, reset_db, time_ms, summarize, print_table
+from app.cache import search_cache
+from app.models import get_db, search_toys, IST
+
+ADJECTIVES = ['painted', 'wooden', 'royal', 'dancing', 'tiny', 'festive', 'classic', 'bright']
+ANIMALS = ['elephant', 'horse', 'parrot', 'peacock', 'tiger', 'camel', 'bullock', 'monkey']
+FILLER = 'handcrafted kondapalli softwood natural dyes village artisans traditional gift'.split()
+RARE_TERMS = [f"heirloom{i}" for i in range(20)] # Each tags exactly 10 toys, whatever the size
+
+
+def toy_doc(i, now):
+    words = random.choices(FILLER, k=40)
+    if i < len(RARE_TERMS) * 10:
+        words.append(RARE_TERMS[i // 10])
+    return {
+        'name': f"{random.choice(ADJECTIVES)} {random.choice(ANIMALS)} {i}",
+        'description': ' '.join(words), 'price': round(random.uniform(100, 5000), 2),
+        'image_path': None, 'stock': random.randint(1, 50), 'created_at': now, 'updated_at': now,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', default='10000,25000,50000,100000')
+    parser.add_argument('--repeat', type=int, default=30)
+    args = parser.parse_args()
+    sizes = sorted(int(s) for s in args.sizes.split(','))
+
+    app = make_app()
+    with app.app_context():
+        db = get_db()
+        reset_db(db)
+        db.toys.create_index([('name', 'text'), ('description', 'text')],
+                             weights={'name': 10, 'description': 2}, name='toy_text_search')
+        search_cache.enabled = False
+        queries = {'rare': RARE_TERMS[3], 'rare name+term': f"peacock {RARE_TERMS[7]}", 'common': 'peacock'}
+        rows = []
+        now = datetime.now(IST)
+        seeded = 0
+        for size in sizes:
+            batch = [toy_doc(i, now) for i in range(seeded, size)]
+            for start in range(0, len(batch), 5000):
+                db.toys.insert_many(batch[start:start + 5000])
+            seeded = size
+            for label, q in queries.items():
+                stats = summarize(time_ms(lambda: search_toys(q), repeat=args.repeat))
+                rows.append((size, label, f"{stats['p50']:.2f}", f"{stats['p99']:.2f}"))
+        search_cache.enabled = True
+        cached = summarize(time_ms(lambda: search_toys(queries['common']), repeat=args.repeat))
+        rows.append((sizes[-1], 'common (cached)', f"{cached['p50']:.3f}", f"{cached['p99']:.3f}"))
+        print_table('search_toys latency (ms)', ['toys', 'query', 'p50', 'p99'], rows)
+        reset_db(db)
+
+
+if __name__ == '__main__':
+    main()
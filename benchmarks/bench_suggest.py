@@ -0,0 +1,66 @@
+# File: benchmarks/bench_suggest.py
+"""Memory footprint and lookup latency of the toy-name prefix index.
+
+Builds the index from synthetic toy names (no database needed) and reports
+process RSS growth, the index's own estimate and per-lookup latency.
+
+Usage: python -m benchmarks.bench_suggest [--names 50000]
+"""
+
+import argparse
+import gc
+import os
+import random
+import resource
+import string
+
+from bson import ObjectId
+
+from benchmarks.common import time_ms, summarize, print_table
+from app.suggest import PrefixIndex
+
+
+def rss_bytes():
+    """Current resident set size (Linux /proc), falling back to peak RSS elsewhere."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def synthetic_toys(n):
+    words = ['Kondapalli', 'Dancing', 'Royal', 'Elephant', 'Peacock', 'Ambari', 'Village', 'Set', 'Doll', 'Horse']
+    for _ in range(n):
+        suffix = ''.join(random.choices(string.ascii_lowercase, k=6))
+        yield {'_id': ObjectId(), 'name': f"{' '.join(random.sample(words, 3))} {suffix}"}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--names', type=int, default=50000)
+    args = parser.parse_args()
+
+    gc.collect()
+    before = rss_bytes()
+    index = PrefixIndex()
+    index.rebuild(synthetic_toys(args.names)) # Streamed, so RSS growth is the index alone
+    gc.collect()
+    after = rss_bytes()
+
+    rows = [
+        ('names', len(index)),
+        ('build ms', f"{index.last_build_ms:.1f}"),
+        ('index estimate (MiB)', f"{index.memory_bytes() / 2**20:.2f}"),
+        ('RSS growth (MiB)', f"{(after - before) / 2**20:.2f}"),
+    ]
+    for prefix in ['k', 'dancing', 'royal ele', 'zzz']:
+        stats = summarize(time_ms(lambda: index.suggest(prefix, 8), repeat=2000))
+        rows.append((f"suggest('{prefix}') p50/p99 ms", f"{stats['p50']:.4f} / {stats['p99']:.4f}"))
+    update = summarize(time_ms(lambda: index.update(ObjectId(), 'Renamed Toy'), repeat=20))
+    rows.append(('incremental update p50 ms', f"{update['p50']:.2f}"))
+    print_table('Toy name prefix index', ['metric', 'value'], rows)
+
+
+if __name__ == '__main__':
+    main()
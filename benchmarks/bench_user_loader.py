@@ -0,0 +1,50 @@
+# File: benchmarks/bench_user_loader.py
+"""Request latency of logged-in browsing, with and without the load_user cache.
+
+Logs a customer in through the test client and requests a few customer pages
+in a loop. Every request runs Flask-Login's load_user; with USER_CACHE_SECONDS
+set it is answered from the per-worker user cache, with 0 it costs a users
+lookup each time.
+
+Usage: python -m benchmarks.bench_user_loader [--requests N]
+"""
+
+import argparse
+
+from benchmarks.common import make_app, reset_db, time_ms, summarize, print_table
+from app.cache import user_cache
+from app.models import get_db, add_toy, create_user, approve_user
+
+PAGES = ['/customer/dashboard', '/customer/toys', '/customer/cart', '/customer/profile']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=200, help='Requests per page and mode.')
+    args = parser.parse_args()
+
+    app = make_app()
+    with app.app_context():
+        reset_db(get_db())
+        user_id = create_user('bench', 'bench@example.com', 'bench-password')
+        approve_user(user_id)
+        for i in range(24):
+            add_toy(f"Toy {i:02d}", 'Bench toy', 100 + i, None, 10)
+
+    rows = []
+    for label, ttl in (('cached load_user', 30.0), ('uncached load_user', 0)):
+        user_cache.ttl, user_cache.enabled = ttl, ttl > 0
+        user_cache.clear()
+        client = app.test_client()
+        client.post('/auth/login', data={'email': 'bench@example.com', 'password': 'bench-password'})
+        for page in PAGES:
+            assert client.get(page).status_code == 200, page # Warm up, and make sure we are logged in
+            stats = summarize(time_ms(lambda: client.get(page), repeat=args.requests))
+            rows.append((label, page, f"{stats['p50']:.2f}", f"{stats['p99']:.2f}", f"{stats['mean']:.2f}"))
+    print_table(f"Logged-in requests, {args.requests} per page", ['mode', 'page', 'p50 ms', 'p99 ms', 'mean ms'], rows)
+    with app.app_context():
+        reset_db(get_db())
+
+
+if __name__ == '__main__':
+    main()
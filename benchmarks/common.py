@@ -0,0 +1,78 @@
+# File: benchmarks/common.py
+"""Shared helpers for the benchmark scripts.
+
+Benchmarks run against a throwaway database on the configured MONGO_URI.
+The database is named by BENCH_MONGO_DB_NAME (default: <MONGO_DB_NAME>_bench)
+and must end in '_bench', because benchmarks wipe it before seeding.
+
+Run them from the project root, e.g.: python -m benchmarks.bench_projections
+"""
+
+import os
+import statistics
+import time
+
+from app import create_app
+from app.config import Config
+
+
+def bench_db_name():
+    name = os.environ.get('BENCH_MONGO_DB_NAME') or f"{Config.MONGO_DB_NAME}_bench"
+    if not name.endswith('_bench'):
+        raise ValueError(f"Refusing to benchmark against '{name}': the database name must end in '_bench'.")
+    return name
+
+
+class BenchConfig(Config):
+    MONGO_DB_NAME = bench_db_name()
+    WTF_CSRF_ENABLED = False
+    TESTING = True
+
+
+def make_app(**overrides):
+    """Creates the app against the bench database, with optional config overrides."""
+    config_class = type('BenchRunConfig', (BenchConfig,), overrides)
+    return create_app(config_class)
+
+
+def reset_db(db):
+    """Drops every collection in the bench database."""
+    if not db.name.endswith('_bench'):
+        raise ValueError(f"Refusing to wipe non-bench database '{db.name}'.")
+    for name in db.list_collection_names():
+        if not name.startswith('system.'):
+            db.drop_collection(name)
+
+
+def time_ms(fn, repeat=20):
+    """Calls fn `repeat` times and returns the per-call wall times in milliseconds."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def summarize(samples):
+    return {
+        'p50': percentile(samples, 50),
+        'p99': percentile(samples, 99),
+        'mean': statistics.fmean(samples) if samples else 0.0,
+    }
+
+
+def print_table(title, headers, rows):
+    print(f"\n== {title} ==")
+    widths = [max(len(str(h)), *(len(str(r[i])) for r in rows)) if rows else len(str(h)) for i, h in enumerate(headers)]
+    print('  '.join(str(h).ljust(w) for h, w in zip(headers, widths)))
+    for row in rows:
+        print('  '.join(str(c).ljust(w) for c, w in zip(row, widths)))
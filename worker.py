@@ -0,0 +1,24 @@
+import os
+import argparse
+from dotenv import load_dotenv
+
+# Load environment variables from .env file first
+dotenv_path = os.path.join(os.path.dirname(__file__), '.env')
+if os.path.exists(dotenv_path):
+    load_dotenv(dotenv_path)
+else:
+    print("Warning: .env file not found. Using system environment variables.")
+
+# Import the app factory AFTER loading .env
+from app import create_app
+from app.jobs import run_worker
+
+app = create_app()
+
+if __name__ == '__main__':
+    # Run as many of these as the queue needs; jobs are leased, so workers never share one.
+    parser = argparse.ArgumentParser(description='Runs background jobs queued by the web app.')
+    parser.add_argument('--once', action='store_true', help='Exit when the queue is empty.')
+    parser.add_argument('--poll', type=float, default=None, help='Seconds to wait when idle (default JOB_POLL_SECONDS).')
+    args = parser.parse_args()
+    run_worker(app, poll_seconds=args.poll, once=args.once)